@@ -18,7 +18,8 @@ import warnings
 
 import numpy as np
 
-from .trajectory import _RawFrameData, Frame, Trajectory
+from .trajectory import _RawFrameData, _FrameDescriptor, Frame, Trajectory
+from .trajectory import _open_source, _stream_filename, _property_dtype
 
 # CifFile is from the pycifrw package
 from CifFile import CifFile
@@ -43,6 +44,12 @@ def _parse_division(match):
     return str(float(match.group('num'))/float(match.group('denom')))
 
 
+def _parse_file(filename):
+    "Parse a cif file by name."
+    with open(filename, 'r') as file:
+        return CifFile(file)
+
+
 class _RawCifFrameData(_RawFrameData):
     """Extend base class to support raw CIF coordinates"""
 
@@ -53,14 +60,35 @@ class _RawCifFrameData(_RawFrameData):
 
 
 class CifFileFrame(Frame):
+    __slots__ = ('parsed', 'precision', 'default_type', 'tolerance', 'filename', 'key')
 
-    def __init__(self, parsed, precision, default_type, tolerance=1e-5):
+    def __init__(self, parsed, precision, default_type, tolerance=1e-5,
+                 filename=None, key=None):
         self.parsed = parsed
         self.precision = precision
         self.default_type = default_type
         self.tolerance = tolerance
+        self.filename = filename
+        self.key = key
         super(CifFileFrame, self).__init__()
 
+    def _descriptor(self):
+        if self.filename is None:
+            return None
+        return _FrameDescriptor(
+            filename=self.filename, fmt='cif', location=self.key,
+            options=dict(precision=self.precision, default_type=self.default_type,
+                         tolerance=self.tolerance))
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        parsed_file = _open_source(
+            (descriptor.filename, 'cif'), lambda: _parse_file(descriptor.filename))
+        options = descriptor.options
+        return cls(parsed_file[descriptor.location], options['precision'],
+                   options['default_type'], options['tolerance'],
+                   filename=descriptor.filename, key=descriptor.location)
+
     def _num(self, x):
         if isinstance(x, int):
             return x
@@ -105,7 +133,7 @@ class CifFileFrame(Frame):
     @cif_coordinates.setter
     def cif_coordinates(self, value):
         try:
-            value = np.asarray(value, dtype=self._dtype)
+            value = np.asarray(value, dtype=_property_dtype(self._dtype, 'position'))
         except ValueError:
             raise ValueError("CIF coordinates can only be set to numeric arrays.")
         if not np.all(np.isfinite(value)):
@@ -117,11 +145,11 @@ class CifFileFrame(Frame):
         self.load()
         self.frame_data.cif_coordinates = value
 
-    def _raw_frame_to_frame(self, raw_frame, dtype=None):
+    def _raw_frame_to_frame(self, raw_frame, dtype=None, props=None):
         """Extend parent function to also incorporate cif_coordinates"""
-        ret = super(CifFileFrame, self)._raw_frame_to_frame(raw_frame, dtype)
-        ret.cif_coordinates = np.asarray(raw_frame.cif_coordinates, dtype=dtype)
-        assert len(ret.position) == len(ret.cif_coordinates)
+        ret = super(CifFileFrame, self)._raw_frame_to_frame(raw_frame, dtype, props)
+        ret.cif_coordinates = np.asarray(raw_frame.cif_coordinates, dtype=_property_dtype(dtype, 'position'))
+        assert len(ret) == len(ret.cif_coordinates)
         return ret
 
     def read(self):
@@ -246,9 +274,9 @@ class CifFileReader(object):
         self._precision = precision or CIFFILE_FLOAT_DIGITS
         self._tolerance = tolerance
 
-    def _scan(self, parsed_file, keys, default_type):
+    def _scan(self, parsed_file, keys, default_type, filename=None):
         return (CifFileFrame(parsed_file[key], self._precision, default_type,
-                             self._tolerance) for key in keys)
+                             self._tolerance, filename=filename, key=key) for key in keys)
 
     def read(self, stream, default_type='A'):
         """Read text stream and return a trajectory instance.
@@ -263,7 +291,8 @@ class CifFileReader(object):
         keys = list(sorted(parsed_file.keys()))
 
         # Index the stream
-        frames = list(self._scan(parsed_file, keys, default_type))
+        frames = list(self._scan(parsed_file, keys, default_type,
+                                 filename=_stream_filename(stream)))
         if len(frames) == 0:
             raise ParserError("Did not read a single complete frame.")
         logger.info("Read {} frames.".format(len(frames)))
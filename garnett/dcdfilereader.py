@@ -42,6 +42,7 @@ The example is given for a hoomd-blue xml frame:
 
 import logging
 import copy
+import importlib
 from collections import namedtuple
 
 import numpy as np
@@ -49,7 +50,8 @@ from numpy.core import numeric as _nx
 from numpy.core.numeric import asanyarray
 
 from .trajectory import Frame, Trajectory
-from .trajectory import _RawFrameData, _generate_type_id_array
+from .trajectory import _FrameDescriptor, _FrameIndex, _FrameMetadata, _open_source, _stream_filename
+from .trajectory import _RawFrameData, _generate_type_id_array, _check_props, _property_dtype
 from . import pydcdreader
 
 logger = logging.getLogger(__name__)
@@ -108,6 +110,13 @@ def _np_stack(arrays, axis=0):
     return _nx.concatenate(expanded_arrays, axis=axis)
 
 
+def _read_only(array):
+    "Return a read-only view of the array."
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
 _DCDFileHeader = namedtuple(
     '_DCDFileHeader',
     ('num_frames', 'm_start_timestep', 'm_period', 'timesteps',
@@ -120,6 +129,8 @@ _DCDFrameHeader = namedtuple(
 
 
 class DCDFrame(Frame):
+    __slots__ = ('_dcdreader', 'stream', 'file_header', 'offset', 't_frame',
+                 'default_type', '_types', '_box', '_position', '_orientation')
 
     def __init__(self, dcdreader, stream, file_header,
                  offset, t_frame, default_type='A',
@@ -136,6 +147,29 @@ class DCDFrame(Frame):
         self._orientation = None
         super(DCDFrame, self).__init__(dtype=dtype)
 
+    def _descriptor(self):
+        filename = _stream_filename(self.stream)
+        if filename is None:
+            return None
+        if self.t_frame is not None:
+            # The topology frame is sent together with its data.
+            self.t_frame.load()
+        return _FrameDescriptor(
+            filename=filename, fmt='dcd', location=self.offset,
+            options=dict(dcdreader=self._dcdreader.__name__,
+                         file_header=self.file_header._asdict(),
+                         t_frame=self.t_frame, default_type=self.default_type))
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        stream = _open_source(
+            (descriptor.filename, 'dcd'), lambda: open(descriptor.filename, 'rb'))
+        options = descriptor.options
+        return cls(dcdreader=importlib.import_module(options['dcdreader']),
+                   stream=stream, file_header=options['file_header'],
+                   offset=descriptor.location, t_frame=options['t_frame'],
+                   default_type=options['default_type'])
+
     def __len__(self):
         return int(self.file_header.n_particles)
 
@@ -145,27 +179,32 @@ class DCDFrame(Frame):
         self._box = np.asarray(_box_matrix_from_frame_header(frame_header)).T
         self._position = xyz.swapaxes(0, 1)
 
-    def _load(self, xyz=None, ort=None):
+    def _load(self, xyz=None, ort=None, orientation=True):
+        # Without orientation, the frame is only partially loaded and
+        # loaded again as a whole when read.
         N = int(self.file_header.n_particles)
         if xyz is None:
             xyz = np.zeros((3, N), dtype=np.float32)
-        if ort is None:
-            ort = np.zeros((N, 4), dtype=self._dtype)
+        if ort is None and orientation:
+            ort = np.zeros((N, 4), dtype=_property_dtype(self._dtype, 'orientation'))
         self._read(xyz=xyz)
         if self.t_frame is None:
             self._types = [self.default_type] * len(self)
         else:
             self._types = self.t_frame.types
         if self.t_frame is None or self.t_frame.box.dimensions == 3:
-            ort.T[0] = 1.0
-            ort.T[1:] = 0
+            if ort is not None:
+                ort.T[0] = 1.0
+                ort.T[1:] = 0
         elif self.t_frame.box.dimensions == 2:
-            _euler_to_quaternion(
-                self._position.T[-1], ort)
+            if ort is not None:
+                _euler_to_quaternion(
+                    self._position.T[-1], ort)
             self._position.T[-1] = 0
         else:
             raise ValueError(self.t_frame.box.dimensions)
         self._orientation = ort
+        self._hold()
 
     def _loaded(self):
         return not (self._types is None or
@@ -173,6 +212,61 @@ class DCDFrame(Frame):
                     self._position is None or
                     self._orientation is None)
 
+    def _read_props(self, props):
+        # The box and types are read without reading the coordinates.
+        if not set(props).issubset(('box', 'types')) or self._loaded():
+            return None
+        frame_header = _DCDFrameHeader(
+            ** self._dcdreader.read_frame_header(self.stream, self.offset))
+        raw_frame = _RawFrameData()
+        raw_frame.box = np.asarray(_box_matrix_from_frame_header(frame_header)).T
+        raw_frame.types = None
+        if self.t_frame is not None:
+            raw_frame.box_dimensions = self.t_frame.box.dimensions
+        if 'types' in props:
+            if self.t_frame is None:
+                raw_frame.types = [self.default_type] * len(self)
+            else:
+                raw_frame.types = copy.copy(self.t_frame.types)
+        return raw_frame
+
+    def _read_particles(self, props, index):
+        # Only the range of the selected particles is read from each coordinate
+        # section. Frames with a two-dimensional topology store euler angles
+        # in place of the z coordinates and are read as a whole.
+        if self._loaded() or not set(props).issubset(('position', 'orientation')) or \
+                (self.t_frame is not None and self.t_frame.box.dimensions != 3):
+            return None
+        raw_frame = self._read_props([])
+        N = len(self)
+        start, stop = (int(index[0]), int(index[-1]) + 1) if len(index) else (0, 0)
+        xyz = np.zeros((3, stop - start), dtype=np.float32)
+        if stop > start:
+            self.stream.seek(self.offset)
+            header_size = int(np.frombuffer(self.stream.read(4), dtype='<u4')[0])
+            body = self.offset + header_size + 8
+            for i in range(3):
+                # Each section is enclosed by its size in bytes.
+                self.stream.seek(body + i * (4 * N + 8) + 4 + 4 * start)
+                xyz[i] = np.frombuffer(self.stream.read(4 * (stop - start)), dtype='<f4')
+        if 'position' in props:
+            raw_frame.position = xyz.T[index - start]
+        if 'orientation' in props:
+            orientation = np.zeros((len(index), 4), dtype=_property_dtype(self._dtype, 'orientation'))
+            orientation[:, 0] = 1
+            raw_frame.orientation = orientation
+        return raw_frame
+
+    def _read_metadata(self):
+        # The timestep is derived from the position of the frame within the file,
+        # which is unknown for frames that were not created by a trajectory.
+        timestep = None
+        if self._index is not None:
+            timestep = int(self.file_header.m_start_timestep) + \
+                self._index[1] * int(self.file_header.m_period)
+        return _FrameMetadata(N=len(self), timestep=timestep, box=self._read_box(),
+                              props=('position', 'orientation'))
+
     def read(self):
         raw_frame = _RawFrameData()
         if self.t_frame is not None:
@@ -188,8 +282,9 @@ class DCDFrame(Frame):
         assert self._loaded()
         raw_frame.box = self._box
         raw_frame.types = copy.copy(self._types)
-        raw_frame.position = self._position
-        raw_frame.orientation = self._orientation
+        # The arrays are kept for load_arrays() and exposed as read-only views.
+        raw_frame.position = _read_only(self._position)
+        raw_frame.orientation = _read_only(self._orientation)
         assert len(raw_frame.types) == len(self)
         assert len(raw_frame.position) == len(self)
         assert len(raw_frame.orientation) == len(self)
@@ -215,23 +310,41 @@ class DCDTrajectory(Trajectory):
         See also: :meth:`~.load_arrays`"""
         return not (self._N is None or
                     self._type is None or
-                    self._types is None or
-                    self._type_ids is None or
-                    self._position is None or
-                    self._orientation is None)
-
-    def load_arrays(self):
+                    self._type_ids is None)
+
+    def load_arrays(self, props=None, directory=None):
+        """Load positions, orientations and types into memory.
+
+        A dcd file only provides positions and orientations, all other
+        particle properties are not available.
+
+        :param props: The particle properties to load, defaults to all
+            available properties.
+        :type props: list
+        :param directory: Directory for memory-mapped array files,
+            see :meth:`.Trajectory.load_arrays`.
+        :type directory: str"""
+        if directory is not None:
+            return super(DCDTrajectory, self).load_arrays(props=props, directory=directory)
+        props = _check_props(props)
         # Determine array shapes
         M = len(self)
         N = len(self.frames[0])
         _N = np.ones(M) * N
 
-        # Coordinates
+        # Coordinates, the orientations are only computed if requested.
         xyz = np.zeros((M, 3, N), dtype=np.float32)
-        ort = np.zeros((M, N, 4), dtype=self._dtype)
+        ort = None
+        if 'orientation' in props:
+            ort = np.zeros((M, N, 4), dtype=self._array_dtype('orientation'))
         for i, frame in enumerate(self.frames):
             if not frame._loaded():
-                frame._load(xyz=xyz[i], ort=ort[i])
+                frame._load(xyz=xyz[i], ort=None if ort is None else ort[i],
+                            orientation=ort is not None)
+            else:
+                xyz[i] = frame._position.T
+                if ort is not None:
+                    ort[i] = frame._orientation
 
         # Types, Can only be handled after frame._load() calls.
         types = [f._types for f in self.frames]
@@ -244,7 +357,8 @@ class DCDTrajectory(Trajectory):
             self._type = _type
             self._types = types
             self._type_ids = type_ids
-            self._position = xyz.swapaxes(1, 2)
+            self._position = xyz.swapaxes(1, 2).astype(
+                self._array_dtype('position'), copy=False) if 'position' in props else None
             self._orientation = ort
         except Exception:
             # Ensure consistent error state
@@ -323,11 +437,13 @@ class _DCDFileReader(object):
 
     def _scan(self, stream, t_frame=None, default_type=None):
         file_header, offsets = self._dcdreader.scan(stream)
-        for offset in offsets:
-            yield DCDFrame(
+
+        def make_frame(offset):
+            return DCDFrame(
                 dcdreader=self._dcdreader,
-                stream=stream, file_header=file_header, offset=offset,
+                stream=stream, file_header=file_header, offset=int(offset),
                 t_frame=t_frame, default_type=default_type)
+        return _FrameIndex(make_frame, np.array(offsets, dtype=np.int64))
 
     def read(self, stream, frame=None, default_type=None):
         """Read binary stream and return a trajectory instance.
@@ -352,7 +468,6 @@ class _DCDFileReader(object):
                 "2-dimensional box, interpreting 3rd dimension "
                 "as euler orientation angle.")
 
-        frames = list(self._scan(stream, t_frame=frame,
-                                 default_type=default_type))
+        frames = self._scan(stream, t_frame=frame, default_type=default_type)
         logger.info("Read {} frames.".format(len(frames)))
         return DCDTrajectory(frames)
@@ -104,3 +104,11 @@ def read_frame(stream, xyz, long offset=-1):
     frame_header = _read_frame_header(cfile)
     _read_frame_body(cfile, xyz)
     return frame_header
+
+
+def read_frame_header(stream, long offset=-1):
+    cdef FILE* cfile
+    cfile = fdopen(stream.fileno(), 'rb')
+    if offset >= 0:
+        fseek(cfile, offset, SEEK_SET)
+    return _read_frame_header(cfile)
@@ -11,19 +11,47 @@ Authors: Matthew Spellings, Carl Simon Adorf
     traj = reader.read(open('trajectory.tar', 'rb'))
 """
 
+import os
 import json
 import logging
+import tarfile
+import zipfile
+import functools
 import collections
 
 import numpy as np
 import gtar
 
-from .trajectory import _RawFrameData, Box, Frame, Trajectory
+from .trajectory import _RawFrameData, _FrameDescriptor, _FrameMetadata, Box, Frame, Trajectory
+from .trajectory import _FrameIndex, _open_source, PARTICLE_PROPERTIES
 from .shapes import _parse_type_shape
 
 logger = logging.getLogger(__name__)
 
 
+# Names of the records of particle properties, which differ from the property name.
+_RECORD_NAMES = {'angmom': 'angular_momentum_quat'}
+
+
+def _get_records(trajectory):
+    "Returns the records of the trajectory, which are not part of a group."
+    return {rec.getName(): rec for rec in trajectory.getRecordTypes() if not rec.getGroup()}
+
+
+@functools.lru_cache(maxsize=8)
+def _archive_listing(filename, mtime):
+    """Returns the sizes of all files within a zip or tar archive by path.
+
+    Other archives, e.g., sqlite databases, yield an empty mapping."""
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            return {info.filename: info.file_size for info in archive.infolist()}
+    if tarfile.is_tarfile(filename):
+        with tarfile.open(filename) as archive:
+            return {member.name: member.size for member in archive.getmembers()}
+    return dict()
+
+
 class GetarFrame(Frame):
     """Interface to grab getar frame data.
 
@@ -32,58 +60,70 @@ class GetarFrame(Frame):
     :param frame: Frame name inside the trajectory
     :param default_type: The default particle type
     :type default_type: str
+    :param filename: The name of the file the trajectory was opened from
+    :type filename: str
     """
+    __slots__ = ('_trajectory', '_records', '_frame', '_default_type', '_default_box', '_filename')
 
-    def __init__(self, trajectory, records, frame, default_type, default_box):
+    def __init__(self, trajectory, records, frame, default_type, default_box, filename=None):
         super(GetarFrame, self).__init__()
         self._trajectory = trajectory
         self._records = records
         self._frame = frame
         self._default_type = default_type
         self._default_box = default_box
+        self._filename = filename
+
+    def _descriptor(self):
+        if self._filename is None:
+            return None
+        return _FrameDescriptor(
+            filename=self._filename, fmt='gtar', location=self._frame,
+            options=dict(default_type=self._default_type, default_box=self._default_box))
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        trajectory = _open_source(
+            (descriptor.filename, 'gtar'), lambda: gtar.GTAR(descriptor.filename, 'r'))
+        return cls(trajectory, _get_records(trajectory), descriptor.location,
+                   descriptor.options['default_type'], descriptor.options['default_box'],
+                   filename=descriptor.filename)
 
     def __str__(self):
         return "GetarFrame({})".format(self._records)
 
-    def read(self):
-        raw_frame = _RawFrameData()
-        raw_frame.shapedef = collections.OrderedDict()
-        prop_map = {'angular_momentum_quat': 'angmom'}
-        supported_records = ['position', 'orientation', 'velocity',
-                             'mass', 'charge', 'diameter',
-                             'moment_inertia', 'angular_momentum_quat',
-                             'image']
-        for name in supported_records:
-            try:
-                values = self._trajectory.getRecord(
-                    self._records[name], self._frame)
-            except KeyError:
-                values = None
-
-            if values is not None:
-                frame_prop = prop_map.get(name, name)
-                setattr(raw_frame, frame_prop, values)
+    def _get_record(self, name):
+        "Returns the values of the record in this frame or None if not stored."
+        try:
+            return self._trajectory.getRecord(self._records[name], self._frame)
+        except KeyError:
+            return None
 
+    def _read_types(self, raw_frame):
         if 'type' in self._records and 'type_names.json' in self._records:
-            names = json.loads(self._trajectory.getRecord(
-                self._records['type_names.json'], self._frame))
-            types = self._trajectory.getRecord(
-                self._records['type'], self._frame)
+            names = json.loads(self._get_record('type_names.json'))
+            types = self._get_record('type')
             raw_frame.types = [names[t] for t in types]
         else:
-            raw_frame.types = len(raw_frame.position) * [self._default_type]
+            position = raw_frame.position
+            if not len(position):
+                position = self._get_record('position')
+            raw_frame.types = len(position) * [self._default_type]
 
+    def _read_box_record(self, raw_frame):
         if 'box' in self._records:
             # Read dimension if stored
             if 'dimensions' in self._records:
-                dimensions = self._trajectory.getRecord(
-                             self._records['dimensions'], self._frame)[0]
+                dimensions = self._get_record('dimensions')[0]
             # Fallback to detection based on z coordinates
             else:
-                zs = raw_frame.position[:, 2]
+                position = raw_frame.position
+                if not len(position):
+                    position = self._get_record('position')
+                zs = position[:, 2]
                 dimensions = 2 if np.allclose(zs, 0.0, atol=1e-7) else 3
 
-            box = self._trajectory.getRecord(self._records['box'], self._frame)
+            box = self._get_record('box')
             gbox = Box(
                 **dict(
                     zip(['Lx', 'Ly', 'Lz', 'xy', 'xz', 'yz'], box),
@@ -94,11 +134,77 @@ class GetarFrame(Frame):
         else:
             raw_frame.box = self._default_box
 
+    def _read_props(self, props):
+        raw_frame = _RawFrameData()
+        for prop in props:
+            if prop in PARTICLE_PROPERTIES:
+                values = self._get_record(_RECORD_NAMES.get(prop, prop))
+                if values is not None:
+                    setattr(raw_frame, prop, values)
+        if 'types' in props:
+            self._read_types(raw_frame)
+        else:
+            raw_frame.types = None
+        self._read_box_record(raw_frame)
+        return raw_frame
+
+    def _record_length(self, name, width):
+        """Returns the number of entries of the given width of the record in
+        this frame, derived from its size in the archive listing, or None if
+        the size cannot be determined without reading the record."""
+        if self._filename is None or name not in self._records:
+            return None
+        record = self._records[name].copy()
+        record.setIndex(self._frame)
+        path = record.getPath()
+        if os.path.isdir(self._filename):
+            try:
+                size = os.path.getsize(os.path.join(self._filename, path))
+            except OSError:
+                return None
+        else:
+            size = _archive_listing(self._filename, os.path.getmtime(self._filename)).get(path)
+            if size is None:
+                return None
+        # The paths end with the name, the format (e.g. f32) and the behavior.
+        fmt = path.rsplit('.', 2)[-2]
+        itemsize = np.dtype('{}{}'.format(fmt[0], int(fmt[1:]) // 8)).itemsize
+        return size // (itemsize * width)
+
+    def _read_metadata(self):
+        # The number of particles is derived from the size of the type or
+        # position record, which are only read if the size is unknown.
+        N = self._record_length('type', 1)
+        if N is None:
+            N = self._record_length('position', 3)
+        if N is None:
+            types = self._get_record('type')
+            if types is None:
+                types = self._get_record('position')
+            N = len(types)
+        try:
+            # Frames are usually named by their timestep.
+            timestep = int(self._frame)
+        except (TypeError, ValueError):
+            timestep = None
+        props = tuple(prop for prop in PARTICLE_PROPERTIES
+                      if _RECORD_NAMES.get(prop, prop) in self._records)
+        return _FrameMetadata(N=N, timestep=timestep, box=self._read_box(), props=props)
+
+    def read(self):
+        raw_frame = _RawFrameData()
+        raw_frame.shapedef = collections.OrderedDict()
+        for prop in PARTICLE_PROPERTIES:
+            values = self._get_record(_RECORD_NAMES.get(prop, prop))
+            if values is not None:
+                setattr(raw_frame, prop, values)
+
+        self._read_types(raw_frame)
+        self._read_box_record(raw_frame)
+
         if 'type_names.json' in self._records and 'type_shapes.json' in self._records:
-            names = json.loads(self._trajectory.getRecord(
-                self._records['type_names.json'], self._frame))
-            shapes = json.loads(self._trajectory.getRecord(
-                self._records['type_shapes.json'], self._frame))
+            names = json.loads(self._get_record('type_names.json'))
+            shapes = json.loads(self._get_record('type_shapes.json'))
             for name, shape in zip(names, shapes):
                 shape_def = _parse_type_shape(shape)
                 raw_frame.shapedef.update({name: shape_def})
@@ -147,14 +253,17 @@ class GetarFileReader(object):
                 "as the underlying library is reading the file by filename "
                 "and not directly from the stream.")
         _trajectory = gtar.GTAR(filename, 'r')
-        _records = {rec.getName(): rec for rec in _trajectory.getRecordTypes() if not rec.getGroup()}
+        _records = _get_records(_trajectory)
         # assume that we care primarily about positions
         try:
             self._frames = _trajectory.queryFrames(_records['position'])
         except KeyError:
             raise RuntimeError("Given trajectory '{}' contained no "
                                "positions.".format(stream))
-        frames = [GetarFrame(_trajectory, _records, idx, default_type, default_box)
-                  for idx in self._frames]
+        filename = os.path.abspath(filename) if isinstance(filename, str) else None
+
+        def make_frame(idx):
+            return GetarFrame(_trajectory, _records, idx, default_type, default_box, filename)
+        frames = _FrameIndex(make_frame, self._frames)
         logger.info("Read {} frames.".format(len(frames)))
         return Trajectory(frames)
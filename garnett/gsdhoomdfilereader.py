@@ -33,7 +33,9 @@ import collections
 
 import numpy as np
 
-from .trajectory import _RawFrameData, Frame, Trajectory
+from .trajectory import _RawFrameData, _FrameDescriptor, _FrameMetadata, Frame, Trajectory
+from .trajectory import PARTICLE_PROPERTIES
+from .trajectory import _FrameIndex, _open_source, _stream_filename
 from .shapes import SphereShape, ConvexPolyhedronShape, ConvexSpheropolyhedronShape, \
     PolygonShape, SpheropolygonShape, EllipsoidShape, _parse_type_shape
 
@@ -178,6 +180,75 @@ def _parse_shape_definitions(frame, gsdfile, frame_index):
             return None
 
 
+def _read_chunk(gsdfile, frame_index, name, default=None):
+    "Read a chunk of the frame or of the first frame, if not stored in the frame."
+    for i in (frame_index, 0):
+        if gsdfile.chunk_exists(i, name):
+            return gsdfile.read_chunk(i, name)
+    return default
+
+
+def _read_particle_chunk(gsdfile, frame_index, N, name):
+    """Read a per-particle chunk of the frame.
+
+    Like the HOOMD reader, the chunk of the first frame is used if the chunk is
+    not stored in the frame, but the number of particles is the same, otherwise
+    the chunk is initialized with the default value."""
+    chunk = 'particles/' + name
+    if gsdfile.chunk_exists(frame_index, chunk):
+        return gsdfile.read_chunk(frame_index, chunk)
+    if gsdfile.chunk_exists(0, chunk) and _read_chunk(gsdfile, 0, 'particles/N', [0])[0] == N:
+        return gsdfile.read_chunk(0, chunk)
+    return _default_particle_chunk(N, name)
+
+
+def _default_particle_chunk(N, name):
+    "Return the default values of a per-particle chunk for N particles."
+    default = np.array([gsdhoomd.ParticleData._default_value[name]])
+    value = np.empty((N,) + default.shape[1:], dtype=default.dtype)
+    value[:] = default
+    return value
+
+
+def _read_chunk_rows(gsdfile, frame_index, name, start, stop):
+    "Read the rows start to stop of a chunk, only reading those rows where supported."
+    if isinstance(gsdfile, PyGSDFile):
+        return gsdfile.read_chunk_rows(frame_index, name, start, stop)
+    return gsdfile.read_chunk(frame_index, name)[start:stop]
+
+
+def _read_particle_rows(gsdfile, frame_index, N, name, index):
+    """Read a per-particle chunk of the frame for the particles at the sorted index.
+
+    See also: :func:`_read_particle_chunk`"""
+    chunk = 'particles/' + name
+    start, stop = (int(index[0]), int(index[-1]) + 1) if len(index) else (0, 0)
+    for i in (frame_index, 0):
+        if gsdfile.chunk_exists(i, chunk) and (
+                i == frame_index or _read_chunk(gsdfile, 0, 'particles/N', [0])[0] == N):
+            return _read_chunk_rows(gsdfile, i, chunk, start, stop)[index - start]
+    return _default_particle_chunk(len(index), name)
+
+
+def _read_types(gsdfile, frame_index, N):
+    "Read the type names of all particles of the frame."
+    types = _read_chunk(gsdfile, frame_index, 'particles/types')
+    if types is None:
+        types = gsdhoomd.ParticleData._default_value['types']
+    else:
+        types = types.view(dtype=np.dtype((bytes, types.shape[1]))).reshape([types.shape[0]])
+        types = [t.decode('UTF-8') for t in types]
+    typeid = _read_particle_chunk(gsdfile, frame_index, N, 'typeid')
+    return [types[t] for t in typeid]
+
+
+def _open_gsdfile(filename, native=NATIVE):
+    "Open a gsd file by name for reading."
+    if native:
+        return gsd.fl.open(name=filename, mode='rb')
+    return PyGSDFile(open(filename, 'rb'))
+
+
 class GSDHoomdFrame(Frame):
     """Extends the Frame object for GSD files.
 
@@ -201,6 +272,7 @@ class GSDHoomdFrame(Frame):
     :type gsdfile:
         :class:`gsd.fl.GSDFile`
     """
+    __slots__ = ('traj', 'frame_index', 't_frame', 'gsdfile')
 
     def __init__(self, traj, frame_index, t_frame, gsdfile):
         self.traj = traj
@@ -209,6 +281,29 @@ class GSDHoomdFrame(Frame):
         self.gsdfile = gsdfile
         super(GSDHoomdFrame, self).__init__()
 
+    def _descriptor(self):
+        filename = _stream_filename(self.gsdfile)
+        if filename is None:
+            return None
+        if self.t_frame is not None:
+            # The topology frame is sent together with its data.
+            self.t_frame.load()
+        return _FrameDescriptor(
+            filename=filename, fmt='gsd', location=self.frame_index,
+            options=dict(t_frame=self.t_frame, native=not isinstance(self.gsdfile, PyGSDFile)))
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        native = descriptor.options['native']
+        gsdfile = _open_source(
+            (descriptor.filename, 'gsd', native),
+            lambda: _open_gsdfile(descriptor.filename, native))
+        if native:
+            traj = gsd.hoomd.HOOMDTrajectory(gsdfile)
+        else:
+            traj = gsdhoomd.HOOMDTrajectory(gsdfile)
+        return cls(traj, descriptor.location, descriptor.options['t_frame'], gsdfile)
+
     def read(self):
         raw_frame = _RawFrameData()
         frame = self.traj.read_frame(self.frame_index)
@@ -238,6 +333,39 @@ class GSDHoomdFrame(Frame):
         raw_frame.image = frame.particles.image
         return raw_frame
 
+    def _read_props(self, props):
+        raw_frame = _RawFrameData()
+        if props:
+            N = int(_read_chunk(self.gsdfile, self.frame_index, 'particles/N', [0])[0])
+        raw_frame.box = _box_matrix(_read_chunk(
+            self.gsdfile, self.frame_index, 'configuration/box',
+            gsdhoomd.ConfigurationData._default_value['box']))
+        raw_frame.box_dimensions = int(_read_chunk(
+            self.gsdfile, self.frame_index, 'configuration/dimensions', [3])[0])
+        raw_frame.types = None
+        for prop in props:
+            if prop == 'types':
+                raw_frame.types = _read_types(self.gsdfile, self.frame_index, N)
+            elif prop in PARTICLE_PROPERTIES:
+                setattr(raw_frame, prop, _read_particle_chunk(
+                    self.gsdfile, self.frame_index, N, prop))
+        return raw_frame
+
+    def _read_particles(self, props, index):
+        raw_frame = self._read_props([])
+        N = int(_read_chunk(self.gsdfile, self.frame_index, 'particles/N', [0])[0])
+        for prop in props:
+            setattr(raw_frame, prop, _read_particle_rows(
+                self.gsdfile, self.frame_index, N, prop, index))
+        return raw_frame
+
+    def _read_metadata(self):
+        N = int(_read_chunk(self.gsdfile, self.frame_index, 'particles/N', [0])[0])
+        step = int(_read_chunk(self.gsdfile, self.frame_index, 'configuration/step', [0])[0])
+        # Particle properties that are not stored assume their default values.
+        return _FrameMetadata(N=N, timestep=step, box=self._read_box(),
+                              props=tuple(PARTICLE_PROPERTIES))
+
     def __str__(self):
         return "GSDHoomdFrame(# frames={})".format(len(self.traj))
 
@@ -302,7 +430,9 @@ class GSDHOOMDFileReader(object):
                           "Falling back to pure python reader.")
             gsdfile = PyGSDFile(stream)
             traj = gsdhoomd.HOOMDTrajectory(gsdfile)
-        frames = [GSDHoomdFrame(traj, i, t_frame=frame, gsdfile=gsdfile)
-                  for i in range(len(traj))]
+
+        def make_frame(i):
+            return GSDHoomdFrame(traj, i, t_frame=frame, gsdfile=gsdfile)
+        frames = _FrameIndex(make_frame, range(len(traj)))
         logger.info("Read {} frames.".format(len(frames)))
         return Trajectory(frames)
@@ -18,7 +18,7 @@ import xml.etree.ElementTree as ET
 
 import numpy as np
 
-from .trajectory import _RawFrameData, Frame, Trajectory
+from .trajectory import _RawFrameData, _FrameDescriptor, Frame, Trajectory
 from .errors import ParserError
 
 
@@ -26,11 +26,21 @@ logger = logging.getLogger(__name__)
 
 
 class HOOMDXMLFrame(Frame):
+    __slots__ = ('root',)
 
     def __init__(self, root):
         self.root = root
         super(HOOMDXMLFrame, self).__init__()
 
+    def _descriptor(self):
+        # The frame is already parsed, so the document is sent instead.
+        return _FrameDescriptor(filename=None, fmt='xml', location=None,
+                                options=dict(root=ET.tostring(self.root)))
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        return cls(ET.fromstring(descriptor.options['root']))
+
     def read(self):
         "Read the frame data from the stream."
         raw_frame = _RawFrameData()
@@ -13,12 +13,22 @@ Authors: Carl Simon Adorf, Richmond Newmann
 """
 
 import collections
+import concurrent.futures
+import functools
+import io
+import itertools
+import json
 import logging
+import mmap
+import os
+import re
 import warnings
+from multiprocessing import resource_tracker, shared_memory
 
 import numpy as np
 
-from .trajectory import _RawFrameData, Frame, Trajectory
+from .trajectory import _RawFrameData, _FrameDescriptor, _FrameMetadata, Frame, Trajectory
+from .trajectory import _FrameIndex, _open_source, _stream_filename, _frame_type_ids
 from .shapes import FallbackShape, SphereShape, ArrowShape, SphereUnionShape, \
     PolygonShape, ConvexPolyhedronShape, ConvexSpheropolyhedronShape, \
     ConvexPolyhedronUnionShape, GeneralPolyhedronShape, EllipsoidShape
@@ -29,8 +39,24 @@ from .errors import ParserError, ParserWarning
 logger = logging.getLogger(__name__)
 
 POSFILE_FLOAT_DIGITS = 11
+POSFILE_INDEX_EXTENSION = '.idx'
+POSFILE_INDEX_VERSION = 2
+# The approximate size of the frames decoded by a worker process at once.
+POSFILE_DECODE_CHUNK_BYTES = 1 << 22
 COMMENT_CHARACTERS = ['//']
 TOKENS_SKIP = ['translation', 'antiAliasing', 'zoomFactor', 'showEdges', 'connection']
+TOKENS_NO_PARTICLE = set(TOKENS_SKIP + ['def', 'shape', 'boxMatrix', 'box', 'rotation', 'eof'])
+
+
+# Lines that require the line-by-line scan: comments, data sections,
+# blank lines and lines with leading whitespace.
+_IRREGULAR_LINE = re.compile(
+    rb'^(?:[#\s]|' + b'|'.join(re.escape(c.encode()) for c in COMMENT_CHARACTERS) + b')',
+    re.MULTILINE)
+_KEYWORD_LINE = re.compile(
+    rb'^(?:' + b'|'.join(re.escape(t.encode()) for t in TOKENS_NO_PARTICLE if t != 'eof') +
+    rb')(?=\s|$)', re.MULTILINE)
+_BOX_LINE = re.compile(rb'^(?:boxMatrix|box)(?=\s|$)[^\n]*', re.MULTILINE)
 
 
 def _is_comment(line):
@@ -40,22 +66,180 @@ def _is_comment(line):
     return False
 
 
+def _frame_header(lines):
+    "Return the number of particles and the last box line of the lines of one frame."
+    N = 0
+    box = None
+    data = False
+    for line in lines:
+        if data:
+            data = not line.startswith('#[done]')
+            continue
+        if line.startswith('#[data]'):
+            data = True
+            continue
+        if line.startswith('#') or line.startswith('eof') or _is_comment(line):
+            continue
+        tokens = line.split(None, 1)
+        if not tokens:
+            continue
+        elif tokens[0] in ('boxMatrix', 'box'):
+            box = line.strip()
+        elif tokens[0] not in TOKENS_NO_PARTICLE:
+            N += 1
+    return N, box
+
+
+def _buffer_frame_header(chunk, terminated, encoding):
+    """Return the number of particles and the last box line of the bytes of
+    one frame.
+
+    Particle lines are counted as all lines except keyword lines, unless the
+    frame contains lines that require the line-by-line scan."""
+    if _IRREGULAR_LINE.search(chunk) is not None:
+        return _frame_header(chunk.decode(encoding).splitlines())
+    num_lines = chunk.count(b'\n') + (not chunk.endswith(b'\n'))
+    N = num_lines - int(terminated) - len(_KEYWORD_LINE.findall(chunk))
+    boxes = _BOX_LINE.findall(chunk)
+    return N, boxes[-1].decode(encoding).strip() if boxes else None
+
+
+def _round(values, precision):
+    """Round the values in place to the given number of digits like :func:`round`.
+
+    numpy rounds the scaled values, whose rounding errors change the result
+    for values close to a tie, e.g., 28.840103600654999 at 11 digits. Those
+    values and values too large to be scaled exactly are rounded with
+    Python's correctly rounded :func:`round`."""
+    flat = values.ravel()
+    scaled = flat * 10.0 ** precision
+    with np.errstate(invalid='ignore'):
+        ties = ~(np.abs(scaled - np.floor(scaled) - 0.5) > 1e-14 * (1 + np.abs(scaled)))
+        ties |= ~(np.abs(scaled) < 2 ** 52)
+    idx = np.flatnonzero(ties)
+    exact = [round(value, precision) for value in flat[idx].tolist()]
+    np.round(values, precision, out=values)
+    np.put(values, idx, exact)
+    return values
+
+
+def _map_file(stream):
+    "Return a read-only memory map of the named file of the stream or None."
+    if _stream_filename(stream) is None:
+        return None
+    try:
+        return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+def _stream_encoding(stream):
+    return getattr(stream, 'encoding', None) or 'utf-8'
+
+
 class PosFileFrame(Frame):
+    __slots__ = ('stream', 'start', 'end', 'precision', 'default_type', 'N', 'buffer',
+                 'shape_cache')
 
-    def __init__(self, stream, start, end, precision, default_type):
+    def __init__(self, stream, start, end, precision, default_type, N=None, buffer=None,
+                 shape_cache=None):
         self.stream = stream
         self.start = start
         self.end = end
         self.precision = precision
         self.default_type = default_type
+        self.N = N
+        self.buffer = buffer
+        self.shape_cache = shape_cache
         super(PosFileFrame, self).__init__()
 
+    def _lines(self):
+        """Return the lines of the stream, starting at the frame.
+
+        Frames of memory-mapped files are decoded from the bytes of the
+        frame instead of seeking the text stream."""
+        if self.buffer is not None:
+            text = self.buffer[self.start:self.end].decode(_stream_encoding(self.stream))
+            return io.StringIO(text, newline=None)
+        self.stream.seek(self.start)
+        return self.stream
+
+    def __len__(self):
+        # The number of particles is known from scanning the file.
+        if self.N is not None and not self.loaded():
+            return self.N
+        return super(PosFileFrame, self).__len__()
+
+    def _descriptor(self):
+        filename = _stream_filename(self.stream)
+        if filename is None:
+            return None
+        return _FrameDescriptor(
+            filename=filename, fmt='pos', location=(self.start, self.end),
+            options=dict(precision=self.precision, default_type=self.default_type,
+                         encoding=getattr(self.stream, 'encoding', None)))
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        encoding = descriptor.options['encoding']
+        stream = _open_source(
+            (descriptor.filename, 'pos', encoding),
+            lambda: open(descriptor.filename, 'r', encoding=encoding))
+        start, end = descriptor.location
+        return cls(stream, start, end, descriptor.options['precision'],
+                   descriptor.options['default_type'])
+
     def _num(self, x):
         if isinstance(x, int):
             return x
         else:
             return round(float(x), self.precision)
 
+    def _parse_particles(self, rows, types, arrow_types=()):
+        """Parse the positions and orientations of all particle lines.
+
+        All lines with the same layout, i.e., the same number of tokens,
+        are converted and rounded with numpy at once.
+
+        :param rows: The tokens of all particle lines.
+        :param types: The type names of all particles.
+        :param arrow_types: The names of types with arrow shapes, whose lines
+            with seven tokens store a position and a 2D orientation.
+        :returns: The Nx3 positions and the Nx4 orientations or None, if no
+            line stores an orientation."""
+        N = len(rows)
+        position = np.empty((N, 3))
+        orientation = None
+        layouts = np.fromiter(map(len, rows), dtype=np.intp, count=N)
+        if arrow_types and N:
+            # Arrow lines are marked by a negative layout.
+            arrows = (layouts == 7) & np.isin(
+                np.asarray(types, dtype=np.str_), list(arrow_types))
+            layouts[arrows] = -7
+        for layout in np.unique(layouts):
+            idx = np.flatnonzero(layouts == layout)
+            group = rows if len(idx) == N else [rows[i] for i in idx]
+            if layout < 0:
+                first = 1
+            elif layout >= 7:
+                first = layout - 7
+            elif layout >= 3:
+                first = layout - 3
+            else:
+                raise ParserError(' '.join(group[0]))
+            values = np.array(list(itertools.chain.from_iterable(
+                tokens[first:] for tokens in group)), dtype=np.float64)
+            values = values.reshape(len(group), -1)
+            _round(values, self.precision)
+            position[idx] = values[:, :3]
+            if values.shape[1] > 3:
+                if orientation is None:
+                    orientation = np.zeros((N, 4))
+                    orientation[:, 0] = 1
+                orientation[idx, :values.shape[1] - 3] = values[:, 3:]
+                orientation[idx, values.shape[1] - 3:] = 0
+        return position, orientation
+
     def _read_data_section(self, header, stream):
         """Read data section from stream."""
         data = collections.defaultdict(list)
@@ -212,9 +396,133 @@ class PosFileFrame(Frame):
                           "using fallback mode. ({})".format(line))
             return FallbackShape(line)
 
+    def _shape_definition(self, definition):
+        """Return the shape of a shape definition.
+
+        Identical definitions are only parsed once for all frames sharing
+        the shape cache and all of these frames share the same shape.
+        The vertices, centers and orientations of shared shapes are
+        read-only arrays; replace the shape of a frame with a copy to
+        modify it, e.g., its color."""
+        if self.shape_cache is None:
+            return self._parse_shape_definition(definition)
+        shape = self.shape_cache.get(definition)
+        if shape is None:
+            shape = self._parse_shape_definition(definition)
+            if isinstance(shape, FallbackShape):
+                return shape
+            self.shape_cache[definition] = shape = _read_only_shape(shape)
+        return shape
+
+    def _parse_box(self, tokens, raw_frame):
+        if len(tokens) == 10:
+            raw_frame.box = np.array(
+                [self._num(v) for v in tokens[1:]]).reshape((3, 3))
+        elif len(tokens) == 4:
+            raw_frame.box = np.array([
+                [self._num(tokens[1]), 0, 0],
+                [0, self._num(tokens[2]), 0],
+                [0, 0, self._num(tokens[3])]]).reshape((3, 3))
+
+    @staticmethod
+    def _parse_rotation(tokens):
+        euler_angles = np.array([float(t) for t in tokens[1:]])
+        euler_angles *= np.pi / 180
+        return rowan.from_euler(*euler_angles, axis_type='extrinsic', convention='xyz')
+
+    @staticmethod
+    def _set_box_dimensions(raw_frame):
+        # Perform inverse rotation to recover original coordinates
+        if raw_frame.view_rotation is not None:
+            pos = rowan.rotate(rowan.inverse(raw_frame.view_rotation), raw_frame.position)
+        else:
+            pos = np.asarray(raw_frame.position)
+        # If all the z coordinates are close to zero, set box dimension to 2
+        if np.allclose(pos[:, 2], 0.0, atol=1e-7):
+            raw_frame.box_dimensions = 2
+
+    def _read_positions(self):
+        """Read the box, positions and data section without parsing shape
+        definitions, orientations and types.
+
+        The positions are always parsed, since they determine the box dimensions.
+
+        :returns: The raw frame and whether orientations are stored, or
+            None, if the frame must be read as a whole."""
+        stream = self._lines()
+        raw_frame = _RawFrameData()
+        raw_frame.types = None
+        monotype = False
+        defined = set()
+        arrows = set()
+        types = []
+        rows = []
+        for line in stream:
+            if _is_comment(line):
+                continue
+            if line.startswith('#'):
+                if not line.startswith('#[data]') or raw_frame.data is not None:
+                    # Let read() raise the parser error.
+                    return None
+                raw_frame.data_keys, raw_frame.data, _ = \
+                    self._read_data_section(line, stream)
+                continue
+            tokens = line.rstrip().split()
+            if not tokens or tokens[0] in TOKENS_SKIP:
+                continue
+            if tokens[0] == 'eof':
+                break
+            elif tokens[0] == 'def':
+                definition, data, end = line.strip().split('"')
+                name = definition.split()[1]
+                defined.add(name)
+                if data.split()[0].lower() == 'arrow':
+                    arrows.add(name)
+            elif tokens[0] == 'shape':
+                monotype = True
+                if line.strip().split('"')[1].split()[0].lower() == 'arrow':
+                    arrows.add(self.default_type)
+            elif tokens[0] in ('boxMatrix', 'box'):
+                self._parse_box(tokens, raw_frame)
+            elif tokens[0] == 'rotation':
+                raw_frame.view_rotation = self._parse_rotation(tokens)
+            else:
+                if len(tokens) < 3:
+                    # Let read() raise the parser error.
+                    return None
+                types.append(self.default_type if monotype else tokens[0])
+                rows.append(tokens)
+        if raw_frame.box is None or not rows:
+            return None
+        arrows.update(name for name in set(types).difference(defined)
+                      if name.lower() == 'arrow')
+        raw_frame.position, orientation = self._parse_particles(rows, types, arrows)
+        self._set_box_dimensions(raw_frame)
+        return raw_frame, orientation is not None
+
+    def _read_props(self, props):
+        # Only the box and positions are read without reading the whole frame.
+        if not set(props).issubset(('position',)):
+            return None
+        result = self._read_positions()
+        return None if result is None else result[0]
+
+    def _read_metadata(self):
+        result = self._read_positions()
+        if result is None:
+            return super(PosFileFrame, self)._read_metadata()
+        raw_frame, oriented = result
+        N = len(raw_frame.position)
+        timestep = None
+        if raw_frame.data is not None and raw_frame.data.get('Steps'):
+            timestep = int(float(raw_frame.data['Steps'][0]))
+        box = self._raw_frame_to_frame(raw_frame, dtype=self._dtype, props=[]).box
+        props = ('position', 'orientation') if oriented else ('position',)
+        return _FrameMetadata(N=N, timestep=timestep, box=box, props=props)
+
     def read(self):
         "Read the frame data from the stream."
-        self.stream.seek(self.start)
+        stream = self._lines()
         i = line = None
 
         def _assert(assertion):
@@ -224,17 +532,18 @@ class PosFileFrame(Frame):
                 raise ParserError(
                     "Failed to read line #{}: {}.".format(i, line))
         monotype = False
+        rows = []
         raw_frame = _RawFrameData()
         raw_frame.shapedef = collections.OrderedDict()
         raw_frame.view_rotation = None
-        for i, line in enumerate(self.stream):
+        for i, line in enumerate(stream):
             if _is_comment(line):
                 continue
             if line.startswith('#'):
                 if line.startswith('#[data]'):
                     _assert(raw_frame.data is None)
                     raw_frame.data_keys, raw_frame.data, j = \
-                        self._read_data_section(line, self.stream)
+                        self._read_data_section(line, stream)
                     i += j
                 else:
                     raise ParserError(line)
@@ -254,26 +563,17 @@ class PosFileFrame(Frame):
                     if name in raw_frame.shapedef:
                         warnings.warn("Redifinition of type '{}'.".format(name))
                     raw_frame.shapedef[
-                        name] = self._parse_shape_definition(data)
+                        name] = self._shape_definition(data)
                 elif tokens[0] == 'shape':  # monotype
                     definition = line.strip().split('"')[1]
                     raw_frame.shapedef[self.default_type] = \
-                        self._parse_shape_definition(definition)
+                        self._shape_definition(definition)
                     _assert(len(raw_frame.shapedef) == 1)
                     monotype = True
                 elif tokens[0] in ('boxMatrix', 'box'):
-                    if len(tokens) == 10:
-                        raw_frame.box = np.array(
-                            [self._num(v) for v in tokens[1:]]).reshape((3, 3))
-                    elif len(tokens) == 4:
-                        raw_frame.box = np.array([
-                            [self._num(tokens[1]), 0, 0],
-                            [0, self._num(tokens[2]), 0],
-                            [0, 0, self._num(tokens[3])]]).reshape((3, 3))
+                    self._parse_box(tokens, raw_frame)
                 elif tokens[0] == 'rotation':
-                    euler_angles = np.array([float(t) for t in tokens[1:]])
-                    euler_angles *= np.pi / 180
-                    raw_frame.view_rotation = rowan.from_euler(*euler_angles, axis_type='extrinsic', convention='xyz')
+                    raw_frame.view_rotation = self._parse_rotation(tokens)
                 else:
                     # assume we are reading positions now
                     if not monotype:
@@ -283,42 +583,21 @@ class PosFileFrame(Frame):
                                 name, self._parse_shape_definition(' '.join(tokens[:3])))
                     else:
                         name = self.default_type
-                    if len(tokens) == 7 and isinstance(
-                            raw_frame.shapedef[name], ArrowShape):
-                        xyz = tokens[-6:-3]
-                        quat = tokens[-3:] + [0]
-                    elif len(tokens) >= 7:
-                        xyz = tokens[-7:-4]
-                        quat = tokens[-4:]
-                    elif len(tokens) >= 3:
-                        xyz = tokens[-3:]
-                        quat = None
-                    else:
+                    if len(tokens) < 3:
                         raise ParserError(line)
                     raw_frame.types.append(name)
-                    raw_frame.position.append([self._num(v) for v in xyz])
-                    if quat is None:
-                        raw_frame.orientation.append(quat)
-                    else:
-                        raw_frame.orientation.append([self._num(v) for v in quat])
-
-        # Perform inverse rotation to recover original coordinates
-        if raw_frame.view_rotation is not None:
-            pos = rowan.rotate(rowan.inverse(raw_frame.view_rotation), raw_frame.position)
-        else:
-            pos = np.asarray(raw_frame.position)
-        # If all the z coordinates are close to zero, set box dimension to 2
-        if np.allclose(pos[:, 2], 0.0, atol=1e-7):
-            raw_frame.box_dimensions = 2
-
-        # If no valid orientations have been added, the array should be empty
-        if all([quat is None for quat in raw_frame.orientation]):
-            raw_frame.orientation = []
-        else:
-            # Replace values of None with an identity quaternion
-            for i in range(len(raw_frame.orientation)):
-                if raw_frame.orientation[i] is None:
-                    raw_frame.orientation[i] = [1, 0, 0, 0]
+                    rows.append(tokens)
+
+        # The particle lines are parsed in bulk once the shapes are known.
+        arrows = [name for name, shape in raw_frame.shapedef.items()
+                  if isinstance(shape, ArrowShape)]
+        raw_frame.position, orientation = self._parse_particles(
+            rows, raw_frame.types, arrows)
+        self._set_box_dimensions(raw_frame)
+
+        # If no valid orientations have been added, the array should be empty;
+        # lines without orientation have the identity quaternion.
+        raw_frame.orientation = [] if orientation is None else orientation
         return raw_frame
 
     def __str__(self):
@@ -326,6 +605,171 @@ class PosFileFrame(Frame):
             self.stream, self.start, self.end)
 
 
+def _read_only_array(value):
+    array = np.array(value, dtype=float)
+    array.flags.writeable = False
+    return array
+
+
+def _read_only_shape(shape):
+    """Replace the vertices, centers and orientations of the shape with
+    read-only arrays, such that the shape can be shared by frames.
+
+    Ragged vertices, e.g., of unions of polyhedra, are stored as a tuple
+    of read-only arrays."""
+    for name in ('vertices', 'centers', 'orientations'):
+        value = getattr(shape, name, None)
+        if value is None:
+            continue
+        try:
+            value = _read_only_array(value)
+        except ValueError:
+            value = tuple(_read_only_array(item) for item in value)
+        setattr(shape, name, value)
+    return shape
+
+
+def _create_shared_memory(size):
+    "Create a shared memory block, which is released by the process attaching it."
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        if os.name == 'posix':
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _shared_array(shm, offset, shape, dtype):
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape, dtype=np.int64))
+    if count == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.frombuffer(shm.buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+
+def _share_raw_frames(raw_frames):
+    """Move the types, positions and orientations of the raw frames into one
+    shared memory block.
+
+    :returns: The name of the shared memory block, the raw frames without
+        particle data and the layout of the particle data of each frame."""
+    layouts = []
+    values = []
+    nbytes = 0
+    for raw_frame in raw_frames:
+        unique, type_ids = _frame_type_ids(raw_frame.types)
+        layout = dict(types=unique.tolist())
+        for name, value in (('type_ids', type_ids),
+                            ('position', raw_frame.position),
+                            ('orientation', raw_frame.orientation)):
+            value = np.ascontiguousarray(value, dtype=np.uint32 if name == 'type_ids' else None)
+            layout[name] = (nbytes, value.shape, value.dtype.str)
+            values.append(value)
+            nbytes += value.nbytes
+        raw_frame.types = raw_frame.position = raw_frame.orientation = None
+        layouts.append(layout)
+    shm = _create_shared_memory(max(nbytes, 1))
+    try:
+        offsets = (layout[name][0] for layout in layouts
+                   for name in ('type_ids', 'position', 'orientation'))
+        for offset, value in zip(offsets, values):
+            _shared_array(shm, offset, value.shape, value.dtype)[...] = value
+    finally:
+        shm.close()
+    return shm.name, raw_frames, layouts
+
+
+def _unshare_raw_frames(name, raw_frames, layouts):
+    "Restore the raw frames from the shared memory block and release it."
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        for raw_frame, layout in zip(raw_frames, layouts):
+            types = np.asarray(layout['types'], dtype=np.str_)
+            raw_frame.types = types[_shared_array(shm, *layout['type_ids'])].tolist()
+            raw_frame.position = _shared_array(shm, *layout['position']).copy()
+            orientation = _shared_array(shm, *layout['orientation']).copy()
+            raw_frame.orientation = orientation if len(orientation) else []
+    finally:
+        shm.close()
+        shm.unlink()
+    return raw_frames
+
+
+def _decode_frames(filename, encoding, precision, default_type, ranges):
+    "Decode the frames within the given byte ranges in a worker process."
+    with open(filename, 'r', encoding=encoding) as stream:
+        buffer = _map_file(stream)
+        try:
+            shape_cache = dict()
+            raw_frames = [PosFileFrame(stream, start, end, precision, default_type,
+                                       buffer=buffer, shape_cache=shape_cache).read()
+                          for start, end in ranges]
+        finally:
+            if buffer is not None:
+                buffer.close()
+    return _share_raw_frames(raw_frames)
+
+
+class _PosFileDecoder(object):
+    """Decodes the frames of a POS file in a pool of worker processes.
+
+    Consecutive frames are decoded in chunks of about
+    :data:`POSFILE_DECODE_CHUNK_BYTES`; the types, positions and
+    orientations are returned via shared memory.
+
+    :param processes: The number of worker processes
+        (default: the number of CPUs)."""
+
+    def __init__(self, filename, encoding, precision, default_type, processes=None):
+        self.filename = filename
+        self.encoding = encoding
+        self.precision = precision
+        self.default_type = default_type
+        self.processes = processes or os.cpu_count() or 1
+
+    def _chunks(self, frames):
+        chunk = []
+        nbytes = 0
+        for frame in frames:
+            chunk.append((frame.start, frame.end))
+            nbytes += frame.end - frame.start
+            if nbytes >= POSFILE_DECODE_CHUNK_BYTES:
+                yield chunk
+                chunk = []
+                nbytes = 0
+        if chunk:
+            yield chunk
+
+    def decode(self, frames):
+        "Yields the raw frames of the given iterable of frames in order."
+        chunks = self._chunks(frames)
+        try:
+            chunks = itertools.chain([next(chunks)], chunks)
+        except StopIteration:
+            return
+        decode = functools.partial(_decode_frames, self.filename, self.encoding,
+                                   self.precision, self.default_type)
+        with concurrent.futures.ProcessPoolExecutor(self.processes) as executor:
+            pending = collections.deque()
+            try:
+                for chunk in itertools.islice(chunks, 2 * self.processes):
+                    pending.append(executor.submit(decode, chunk))
+                while pending:
+                    raw_frames = _unshare_raw_frames(*pending.popleft().result())
+                    for chunk in itertools.islice(chunks, 1):
+                        pending.append(executor.submit(decode, chunk))
+                    yield from raw_frames
+            finally:
+                # Release the shared memory of chunks that were not consumed.
+                for future in pending:
+                    if not future.cancel():
+                        try:
+                            _unshare_raw_frames(*future.result())
+                        except Exception:
+                            pass
+
+
 class PosFileReader(object):
     """POS-file reader for the Glotzer Group, University of Michigan.
 
@@ -339,42 +783,178 @@ class PosFileReader(object):
 
         :param precision: The number of digits to
                           round floating-point values to.
-        :type precision: int"""
-
-    def __init__(self, precision=None):
+        :type precision: int
+        :param index: Store the frame offsets of named files in a sidecar
+                      index file (``<filename>.idx``) and reuse it when the
+                      file is read again (default: False).
+        :type index: bool
+        :param processes: The number of worker processes to decode frames
+                          of named files with, see :meth:`~.read`
+                          (default: 1, serial; None uses the number of CPUs).
+        :type processes: int"""
+
+    def __init__(self, precision=None, index=False, processes=1):
         """Initialize a pos-file reader.
 
         :param precision: The number of digits to
                           round floating-point values to.
         :type precision: int
+        :param index: Store the frame offsets of named files in a sidecar
+                      index file (``<filename>.idx``) and reuse it when the
+                      file is read again (default: False).
+        :type index: bool
+        :param processes: The number of worker processes to decode frames
+                          of named files with, see :meth:`~.read`
+                          (default: 1, serial; None uses the number of CPUs).
+        :type processes: int
         """
         self._precision = precision or POSFILE_FLOAT_DIGITS
-
-    def _scan(self, stream, default_type):
-        start = 0
-        index = 0
+        self._use_index = index
+        self._processes = processes
+        # Shapes of the shape definitions of all frames read by this reader.
+        self._shape_cache = dict()
+
+    def _scan(self, stream, start=0, buffer=None):
+        """Yields the start and end offsets, the number of particles, the
+        box line and whether the frame ends with an eof line for all frames
+        within the stream, beginning at start.
+
+        Memory-mapped files are scanned for frame boundaries with byte
+        searches and indexed with byte offsets."""
+        if buffer is not None:
+            yield from self._scan_buffer(buffer, start, _stream_encoding(stream))
+            return
+        stream.seek(start)
+        index = start
+        lines = []
         for line in stream:
             index += len(line)
+            lines.append(line)
             if line.startswith('eof'):
-                yield PosFileFrame(
-                    stream, start, index,
-                    self._precision, default_type)
+                yield (start, index) + _frame_header(lines) + (True,)
                 start = index
+                lines = []
         if index > start:
-            stream.seek(start)
-            for line in stream:
-                if line.startswith('boxMatrix') or line.startswith('box'):
-                    stream.seek(0, 2)
-                    yield PosFileFrame(
-                            stream, start, index,
-                            self._precision, default_type)
+            N, box = _frame_header(lines)
+            if box is not None:
+                yield start, index, N, box, False
+            else:
+                logger.warning("Unexpected file ending.")
+
+    def _scan_buffer(self, buffer, start, encoding):
+        "Yields the frames of a memory-mapped file, see :meth:`~._scan`."
+        size = len(buffer)
+        while start < size:
+            if buffer[start:start + 3] == b'eof':
+                eof = start
+            else:
+                eof = buffer.find(b'\neof', start)
+                if eof < 0:
                     break
+                eof += 1
+            end = buffer.find(b'\n', eof)
+            end = size if end < 0 else end + 1
+            yield (start, end) + _buffer_frame_header(buffer[start:end], True, encoding) + (True,)
+            start = end
+        if start < size:
+            N, box = _buffer_frame_header(buffer[start:], False, encoding)
+            if box is not None:
+                yield start, size, N, box, False
             else:
                 logger.warning("Unexpected file ending.")
 
+    def _read_index(self, filename):
+        """Return the frames of the sidecar index of the file.
+
+        The index is valid if the file size and modification time match.
+        If the file has grown and the last indexed frame is unchanged, the
+        index is extended by only scanning the appended part of the file.
+
+        :returns: The indexed frames, the offset up to which the file was
+            indexed and whether the index is complete, or None if there is
+            no valid index."""
+        try:
+            with open(filename + POSFILE_INDEX_EXTENSION) as file:
+                index = json.load(file)
+            if index['version'] != POSFILE_INDEX_VERSION:
+                return None
+            stat = os.stat(filename)
+            frames = index['frames']
+            scanned = index['scanned']
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        if stat.st_size == index['size'] and stat.st_mtime_ns == index['mtime']:
+            return frames, scanned, True
+        if stat.st_size <= index['size']:
+            return None
+        # Only complete frames are reused, the file may have been appended to.
+        frames = [frame for frame in frames if frame[1] <= scanned]
+        if frames:
+            start, end, _, box = frames[-1]
+            try:
+                with open(filename, 'rb') as file:
+                    file.seek(start)
+                    lines = file.read(end - start).decode().splitlines()
+            except (IOError, OSError, ValueError):
+                return None
+            if not lines or box not in (line.strip() for line in lines) or \
+                    not lines[-1].startswith('eof'):
+                return None
+        return frames, scanned, False
+
+    def _write_index(self, filename, frames, scanned):
+        "Write the sidecar index of the file, if the directory is writable."
+        stat = os.stat(filename)
+        index = dict(version=POSFILE_INDEX_VERSION, size=stat.st_size,
+                     mtime=stat.st_mtime_ns, scanned=scanned, frames=frames)
+        tmp = '{}{}.{}.tmp'.format(filename, POSFILE_INDEX_EXTENSION, os.getpid())
+        try:
+            with open(tmp, 'w') as file:
+                json.dump(index, file)
+            os.replace(tmp, filename + POSFILE_INDEX_EXTENSION)
+        except (IOError, OSError) as error:
+            logger.debug("Failed to write POS file index: {}".format(error))
+
+    def _index(self, stream, buffer=None):
+        """Return the start and end offsets, the number of particles and the
+        box line of all frames within the stream.
+
+        Named files are indexed with a sidecar index file, which is reused
+        when the same file is read again."""
+        filename = _stream_filename(stream) if self._use_index else None
+        index = None if filename is None else self._read_index(filename)
+        if index is None:
+            frames, scanned, complete = [], 0, False
+        else:
+            frames, scanned, complete = index
+        if not complete:
+            for start, end, N, box, terminated in self._scan(stream, scanned, buffer=buffer):
+                frames.append([start, end, N, box])
+                if terminated:
+                    scanned = end
+            if filename is not None:
+                self._write_index(filename, frames, scanned)
+        return frames
+
+    def _make_frame(self, stream, buffer, default_type, key):
+        start, end, N = key
+        return PosFileFrame(stream, int(start), int(end), self._precision,
+                            default_type, int(N), buffer, self._shape_cache)
+
     def read(self, stream, default_type='A'):
         """Read text stream and return a trajectory instance.
 
+        If the reader was created with more than one process, the frames of
+        named files are decoded by a pool of worker processes when iterating
+        over the trajectory or loading its arrays:
+
+        .. code::
+
+            reader = PosFileReader(processes=8)
+            with open('a_posfile.pos', 'r', encoding='utf-8') as posfile:
+                traj = reader.read(posfile)
+                traj.load_arrays()
+
         :param stream: The stream, which contains the posfile.
         :type stream: A file-like textstream.
         :param default_type: The default particle type for
@@ -382,7 +962,15 @@ class PosFileReader(object):
         :type default_type: str
         """
         # Index the stream
-        frames = list(self._scan(stream, default_type))
+        buffer = _map_file(stream)
+        keys = np.array([frame[:3] for frame in self._index(stream, buffer)],
+                        dtype=np.int64).reshape(-1, 3)
+        frames = _FrameIndex(
+            functools.partial(self._make_frame, stream, buffer, default_type), keys)
+        if self._processes != 1 and buffer is not None:
+            frames.decoder = _PosFileDecoder(
+                _stream_filename(stream), _stream_encoding(stream),
+                self._precision, default_type, self._processes)
         if len(frames) == 0:
             raise ParserError("Did not read a single complete frame.")
         logger.info("Read {} frames.".format(len(frames)))
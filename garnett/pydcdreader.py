@@ -97,3 +97,9 @@ def read_frame(stream, xyz, offset=-1):
     frame_header = _read_frame_header(stream)
     _read_frame_body(stream, xyz)
     return frame_header.__dict__
+
+
+def read_frame_header(stream, offset=-1):
+    if offset >= 0:
+        stream.seek(offset)
+    return _read_frame_header(stream).__dict__
@@ -377,6 +377,59 @@ class GSDFile(object):
         else:
             return data_npy.reshape([chunk.N, chunk.M])
 
+    def read_chunk_rows(self, frame, name, start, stop):
+        """ read_chunk_rows(frame, name, start, stop)
+
+        Read the rows *start* to *stop* of a data chunk from the file.
+
+        Like :py:meth:`read_chunk()`, but only the requested rows are read
+        from the file.
+
+        Args:
+            frame (int): Index of the frame to read
+            name (str): Name of the chunk
+            start (int): Index of the first row to read
+            stop (int): Index after the last row to read
+
+        Returns:
+            ``numpy.ndarray[type, ndim=?, mode='c']``: Data read from file.
+        """
+
+        if not self.__is_open:
+            raise ValueError("File is not open")
+
+        chunk = self._find_chunk(frame, name)
+
+        if chunk is None:
+            raise KeyError("frame " + str(frame) + " / chunk " + name
+                           + " not found in: " + str(self.__file))
+
+        if chunk.location == 0:
+            raise RuntimeError("Corrupt chunk: " + str(frame) + " / " + name
+                               + " in file" + str(self.__file))
+
+        start, stop, _ = slice(start, stop).indices(chunk.N)
+        stop = max(start, stop)
+        dtype = gsd_type_mapping[chunk.type]
+        row_size = chunk.M * dtype.itemsize
+        size = (stop - start) * row_size
+
+        if (size == 0):
+            data_npy = numpy.array([], dtype=dtype)
+        else:
+            self.__file.seek(chunk.location + start * row_size, 0)
+            data_raw = self.__file.read(size)
+
+            if len(data_raw) != size:
+                raise IOError
+
+            data_npy = numpy.frombuffer(data_raw, dtype=dtype)
+
+        if chunk.M == 1:
+            return data_npy
+        else:
+            return data_npy.reshape([stop - start, chunk.M])
+
     def find_matching_chunk_names(self, match):
         """ find_matching_chunk_names(match)
 
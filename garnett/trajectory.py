@@ -7,7 +7,19 @@ as affected by external forces.
 The trajectory module provides classes to store discretized
 trajectories."""
 
+import os
+import copy
+import glob
+import json
+import hashlib
 import logging
+import functools
+import weakref
+import threading
+import collections
+import collections.abc
+import multiprocessing
+import concurrent.futures
 import deprecation
 
 import numpy as np
@@ -35,6 +47,29 @@ PARTICLE_PROPERTIES = ['position',
 
 FRAME_TRAJ_PROPS = PARTICLE_PROPERTIES + ['N', 'type', 'types', 'type_ids']
 
+# Keys of data type mappings in addition to the particle properties,
+# see _property_dtype().
+_DTYPE_KEYS = PARTICLE_PROPERTIES + ['box', 'default']
+
+# Frame properties that may be read without loading the whole frame.
+_LAZY_PROPERTIES = PARTICLE_PROPERTIES + ['box', 'types']
+
+# Serializes access to the origin streams of frames, which may be read
+# from background threads, see Trajectory.iter_prefetch().
+_READ_LOCK = threading.RLock()
+
+# Describes where a frame is stored, such that the frame can be restored in
+# other processes by reopening the file by name, see Frame.__reduce__().
+_FrameDescriptor = collections.namedtuple(
+    '_FrameDescriptor', ['filename', 'fmt', 'location', 'options'])
+
+# The metadata of a frame, see Frame._read_metadata().
+_FrameMetadata = collections.namedtuple(
+    '_FrameMetadata', ['N', 'timestep', 'box', 'props'])
+
+# The files opened for frames restored from descriptors, see _open_source().
+_SOURCES = dict()
+
 
 class Box(object):
     """A triclinical box class.
@@ -226,30 +261,46 @@ class Frame(object):
 
     The frame data is read from the origin stream whenever accessed.
 
-    :param dtype: The data type for frame data.
+    Particle properties that the reader provides in the requested data
+    type are not copied when read. They are only copied on first access
+    through the frame properties, so that they can be modified in place:
+
+    .. code::
+
+        frame.position -= [1, 0, 0]
+
+    :param dtype: The data type for frame data or a mapping of property
+        names to data types, see :meth:`.Trajectory.set_dtype`.
     """
+    __slots__ = ('frame_data', '_dtype', '_cache', '_partial_data', '_index', '__weakref__')
 
     def __init__(self, dtype=None):
         if dtype is None:
             dtype = DEFAULT_DTYPE
+        _check_dtype(dtype)
         self.frame_data = None
         self._dtype = dtype
+        self._cache = None
+        self._partial_data = None
+        self._index = None
 
     def _raise_attributeerror(self, attr):
-        value = getattr(self.frame_data, attr, None)
+        value = self._get_property(attr)
         if value is None:
             raise AttributeError('{} not available for this frame'.format(attr))
         else:
             return value
 
-    def _validate_input_array(self, value, dim, nelem=None, dtype=None):
+    def _validate_input_array(self, value, dim, nelem=None, dtype=None, prop=None):
         if dtype is None:
-            dtype = self._dtype
+            dtype = _property_dtype(self._dtype, prop)
         try:
             value = np.asarray(value, dtype=dtype)
         except ValueError:
             raise ValueError("This property can only be set to numeric arrays.")
-        if not np.all(np.isfinite(value)):
+        # The extrema are only finite if all values are finite.
+        if value.size and np.issubdtype(value.dtype, np.inexact) and not (
+                np.isfinite(value.min()) and np.isfinite(value.max())):
             raise ValueError("Property being set must all be finite numbers.")
         elif len(value.shape) != dim:
             raise ValueError("Input array must be {}-dimensional.".format(dim))
@@ -257,21 +308,31 @@ class Frame(object):
             raise ValueError("Input array must be of shape (N, {}) where N is the number of particles.".format(nelem))
         return value
 
-    def _raw_frame_to_frame(self, raw_frame, dtype=None):
-        """Generate a frame object from a raw frame object."""
-        N = len(raw_frame.types)
+    def _raw_frame_to_frame(self, raw_frame, dtype=None, props=None):
+        """Generate a frame object from a raw frame object.
+
+        :param props: The particle properties to convert, defaults to all
+            :data:`PARTICLE_PROPERTIES`. Other properties are set to None."""
+        if props is None:
+            props = PARTICLE_PROPERTIES
+        # Raw frames with properties read individually may omit the types.
+        N = None if raw_frame.types is None else len(raw_frame.types)
         ret = FrameData()
 
-        mapping = dict()
-        for prop in PARTICLE_PROPERTIES:
-            mapping[prop] = np.asarray(getattr(raw_frame, prop), dtype=dtype)
+        mapping = dict.fromkeys(PARTICLE_PROPERTIES)
+        for prop in props:
+            value = getattr(raw_frame, prop)
+            mapping[prop] = np.asarray(value, dtype=_property_dtype(dtype, prop))
+            # Arrays in the requested data type are not copied; read-only
+            # arrays share the reader's buffers and are copied by the
+            # frame properties on first access.
             if len(mapping[prop]) == 0:
                 mapping[prop] = None
 
         assert raw_frame.box is not None
         if isinstance(raw_frame.box, Box):
             raw_frame.box_dimensions = raw_frame.box.dimensions
-            raw_frame.box = np.asarray(raw_frame.box.get_box_matrix(), dtype=dtype)
+            raw_frame.box = np.asarray(raw_frame.box.get_box_matrix(), dtype=_property_dtype(dtype, 'box'))
         box_dimensions = getattr(raw_frame, 'box_dimensions', 3)
         mapping['position'], mapping['velocity'], mapping['orientation'],\
             mapping['angmom'], ret.box = _regularize_box(mapping['position'],
@@ -279,7 +340,7 @@ class Frame(object):
                                                          mapping['orientation'],
                                                          mapping['angmom'],
                                                          raw_frame.box,
-                                                         dtype,
+                                                         _property_dtype(dtype, 'box'),
                                                          box_dimensions)
         for prop in PARTICLE_PROPERTIES:
             setattr(ret, prop, mapping[prop])
@@ -290,10 +351,176 @@ class Frame(object):
         ret.view_rotation = raw_frame.view_rotation
         # validate data
         for prop in PARTICLE_PROPERTIES:
-            if getattr(ret, prop) is not None:
+            if N is not None and getattr(ret, prop) is not None:
                 assert N == len(getattr(ret, prop))
         return ret
 
+    def _read_props(self, props):
+        """Read the box and the given properties of this frame.
+
+        Readers that are able to read properties individually override this
+        method and return a raw frame with all other properties left empty
+        and types set to None, unless requested.
+
+        :param props: Names of particle properties or 'types'.
+        :returns: The raw frame or None, if the properties cannot be read
+            individually and the whole frame must be loaded."""
+        return None
+
+    def _read_particles(self, props, index):
+        """Read the box and the given properties of a subset of the particles.
+
+        Readers that are able to read parts of the particle data override
+        this method, see :meth:`.Trajectory.select`.
+
+        :param props: Names of particle properties.
+        :param index: The sorted indices of the particles to read.
+        :returns: The raw frame with types set to None or None, if the
+            properties of all particles must be read."""
+        return None
+
+    def _get_property(self, prop):
+        """Return a property, only reading it and the box if the frame is not loaded.
+
+        Properties read individually, including any modifications, are kept until
+        the frame is loaded, replacing the data read from the stream, or unloaded.
+        Frames managed by a frame cache are always loaded as a whole."""
+        if self.frame_data is None and self._cache is None and prop in _LAZY_PROPERTIES:
+            if self._partial_data is None or prop not in self._partial_data:
+                with _READ_LOCK:
+                    raw_frame = self._read_props([prop])
+                if raw_frame is not None:
+                    props = [prop] if prop in PARTICLE_PROPERTIES else []
+                    frame_data = self._raw_frame_to_frame(raw_frame, dtype=self._dtype, props=props)
+                    if self._partial_data is None:
+                        self._partial_data = dict()
+                        self._hold()
+                    # Properties read before may have been modified and are kept.
+                    self._partial_data.setdefault('box', frame_data.box)
+                    for name in props:
+                        self._partial_data.setdefault(name, getattr(frame_data, name))
+                    if frame_data.types is not None:
+                        self._partial_data.setdefault('types', frame_data.types)
+            if self._partial_data is not None and prop in self._partial_data:
+                value = self._partial_data[prop] = _writable(self._partial_data[prop])
+                return value
+        self.load()
+        value = _writable(getattr(self.frame_data, prop))
+        setattr(self.frame_data, prop, value)
+        return value
+
+    def _read_frame_data(self, props=None):
+        """Return the frame data, reading it from the stream if necessary.
+
+        In contrast to :meth:`~.load`, data read from the stream is not
+        stored in the frame.
+
+        :param props: The particle properties to read, defaults to all
+            :data:`PARTICLE_PROPERTIES`."""
+        if self.frame_data is not None:
+            return self.frame_data
+        if props is None:
+            props = PARTICLE_PROPERTIES
+        with _READ_LOCK:
+            raw_frame = self._read_props(list(props) + ['types'])
+            if raw_frame is None:
+                raw_frame = self.read()
+        frame_data = self._raw_frame_to_frame(raw_frame, dtype=self._dtype, props=props)
+        self._merge_partial_data(frame_data)
+        return frame_data
+
+    def _read_box(self):
+        """Return the box, only reading the box data if the frame is not loaded.
+
+        In contrast to accessing :attr:`~.box`, the box is not stored in the frame."""
+        if self.frame_data is not None:
+            return self.frame_data.box
+        if self._partial_data is not None and 'box' in self._partial_data:
+            return self._partial_data['box']
+        with _READ_LOCK:
+            raw_frame = self._read_props([])
+        if raw_frame is None:
+            return self._read_frame_data([]).box
+        return self._raw_frame_to_frame(raw_frame, dtype=self._dtype, props=[]).box
+
+    def _read_metadata(self):
+        """Return the number of particles, timestep, box and available
+        particle properties of this frame.
+
+        Readers override this method to read the metadata from headers
+        without decoding the particle data. By default, the frame data
+        is read without storing it in the frame and the timestep is unknown.
+
+        :rtype: :class:`_FrameMetadata`"""
+        frame_data = self._read_frame_data()
+        return _FrameMetadata(
+            N=len(frame_data), timestep=None, box=frame_data.box,
+            props=tuple(prop for prop in PARTICLE_PROPERTIES
+                        if getattr(frame_data, prop) is not None))
+
+    def _descriptor(self):
+        """Return a descriptor of the location of this frame within its file.
+
+        Frames implementing this method and :meth:`~._from_descriptor` can be
+        pickled, e.g., to be processed with :meth:`.Trajectory.map`.
+
+        :returns: The descriptor or None if the origin stream is not a named file."""
+        raise NotImplementedError()
+
+    @classmethod
+    def _from_descriptor(cls, descriptor):
+        "Restore a frame from a descriptor by reopening its file by name."
+        raise NotImplementedError()
+
+    def _fingerprint(self, stats):
+        """Return a description of the origin of the frame data, see
+        :meth:`.Trajectory._source_fingerprint`.
+
+        :param stats: The size and modification time of files by name,
+            filled on demand.
+        :returns: A list or None if the frame holds data, which may have
+            been modified, or was not read from a named file."""
+        if self.frame_data is not None or self._partial_data is not None:
+            return None
+        try:
+            descriptor = self._descriptor()
+        except NotImplementedError:
+            return None
+        if descriptor is None or descriptor.filename is None:
+            return None
+        filename = os.path.abspath(descriptor.filename)
+        if filename not in stats:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                return None
+            stats[filename] = [stat.st_size, stat.st_mtime_ns]
+        return [type(self).__name__, descriptor.fmt, filename, stats[filename],
+                descriptor.location, descriptor.options]
+
+    def __reduce__(self):
+        # Loaded frames are pickled together with their (possibly modified)
+        # data, all other frames only by their location within the file.
+        if self.frame_data is not None:
+            return _restore_loaded_frame, (self.frame_data, self._dtype)
+        try:
+            descriptor = self._descriptor()
+        except NotImplementedError:
+            descriptor = None
+        if descriptor is None:
+            raise TypeError("Cannot pickle unloaded {}, the origin stream is "
+                            "not a named file.".format(type(self).__name__))
+        return _restore_frame, (type(self), descriptor, self._dtype)
+
+    def _hold(self, hold=True):
+        """Keep this frame alive while it holds data.
+
+        Frames created on demand by a frame index are only kept by the
+        index while they are referenced elsewhere or hold data."""
+        if self._index is not None:
+            index, position = self._index
+            index._pin_frame(position, self, hold)
+
     def loaded(self):
         "Returns True if the frame is loaded into memory."
         return self.frame_data is not None
@@ -302,7 +529,26 @@ class Frame(object):
         "Load the frame into memory."
         if self.frame_data is None:
             logger.debug("Loading frame.")
-            self.frame_data = self._raw_frame_to_frame(self.read(), dtype=self._dtype)
+            with _READ_LOCK:
+                raw_frame = self.read()
+            self._set_frame_data(self._raw_frame_to_frame(raw_frame, dtype=self._dtype))
+        elif self._cache is not None:
+            self._cache._hit(self)
+
+    def _merge_partial_data(self, frame_data):
+        "Replace properties of frame data read from the stream with those read individually before."
+        if self._partial_data is not None:
+            for name, value in self._partial_data.items():
+                setattr(frame_data, name, value)
+
+    def _set_frame_data(self, frame_data):
+        "Assign frame data that was read from the stream."
+        self._merge_partial_data(frame_data)
+        self.frame_data = frame_data
+        self._partial_data = None
+        self._hold()
+        if self._cache is not None:
+            self._cache._add(self)
 
     def unload(self):
         """Unload the frame from memory.
@@ -313,6 +559,10 @@ class Frame(object):
         prevent a removal of said data from memory."""
         logger.debug("Removing frame data reference.")
         self.frame_data = None
+        self._partial_data = None
+        self._hold(False)
+        if self._cache is not None:
+            self._cache._discard(self)
 
     @property
     def dtype(self):
@@ -328,18 +578,65 @@ class Frame(object):
         if self.loaded():
             raise RuntimeError(
                 "Cannot change the data type after frame is loaded.")
+        _check_dtype(value)
         self._dtype = value
 
     def __len__(self):
         "Return the number of particles in this frame."
-        self.load()
-        return len(self.frame_data)
+        return len(self._get_property('types'))
 
     def __eq__(self, other):
+        # Frames with identical digests are equal, frames with different
+        # digests may still be equal, e.g., if stored in different data types.
+        if not (self.loaded() or other.loaded()):
+            digest = self._cached_digest()
+            if digest is not None and digest == other._cached_digest():
+                return True
         self.load()
         other.load()
         return self.frame_data == other.frame_data
 
+    def _cached_digest(self):
+        """Returns the digest stored by the frame index or None.
+
+        The stored digest is ignored while properties read individually,
+        which may have been modified, are held by the frame."""
+        if self._index is not None and self._partial_data is None:
+            index, position = self._index
+            return index._digests.get(position)
+
+    def digest(self):
+        """Return a digest of the frame data.
+
+        The digest is computed over the box, types, particle property
+        arrays, data and shape definitions of the frame. Frames with
+        identical digests are equal, which makes digests suitable to
+        find duplicate frames, e.g., when merging trajectories of
+        restarted simulations.
+
+        The digests of frames that are not loaded are computed without
+        loading the frame and stored, such that repeated calls do not
+        read the frame again.
+
+        :returns: The hexadecimal digest.
+        :rtype: str"""
+        if self.frame_data is not None:
+            # Loaded frames may have been modified since they were read.
+            return _frame_data_digest(self.frame_data)
+        digest = self._cached_digest()
+        if digest is None:
+            with _READ_LOCK:
+                raw_frame = self.read()
+            frame_data = self._raw_frame_to_frame(raw_frame, dtype=self._dtype)
+            if self._partial_data is not None:
+                self._merge_partial_data(frame_data)
+                return _frame_data_digest(frame_data)
+            digest = _frame_data_digest(frame_data)
+            if self._index is not None:
+                index, position = self._index
+                index._digests[position] = digest
+        return digest
+
     def __ne__(self, other):
         return not self.__eq__(other)
 
@@ -377,117 +674,12 @@ class Frame(object):
                       created.
         :type scene: :class:`plato.draw.Scene`
         """
-        try:
-            import importlib
-            backend = importlib.import_module('plato.draw.{}'.format(backend))
-        except ImportError:
-            raise ImportError(
-                'Backend plato.draw.{} could not be imported.'.format(backend))
-
-        prims = []
-
-        def make_default_colors(size):
-            return np.array([[0.5, 0.5, 0.5, 1]] * size)
-
-        # Create box primitive
-        box = self.box
-        if self.box.dimensions == 2:
-            box.Lz = 0
-        prims.append(backend.Box.from_box(box, color=(0, 0, 0, 1)))
-
-        # Create a shape primitive for each shape definition
-        for type_name, type_shape in self.shapedef.items():
-            subset = np.where(np.asarray(self.types) == type_name)[0]
-            N_prim = len(subset)
-            dimensions = self.box.dimensions
-
-            if isinstance(type_shape, SphereShape):
-                if dimensions == 3:
-                    prim = backend.Spheres(
-                        positions=self.position[subset],
-                        colors=make_default_colors(N_prim),
-                        radii=[0.5 * type_shape['diameter']] * N_prim,
-                    )
-                else:
-                    prim = backend.Disks(
-                        positions=self.position[subset, :2],
-                        colors=make_default_colors(N_prim),
-                        radii=[0.5 * type_shape['diameter']] * N_prim,
-                    )
-            elif isinstance(type_shape, SphereUnionShape):
-                if dimensions == 3:
-                    prim = backend.SphereUnions(
-                        positions=self.position[subset],
-                        orientations=self.orientation[subset],
-                        colors=make_default_colors(len(type_shape['centers'])),
-                        points=type_shape['centers'],
-                        radii=[0.5 * d for d in type_shape['diameters']],
-                    )
-                else:
-                    prim = backend.DiskUnions(
-                        positions=self.position[subset, :2],
-                        orientations=self.orientation[subset],
-                        colors=make_default_colors(len(type_shape['centers'])),
-                        points=[c[:2] for c in type_shape['centers']],
-                        radii=[0.5 * d for d in type_shape['diameters']],
-                    )
-            elif isinstance(type_shape, ConvexPolyhedronShape):
-                prim = backend.ConvexPolyhedra(
-                    positions=self.position[subset],
-                    orientations=self.orientation[subset],
-                    colors=make_default_colors(N_prim),
-                    vertices=type_shape['vertices'],
-                )
-            elif isinstance(type_shape, ConvexSpheropolyhedronShape):
-                prim = backend.ConvexSpheropolyhedra(
-                    positions=self.position[subset],
-                    orientations=self.orientation[subset],
-                    colors=make_default_colors(N_prim),
-                    vertices=type_shape['vertices'],
-                    radius=type_shape['rounding_radius'],
-                )
-            elif isinstance(type_shape, GeneralPolyhedronShape):
-                prim = backend.Mesh(
-                    positions=self.position[subset],
-                    orientations=self.orientation[subset],
-                    colors=make_default_colors(len(type_shape['vertices'])),
-                    vertices=type_shape['vertices'],
-                    indices=type_shape['faces'],
-                    shape_colors=make_default_colors(N_prim),
-                )
-            elif isinstance(type_shape, PolygonShape):
-                prim = backend.Polygons(
-                    positions=self.position[subset, :2],
-                    orientations=self.orientation[subset],
-                    colors=make_default_colors(N_prim),
-                    vertices=type_shape['vertices'],
-                )
-            elif isinstance(type_shape, SpheropolygonShape):
-                prim = backend.Spheropolygons(
-                    positions=self.position[subset, :2],
-                    orientations=self.orientation[subset],
-                    colors=make_default_colors(N_prim),
-                    vertices=type_shape['vertices'],
-                    radius=type_shape['rounding_radius'],
-                )
-            else:
-                print('Unsupported shape:', type_shape)
-                continue
-            prims.append(prim)
-
-        if scene is None:
-            scene = backend.Scene(prims)
-        else:
-            for prim in prims:
-                scene.add_primitive(prim)
-
-        return scene
+        return _PlatoSceneUpdater(_plato_backend(backend), scene).update(self)
 
     @property
     def box(self):
         "Instance of :class:`~.Box`"
-        self.load()
-        return self.frame_data.box
+        return self._get_property('box')
 
     @box.setter
     def box(self, value):
@@ -497,8 +689,7 @@ class Frame(object):
     @property
     def types(self):
         "Nx1 array of types represented as strings."
-        self.load()
-        return self.frame_data.types
+        return self._get_property('types')
 
     @types.setter
     def types(self, value):
@@ -508,13 +699,12 @@ class Frame(object):
     @property
     def position(self):
         "Nx3 array of coordinates for N particles in 3 dimensions."
-        self.load()
         return self._raise_attributeerror('position')
 
     @position.setter
     def position(self, value):
         # Various sanity checks
-        value = self._validate_input_array(value, dim=2, nelem=3)
+        value = self._validate_input_array(value, dim=2, nelem=3, prop='position')
         self.load()
         self.frame_data.position = value
 
@@ -533,19 +723,18 @@ class Frame(object):
     @positions.setter
     def positions(self, value):
         # Various sanity checks
-        value = self._validate_input_array(value, dim=2, nelem=3)
+        value = self._validate_input_array(value, dim=2, nelem=3, prop='position')
         self.load()
         self.frame_data.position = value
 
     @property
     def orientation(self):
         "Nx4 array of rotational coordinates for N particles represented as quaternions."
-        self.load()
         return self._raise_attributeerror('orientation')
 
     @orientation.setter
     def orientation(self, value):
-        value = self._validate_input_array(value, dim=2, nelem=4)
+        value = self._validate_input_array(value, dim=2, nelem=4, prop='orientation')
         self.load()
         self.frame_data.orientation = value
 
@@ -563,19 +752,18 @@ class Frame(object):
 
     @orientations.setter
     def orientations(self, value):
-        value = self._validate_input_array(value, dim=2, nelem=4)
+        value = self._validate_input_array(value, dim=2, nelem=4, prop='orientation')
         self.load()
         self.frame_data.orientation = value
 
     @property
     def velocity(self):
         "Nx3 array of velocities for N particles in 3 dimensions."
-        self.load()
         return self._raise_attributeerror('velocity')
 
     @velocity.setter
     def velocity(self, value):
-        value = self._validate_input_array(value, dim=2, nelem=3)
+        value = self._validate_input_array(value, dim=2, nelem=3, prop='velocity')
         self.load()
         self.frame_data.velocity = value
 
@@ -593,75 +781,69 @@ class Frame(object):
 
     @velocities.setter
     def velocities(self, value):
-        value = self._validate_input_array(value, dim=2, nelem=3)
+        value = self._validate_input_array(value, dim=2, nelem=3, prop='velocity')
         self.load()
         self.frame_data.velocity = value
 
     @property
     def mass(self):
         "Nx1 array of masses for N particles."
-        self.load()
         return self._raise_attributeerror('mass')
 
     @mass.setter
     def mass(self, value):
-        value = self._validate_input_array(value, dim=1)
+        value = self._validate_input_array(value, dim=1, prop='mass')
         self.load()
         self.frame_data.mass = value
 
     @property
     def charge(self):
         "Nx1 array of charges for N particles."
-        self.load()
         return self._raise_attributeerror('charge')
 
     @charge.setter
     def charge(self, value):
-        value = self._validate_input_array(value, dim=1)
+        value = self._validate_input_array(value, dim=1, prop='charge')
         self.load()
         self.frame_data.charge = value
 
     @property
     def diameter(self):
         "Nx1 array of diameters for N particles."
-        self.load()
         return self._raise_attributeerror('diameter')
 
     @diameter.setter
     def diameter(self, value):
-        value = self._validate_input_array(value, dim=1)
+        value = self._validate_input_array(value, dim=1, prop='diameter')
         self.load()
         self.frame_data.diameter = value
 
     @property
     def moment_inertia(self):
         "Nx3 array of principal moments of inertia for N particles in 3 dimensions."
-        self.load()
         return self._raise_attributeerror('moment_inertia')
 
     @moment_inertia.setter
     def moment_inertia(self, value):
         ndof = self.box.dimensions * (self.box.dimensions - 1) / 2
-        self._validate_input_array(value, dim=2, nelem=ndof)
+        self._validate_input_array(value, dim=2, nelem=ndof, prop='moment_inertia')
         self.load()
         self.frame_data.moment_inertia = value
 
     @property
     def angmom(self):
         "Nx4 array of angular momenta for N particles represented as quaternions."
-        self.load()
         return self._raise_attributeerror('angmom')
 
     @angmom.setter
     def angmom(self, value):
-        value = self._validate_input_array(value, dim=2, nelem=4)
+        value = self._validate_input_array(value, dim=2, nelem=4, prop='angmom')
         self.load()
         self.frame_data.angmom = value
 
     @property
     def image(self):
         "Nx3 array of periodic images for N particles in 3 dimensions."
-        self.load()
         return self._raise_attributeerror('image')
 
     @image.setter
@@ -695,7 +877,6 @@ class Frame(object):
     @property
     def shapedef(self):
         "An ordered dictionary of instances of :class:`~.shapes.Shape`."
-        self.load()
         return self._raise_attributeerror('shapedef')
 
     @shapedef.setter
@@ -710,6 +891,318 @@ class Frame(object):
         return self.frame_data.view_rotation
 
 
+class _SelectedFrame(Frame):
+    """A frame that contains a subset of the particles of another frame.
+
+    The particle properties of the selected particles are read with
+    :meth:`~.Frame._read_particles` where the reader supports it,
+    see :meth:`.Trajectory.select`.
+
+    :param frame: The frame to select particles from.
+    :param indices: The particle indices, slice or boolean mask.
+    :param types: The names of the particle types to select."""
+    __slots__ = ('_frame', '_indices', '_types')
+
+    def __init__(self, frame, indices=None, types=None, dtype=None):
+        super(_SelectedFrame, self).__init__(dtype=frame.dtype if dtype is None else dtype)
+        self._frame = frame
+        self._indices = indices
+        self._types = types
+
+    def __str__(self):
+        return "_SelectedFrame({})".format(self._frame)
+
+    def __reduce__(self):
+        if self.frame_data is not None:
+            return super(_SelectedFrame, self).__reduce__()
+        return _SelectedFrame, (self._frame, self._indices, self._types, self._dtype)
+
+    def _fingerprint(self, stats):
+        if self.frame_data is not None or self._partial_data is not None:
+            return None
+        fingerprint = self._frame._fingerprint(stats)
+        if fingerprint is None:
+            return None
+        indices = self._indices
+        if isinstance(indices, slice):
+            indices = [indices.start, indices.stop, indices.step]
+        elif indices is not None:
+            indices = np.asarray(indices).tolist()
+        return [fingerprint, indices, self._types]
+
+    def _selection(self, types):
+        "Return the sorted indices of the selected particles among particles of the given types."
+        index = np.arange(len(types))
+        if self._indices is not None:
+            index = np.unique(index[self._indices])
+        if self._types is not None:
+            index = index[np.isin(np.asarray(types, dtype=np.str_)[index], self._types)]
+        return index
+
+    def read(self):
+        return self._read_selected(None)
+
+    def _read_metadata(self):
+        frame = self._frame
+        if frame.frame_data is None:
+            # The selection only depends on the types of the particles.
+            with _READ_LOCK:
+                raw_types = frame._read_props(['types'])
+            if raw_types is not None:
+                return frame._read_metadata()._replace(N=len(self._selection(raw_types.types)))
+        return super(_SelectedFrame, self)._read_metadata()
+
+    def _read_props(self, props):
+        return self._read_selected([prop for prop in props if prop in PARTICLE_PROPERTIES])
+
+    def _read_selected(self, props):
+        """Read the raw frame of the selected particles.
+
+        :param props: The particle properties to read or None to read
+            the whole frame."""
+        frame = self._frame
+        with _READ_LOCK:
+            if frame.frame_data is None and props is not None:
+                raw_types = frame._read_props(['types'])
+                if raw_types is not None:
+                    index = self._selection(raw_types.types)
+                    raw_frame = frame._read_particles(props, index)
+                    if raw_frame is None:
+                        raw_frame = frame._read_props(props)
+                        if raw_frame is not None:
+                            _select_particles(raw_frame, index)
+                    if raw_frame is not None:
+                        raw_frame.types = [raw_types.types[i] for i in index]
+                        return raw_frame
+            if frame.frame_data is None:
+                raw_frame = frame.read()
+            else:
+                raw_frame = _frame_data_to_raw_frame(frame.frame_data)
+        _select_particles(raw_frame, self._selection(raw_frame.types))
+        return raw_frame
+
+
+class FrameCache(object):
+    """A bounded cache of loaded frames with least-recently-used eviction.
+
+    Frames are added to the cache when they are loaded. Whenever the
+    number of cached frames or their total size in bytes exceeds the
+    given limits, the least recently used frames are unloaded.
+
+    .. code::
+
+        cache = traj.enable_cache(max_frames=100, max_bytes=2**30)
+        for i in indices:
+            traj[i].position
+        print(cache.hits, cache.misses)
+
+    .. warning::
+
+        Changes made to the data of an evicted frame are lost, the
+        frame is read from the origin stream again on next access.
+
+    :param max_frames: The maximum number of cached frames (default: unlimited).
+    :type max_frames: int
+    :param max_bytes: The maximum total size of the cached frame data
+        arrays in bytes (default: unlimited).
+    :type max_bytes: int
+    """
+
+    def __init__(self, max_frames=None, max_bytes=None):
+        self.max_frames = max_frames
+        "The maximum number of cached frames."
+        self.max_bytes = max_bytes
+        "The maximum total size of the cached frame data in bytes."
+        self.hits = 0
+        "The number of accesses to frames which were already loaded."
+        self.misses = 0
+        "The number of frames which had to be read."
+        self.nbytes = 0
+        "The total size of the cached frame data in bytes."
+        self._frames = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __str__(self):
+        return "FrameCache(frames={}, nbytes={}, hits={}, misses={})".format(
+            len(self), self.nbytes, self.hits, self.misses)
+
+    def __repr__(self):
+        return str(self)
+
+    def _hit(self, frame):
+        with self._lock:
+            self.hits += 1
+            if id(frame) in self._frames:
+                self._frames.move_to_end(id(frame))
+
+    def _add(self, frame):
+        with self._lock:
+            self.misses += 1
+            nbytes = _frame_data_nbytes(frame.frame_data)
+            self._discard(frame)
+            self._frames[id(frame)] = (frame, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def _discard(self, frame):
+        with self._lock:
+            entry = self._frames.pop(id(frame), None)
+            if entry is not None:
+                self.nbytes -= entry[1]
+
+    def _evict(self):
+        # The most recently added frame is never evicted.
+        while len(self._frames) > 1 and (
+                (self.max_frames is not None and len(self._frames) > self.max_frames) or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            frame, nbytes = self._frames.popitem(last=False)[1]
+            self.nbytes -= nbytes
+            frame.unload()
+
+    def clear(self):
+        "Unload all cached frames."
+        with self._lock:
+            while self._frames:
+                frame, nbytes = self._frames.popitem(last=False)[1]
+                self.nbytes -= nbytes
+                frame.unload()
+
+
+class RaggedArray(object):
+    """Arrays of varying length stored as one concatenated array.
+
+    The i-th array is a view of ``data[offsets[i]:offsets[i+1]]``:
+
+    .. code::
+
+        position = traj.ragged('position')
+        position.data          # sum(N)x3
+        position.offsets       # M+1
+        position[i]            # N[i]x3
+        position.padded()      # MxNx3
+
+    :param data: The concatenated arrays.
+    :type data: :class:`numpy.ndarray`
+    :param offsets: The M+1 offsets of the arrays within data.
+    :type offsets: :class:`numpy.ndarray`
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        "The concatenated arrays."
+        self.offsets = offsets
+        "The offsets of the arrays within data."
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __str__(self):
+        return "RaggedArray(# arrays={}, shape={})".format(len(self), self.data.shape)
+
+    def __repr__(self):
+        return str(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices of ragged arrays are supported.")
+            offsets = self.offsets[start:max(start, stop) + 1]
+            return RaggedArray(self.data[offsets[0]:offsets[-1]], offsets - offsets[0])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Ragged array index out of range.")
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def lengths(self):
+        "The lengths of the arrays."
+        return np.diff(self.offsets)
+
+    def padded(self, fill_value=0):
+        """Return all arrays as one array, padding shorter arrays.
+
+        :param fill_value: The value of padded entries.
+        :returns: An array of shape MxNx..., where N is the maximum length."""
+        lengths = self.lengths
+        N = lengths.max() if len(lengths) else 0
+        padded = np.full((len(self), N) + self.data.shape[1:], fill_value,
+                         dtype=self.data.dtype)
+        padded[np.arange(N) < lengths[:, np.newaxis]] = self.data
+        return padded
+
+
+class _FrameIndex(collections.abc.Sequence):
+    """A sequence of frames created on demand from an array of keys.
+
+    Readers store one key per frame, e.g., a byte offset or an index
+    within the file, instead of one frame object per frame. Frames are
+    created on access and only kept while they are referenced elsewhere,
+    loaded or otherwise hold data. Slices are views sharing the frames.
+
+    Readers may assign a ``decoder``, which decodes frames in bulk, e.g.,
+    in worker processes. Its method ``decode(frames)`` yields the raw
+    frames of the given iterable of frames in order.
+
+    :param factory: Callable returning the frame for a key.
+    :param keys: The keys of all frames.
+    :type keys: A sequence, e.g., :class:`numpy.ndarray` or range
+    """
+
+    def __init__(self, factory, keys):
+        self._factory = factory
+        self._keys = keys
+        self._positions = range(len(keys))
+        self._frames = weakref.WeakValueDictionary()
+        self._pinned = dict()
+        self._digests = dict()
+        self._lock = threading.RLock()
+        self.cache = None
+        self.dtype = None
+        self.decoder = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            view = copy.copy(self)
+            view._positions = self._positions[index]
+            return view
+        position = self._positions[index]
+        with self._lock:
+            frame = self._frames.get(position)
+            if frame is None:
+                frame = self._factory(self._keys[position])
+                frame._index = (self, position)
+                frame._cache = self.cache
+                if self.dtype is not None:
+                    frame._dtype = self.dtype
+                self._frames[position] = frame
+            return frame
+
+    def _pin_frame(self, position, frame, pin):
+        with self._lock:
+            if pin:
+                self._pinned[position] = frame
+            else:
+                self._pinned.pop(position, None)
+
+    def live_frames(self):
+        "Returns the frames of this index, which currently exist."
+        with self._lock:
+            return [frame for position, frame in sorted(self._frames.items())
+                    if position in self._positions]
+
+
 class BaseTrajectory(object):
 
     def __init__(self, frames=None):
@@ -768,7 +1261,8 @@ class ImmutableTrajectory(BaseTrajectory):
             if self.frame is not None and self._unload_last:
                 self.frame.unload()
             self.frame = next(self.frame_iter)
-            self._unload_last = not self.frame.loaded()
+            # Frames managed by a frame cache are unloaded by the cache.
+            self._unload_last = not self.frame.loaded() and self.frame._cache is None
             return self.frame
 
         next = __next__
@@ -824,13 +1318,15 @@ class Trajectory(BaseTrajectory):
 
     :param frames: The individual frames of this trajectory.
     :type frames: :class:`~.Frame`
-    :param dtype: The default data type for trajectory data.
+    :param dtype: The default data type for trajectory data or a mapping
+        of property names to data types, see :meth:`~.set_dtype`.
     """
 
     def __init__(self, frames=None, dtype=None):
         super(Trajectory, self).__init__(frames=frames)
         if dtype is None:
             dtype = DEFAULT_DTYPE
+        _check_dtype(dtype)
         self._dtype = dtype
         self._N = None
         self._type = None
@@ -845,10 +1341,74 @@ class Trajectory(BaseTrajectory):
         self._moment_inertia = None
         self._angmom = None
         self._image = None
+        self._cache = None
 
     def __iter__(self):
+        if getattr(self.frames, 'decoder', None) is not None:
+            return self._iter_decoded()
         return iter(ImmutableTrajectory(self.frames))
 
+    def _iter_decoded(self):
+        """Iterate over all frames, which are decoded in bulk by the decoder
+        of the frame index.
+
+        Like regular iteration, frames that were not loaded before are
+        unloaded after they have been processed."""
+        for frame, frame_data in self._iter_frame_data():
+            unload = False
+            if not frame.loaded():
+                frame._set_frame_data(frame_data)
+                unload = frame._cache is None
+            yield frame
+            if unload:
+                frame.unload()
+
+    def _iter_frame_data(self, props=None, load_frames=False):
+        """Yields all frames together with their frame data.
+
+        Frames that are not loaded are read one by one or, if the frame
+        index has a decoder, decoded in bulk by the decoder.
+
+        :param props: The particle properties to convert, defaults to all
+            :data:`PARTICLE_PROPERTIES`.
+        :param load_frames: Load the frames into memory while reading."""
+        # Frames are accessed by position, such that frame indices only
+        # create the frame objects while they are processed.
+        frames = self.frames
+        decoder = getattr(frames, 'decoder', None)
+        if decoder is None:
+            for i in range(len(frames)):
+                frame = frames[i]
+                if load_frames:
+                    frame.load()
+                yield frame, frame._read_frame_data(props)
+            return
+        loaded = {frame._index[1] for frame in frames.live_frames() if frame.loaded()}
+
+        def pending():
+            for i in range(len(frames)):
+                frame = frames[i]
+                if frame._index[1] not in loaded:
+                    yield frame
+
+        raw_frames = decoder.decode(pending())
+        try:
+            for i in range(len(frames)):
+                frame = frames[i]
+                if frame._index[1] not in loaded:
+                    raw_frame = next(raw_frames)
+                    if not frame.loaded():
+                        frame_data = frame._raw_frame_to_frame(
+                            raw_frame, dtype=frame._dtype,
+                            props=None if load_frames else props)
+                        if load_frames:
+                            frame._set_frame_data(frame_data)
+                        yield frame, frame_data
+                        continue
+                yield frame, frame._read_frame_data(props)
+        finally:
+            raw_frames.close()
+
     def load(self):
         """Load all frames into memory.
 
@@ -866,6 +1426,323 @@ class Trajectory(BaseTrajectory):
         for frame in self.frames:
             frame.load()
 
+    def iter_prefetch(self, depth=2):
+        """Iterate over all frames while reading the next frames in the background.
+
+        While the frame at position *i* is processed, the frames at
+        positions *i+1* to *i+depth* are read and converted by a
+        background thread. The frames are yielded in order:
+
+        .. code::
+
+            for frame in traj.iter_prefetch(depth=4):
+                analyze(frame.position)
+
+        Reading from the origin streams is serialized by a lock shared by
+        all frames, which also covers the decoding within the readers,
+        hence the frames are read by a single thread; only the reading
+        overlaps with the processing of the yielded frames. Like regular
+        iteration, frames that were not loaded before are
+        unloaded after they have been processed, unless they are managed
+        by a frame cache.
+
+        :param depth: The number of frames to read ahead.
+        :type depth: int
+        :raises ValueError: If depth is smaller than 1.
+        """
+        if depth < 1:
+            raise ValueError("The prefetch depth must be at least 1.")
+        # Frames are accessed by position, such that frame indices only
+        # create the frame objects of the frames read ahead.
+        frames = self.frames
+        M = len(frames)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            pending = collections.deque()
+            try:
+                for i in range(min(depth + 1, M)):
+                    frame = frames[i]
+                    pending.append((frame, executor.submit(_prefetch_frame_data, frame)))
+                for i in range(M):
+                    frame, future = pending.popleft()
+                    frame_data = future.result()
+                    if i + depth + 1 < M:
+                        ahead = frames[i + depth + 1]
+                        pending.append((ahead, executor.submit(_prefetch_frame_data, ahead)))
+                    unload = False
+                    if frame_data is not None and not frame.loaded():
+                        frame._set_frame_data(frame_data)
+                        unload = frame._cache is None
+                    yield frame
+                    if unload:
+                        frame.unload()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def iter_batches(self, size, stride=None, props=None):
+        """Iterate over batches of consecutive frames as stacked arrays.
+
+        Each batch is a dictionary with an array of shape BxNx... for each
+        requested particle property, where B is the number of frames in the
+        batch and N the largest number of particles encountered so far.
+        Frames with fewer particles are padded with zeros, the frame sizes
+        are provided as ``'N'``:
+
+        .. code::
+
+            for batch in traj.iter_batches(100, props=['position']):
+                analyze(batch['position'])  # 100xNx3 numpy.ndarray
+
+        Batches start every *stride* frames and the last batch is truncated
+        at the end of the trajectory. By default, stride equals size and
+        batches do not overlap.
+
+        Only the frames of one batch are held in memory: the arrays are
+        reused and overwritten by the next batch, frames shared with the
+        previous batch are moved instead of read again. Copy arrays that
+        are needed beyond one iteration. If the trajectory arrays are
+        loaded, see :meth:`~.load_arrays`, the batches are views of those.
+
+        :param size: The number of frames per batch.
+        :type size: int
+        :param stride: The offset between the first frames of
+            consecutive batches, defaults to size.
+        :type stride: int
+        :param props: The particle properties to stack, defaults to all
+            :data:`PARTICLE_PROPERTIES`.
+        :type props: list
+        :raises ValueError: If size or stride is smaller than 1 or if
+            props contains unknown properties.
+        :raises AttributeError: If a property is not available for all frames.
+        """
+        if stride is None:
+            stride = size
+        props = self._check_batches(size, stride, props)
+        # The last batch is the first one that reaches the end of the trajectory.
+        last = -(-max(len(self) - size, 0) // stride) * stride
+        starts = range(0, min(last + 1, len(self)), stride)
+        return self._iter_batches(starts, size, props)
+
+    def windows(self, size, stride=1, props=None):
+        """Iterate over overlapping windows of consecutive frames as stacked arrays.
+
+        Like :meth:`~.iter_batches`, but all windows contain exactly *size*
+        frames and by default start at every frame, e.g., to compute
+        time correlations:
+
+        .. code::
+
+            for window in traj.windows(10, props=['position']):
+                displacement = window['position'] - window['position'][0]
+
+        :param size: The number of frames per window.
+        :type size: int
+        :param stride: The offset between the first frames of
+            consecutive windows.
+        :type stride: int
+        :param props: The particle properties to stack, defaults to all
+            :data:`PARTICLE_PROPERTIES`.
+        :type props: list
+        :raises ValueError: If size or stride is smaller than 1 or if
+            props contains unknown properties.
+        :raises AttributeError: If a property is not available for all frames.
+        """
+        props = self._check_batches(size, stride, props)
+        return self._iter_batches(range(0, len(self) - size + 1, stride), size, props)
+
+    def _check_batches(self, size, stride, props):
+        "Validate the batch arguments and return the particle properties."
+        if size < 1:
+            raise ValueError("The batch size must be at least 1.")
+        if stride < 1:
+            raise ValueError("The stride must be at least 1.")
+        return _check_props(props)
+
+    def _iter_batches(self, starts, size, props):
+        "Yield the batches of size frames starting at the given positions."
+        arrays = {prop: getattr(self, '_' + prop) for prop in props}
+        if self._N is not None and all(array is not None for array in arrays.values()):
+            for start in starts:
+                batch = {prop: array[start:start + size] for prop, array in arrays.items()}
+                batch['N'] = self._N[start:start + size]
+                yield batch
+            return
+
+        buffers = dict.fromkeys(props)
+        N = np.zeros(size, dtype=np.int_)
+        previous = None
+        for start in starts:
+            stop = min(start + size, len(self))
+            first = start
+            if previous is not None and start < previous[1]:
+                # Move the frames shared with the previous batch to the front.
+                shift, overlap = start - previous[0], previous[1] - start
+                N[:overlap] = N[shift:shift + overlap]
+                for prop in props:
+                    buffers[prop][:overlap] = buffers[prop][shift:shift + overlap]
+                first = previous[1]
+            for j in range(first, stop):
+                frame_data = self.frames[j]._read_frame_data(props)
+                i = j - start
+                N[i] = len(frame_data)
+                for prop in props:
+                    value = getattr(frame_data, prop)
+                    if value is None:
+                        raise AttributeError('{} not available for this trajectory'.format(prop))
+                    buffers[prop] = _fill_frame_array(
+                        buffers[prop], i, size, value, self._array_dtype(prop))
+                    # Clear the padding left by the previous content of the buffer.
+                    buffers[prop][i, len(value):] = 0
+            previous = (start, stop)
+            batch = {prop: buffer[:stop - start] for prop, buffer in buffers.items()}
+            batch['N'] = N[:stop - start]
+            yield batch
+
+    def iter_hoomd_snapshots(self, reuse=True):
+        """Iterate over HOOMD-blue snapshots of all frames.
+
+        By default, the snapshot of the previous frame is refilled in
+        place, unless the number of particles, the particle types or the
+        available particle properties change:
+
+        .. code::
+
+            for snapshot in traj.iter_hoomd_snapshots():
+                system.restore_snapshot(snapshot)
+                hoomd.run(1000)
+
+        :param reuse: Refill the previous snapshot where possible. Copy
+            reused snapshots that are needed beyond one iteration.
+        :type reuse: bool
+        """
+        snapshot = props = None
+        for frame in self:
+            # Each frame is read once as a whole instead of property by property.
+            frame.load()
+            frame_data = frame.frame_data
+            frame_props = [prop for prop in PARTICLE_PROPERTIES
+                           if getattr(frame_data, prop) is not None]
+            if reuse and snapshot is not None and props == frame_props and \
+                    snapshot.particles.N == len(frame_data):
+                try:
+                    _refill_hoomd_snapshot(frame_data, snapshot)
+                except ValueError:  # The particle types changed.
+                    snapshot = None
+            else:
+                snapshot = None
+            if snapshot is None:
+                snapshot, props = _to_hoomd_snapshot(frame_data), frame_props
+            yield snapshot
+
+    def to_plato_animation(self, backend, scene=None):
+        """Iterate over all frames rendered into one plato scene.
+
+        The primitives are created for the first frame; for the following
+        frames only the positions, orientations and the box are updated
+        in place. Primitives are only recreated if the shape definitions
+        or the number of particles of any type change:
+
+        .. code::
+
+            for i, scene in enumerate(traj.to_plato_animation('fresnel')):
+                scene.save('frame_{:05d}.png'.format(i))
+
+        :param backend: Backend name to use with plato. The backend must
+                        support all primitives corresponding to shapes defined
+                        in the frames.
+        :type backend: str
+        :param scene: Scene object to render into. By default, a new scene is
+                      created.
+        :type scene: :class:`plato.draw.Scene`
+        :yields: The scene after it was updated for each frame.
+        """
+        updater = _PlatoSceneUpdater(_plato_backend(backend), scene)
+        for frame in self:
+            yield updater.update(frame)
+
+    def map(self, func, processes=None, chunksize=None):
+        """Apply a function to all frames using a pool of processes.
+
+        The frames are sent to the worker processes by their location
+        within the file, which is reopened by name in each worker process.
+        Only loaded frames are sent together with their data. The results
+        are returned in the order of the frames:
+
+        .. code::
+
+            def analyze(frame):
+                return frame.position.mean(axis=0)
+
+            means = traj.map(analyze, processes=4)
+
+        The function and its return values must be picklable, e.g., the
+        function must be defined at the module level.
+
+        :param func: The function to call with each frame.
+        :type func: callable
+        :param processes: The number of worker processes
+            (default: the number of CPUs).
+        :type processes: int
+        :param chunksize: The number of consecutive frames that are
+            processed by a worker at once.
+        :type chunksize: int
+        :returns: The list of return values.
+        :rtype: list
+        :raises TypeError: If the origin stream of an unloaded frame
+            is not a named file."""
+        if processes == 1:
+            return [func(frame) for frame in self]
+        with multiprocessing.Pool(processes) as pool:
+            return pool.map(functools.partial(_map_frame, func),
+                            self.frames, chunksize)
+
+    @property
+    def cache(self):
+        "The :class:`~.FrameCache` of this trajectory or None if disabled."
+        return self._cache
+
+    def enable_cache(self, max_frames=None, max_bytes=None):
+        """Limit the number of frames kept in memory.
+
+        Loaded frames are kept in memory, until either limit is exceeded.
+        In that case, the least recently used frames are unloaded. Iterating
+        over the trajectory does not unload frames managed by the cache.
+
+        :param max_frames: The maximum number of loaded frames (default: unlimited).
+        :type max_frames: int
+        :param max_bytes: The maximum total size of the loaded frame data
+            arrays in bytes (default: unlimited).
+        :type max_bytes: int
+        :returns: The frame cache.
+        :rtype: :class:`~.FrameCache`"""
+        self.disable_cache()
+        self._cache = FrameCache(max_frames=max_frames, max_bytes=max_bytes)
+        frames = self.frames
+        if isinstance(frames, _FrameIndex):
+            # Frames that do not exist yet are assigned the cache on creation.
+            frames.cache = self._cache
+            frames = frames.live_frames()
+        for frame in frames:
+            frame._cache = self._cache
+            if frame.loaded():
+                self._cache._add(frame)
+        self._cache.misses = 0
+        return self._cache
+
+    def disable_cache(self):
+        """Disable the frame cache.
+
+        Frames that are currently loaded remain in memory."""
+        if self._cache is not None:
+            frames = self.frames
+            if isinstance(frames, _FrameIndex):
+                frames.cache = None
+                frames = frames.live_frames()
+            for frame in frames:
+                if frame._cache is self._cache:
+                    frame._cache = None
+            self._cache = None
+
     def loaded(self):
         """Returns True if all frames are loaded into memory.
 
@@ -897,10 +1774,13 @@ class Trajectory(BaseTrajectory):
             return value
 
     def _max_N(self):
-        "Returns the size of the largest frame within this trajectory."
-        return max((len(f) for f in self.frames))
+        """Returns the size of the largest frame within this trajectory.
+
+        The sizes of frames which are not loaded are read from the frame
+        metadata without decoding the particle data."""
+        return max((len(f) if f.loaded() else f._read_metadata().N for f in self.frames), default=0)
 
-    def load_arrays(self):
+    def load_arrays(self, props=None, directory=None):
         """Load positions, orientations and types into memory.
 
         After calling this function, positions, orientations
@@ -915,6 +1795,19 @@ class Trajectory(BaseTrajectory):
             traj.types         # MxN
             traj.type_ids      # MxN
 
+        Frames with less than N particles are padded with zeros.
+        The arrays are preallocated and filled frame by frame.
+
+        Use the ``props`` argument to only load selected particle
+        properties, all other properties are not converted. In this
+        case, frames which are not already loaded are read without
+        keeping them in memory:
+
+        .. code::
+
+            traj.load_arrays(props=['position'])
+            traj.position      # MxNx3
+
         .. note::
 
             It is not necessary to call this function again when
@@ -934,68 +1827,48 @@ class Trajectory(BaseTrajectory):
                 sub_traj = traj[m:n]
                 sub_traj.load_arrays()
                 sub_traj.position
-        """
-        # Determine array shapes
-        _N = np.array([len(f) for f in self.frames], dtype=np.int_)
-        M = len(self)
-        N = _N.max()
-
-        # Types
-        types = [f.types for f in self.frames]
-        type_ids = np.zeros((M, N), dtype=np.uint32)
-        _type = _generate_type_id_array(types, type_ids)
-
-        props = dict(
-            position=[None] * M,
-            orientation=[None] * M,
-            velocity=[None] * M,
-            mass=[None] * M,
-            charge=[None] * M,
-            diameter=[None] * M,
-            moment_inertia=[None] * M,
-            angmom=[None] * M,
-            image=[None] * M,
-        )
 
-        for i, frame in enumerate(self.frames):
-            # loop over desired properties
-            for prop in PARTICLE_PROPERTIES:
-                try:
-                    frame_prop = frame._raise_attributeerror(prop)
-                except AttributeError:
-                    frame_prop = None
-                if frame_prop is not None:
-                    props[prop][i] = frame_prop
+        Provide a ``directory`` to store the arrays in memory-mapped
+        ``.npy`` files instead of main memory. Arrays that were previously
+        stored in the same directory for the same frames and particles of
+        unmodified, named files are attached without reading the frames
+        again, the arrays of unnamed streams and frames with data in
+        memory are always read again:
 
-        for prop in PARTICLE_PROPERTIES:
-            # This builds NumPy arrays for properties with
-            # no missing values (i.e. None).
-            if any(p is None for p in props[prop]):
-                # If the list contains a None value, set property to None
-                # in order for AttributeError to be raised properly
-                props[prop] = None
-            else:
-                dtype_ = np.int32 if prop == 'image' else DEFAULT_DTYPE
-                try:
-                    props[prop] = np.asarray(props[prop], dtype=dtype_)
-                except (TypeError, ValueError):
-                    props[prop] = np.asarray(props[prop])
+        .. code::
+
+            traj.load_arrays(directory='traj_arrays')
+            traj.position      # MxNx3 numpy.memmap (read-only)
+
+        :param props: The particle properties to load, defaults to all
+            :data:`PARTICLE_PROPERTIES`.
+        :type props: list
+        :param directory: Directory for memory-mapped array files.
+        :type directory: str
+        :raises ValueError: If props contains unknown properties.
+        """
+        load_frames = props is None and directory is None
+        props = _check_props(props)
+        if directory is None:
+            arrays = self._read_arrays(props, load_frames)
+        else:
+            array_directory = _ArrayDirectory(directory)
+            dtypes = {prop: self._array_dtype(prop) for prop in props}
+            source = self._source_fingerprint()
+            arrays = array_directory.attach(len(self), props, dtypes, source)
+            if arrays is None:
+                array_directory.invalidate()
+                arrays = self._read_arrays(props, allocate=array_directory.allocate)
+                arrays = array_directory.store(arrays, props, source)
 
         try:
             # Perform swap
-            self._N = _N
-            self._type = _type
-            self._types = types
-            self._type_ids = type_ids
-            self._position = props['position']
-            self._orientation = props['orientation']
-            self._velocity = props['velocity']
-            self._mass = props['mass']
-            self._charge = props['charge']
-            self._diameter = props['diameter']
-            self._moment_inertia = props['moment_inertia']
-            self._angmom = props['angmom']
-            self._image = props['image']
+            self._N = arrays['N']
+            self._type = arrays['type']
+            self._types = arrays['types']
+            self._type_ids = arrays['type_ids']
+            for prop in PARTICLE_PROPERTIES:
+                setattr(self, '_' + prop, arrays.get(prop))
         except Exception:
             # Ensure consistent error state
             self._N = self._type = self._types = self._type_ids = \
@@ -1004,20 +1877,367 @@ class Trajectory(BaseTrajectory):
                 self._moment_inertia = self._angmom = self._image = None
             raise
 
+    def ragged(self, prop):
+        """Return a particle property of all frames as a ragged array.
+
+        In contrast to the arrays provided by :meth:`~.load_arrays`,
+        frames with less particles are not padded. Instead, the values
+        of all frames are concatenated and the frame with index i is
+        stored at ``offsets[i]:offsets[i+1]``:
+
+        .. code::
+
+            position = traj.ragged('position')
+            position[i]             # N[i]x3, equal to traj[i].position
+            position.padded()       # MxNx3
+
+        If the trajectory arrays are loaded, the ragged array is created
+        from those, otherwise frames are read without keeping them in memory.
+
+        :param prop: The name of the particle property.
+        :type prop: str
+        :returns: The ragged array.
+        :rtype: :class:`~.RaggedArray`
+        :raises ValueError: If prop is not a particle property.
+        :raises AttributeError: If the property is not available for all frames.
+        """
+        _check_props([prop])
+        array = getattr(self, '_' + prop)
+        if self._N is not None and array is not None:
+            data = array[np.arange(array.shape[1]) < self._N[:, np.newaxis]]
+            N = self._N
+        else:
+            dtype = self._array_dtype(prop)
+            values = []
+            for frame, frame_data in self._iter_frame_data([prop]):
+                value = getattr(frame_data, prop)
+                if value is None:
+                    raise AttributeError('{} not available for this trajectory'.format(prop))
+                values.append(np.asarray(value, dtype=dtype))
+            N = [len(value) for value in values]
+            data = np.concatenate(values) if values else np.zeros(0, dtype=dtype)
+        offsets = np.zeros(len(N) + 1, dtype=np.int_)
+        np.cumsum(N, out=offsets[1:])
+        return RaggedArray(data, offsets)
+
+    def metadata(self):
+        """Return the number of particles, timestep, box and available
+        particle properties of all frames.
+
+        The metadata is read from the file headers where the format
+        permits, without decoding the particle data, e.g., to allocate
+        arrays or to select frames before loading them:
+
+        .. code::
+
+            metadata = traj.metadata()
+            N_max = metadata['N'].max()
+
+        The returned dictionary contains:
+
+        * ``'N'``: The number of particles per frame.
+        * ``'timestep'``: The timestep per frame or None, if the format
+          does not store timesteps.
+        * ``'box'``: The Mx6 box parameters, see :attr:`~.box_array`.
+        * ``'box_dimensions'``: The box dimensions per frame.
+        * ``'props'``: A list of tuples of the particle properties
+          available for each frame.
+
+        :rtype: dict"""
+        metadata = [frame._read_metadata() for frame in self.frames]
+        timestep = [m.timestep for m in metadata]
+        box_array = np.zeros((len(self), 6), dtype=_property_dtype(self._dtype, 'box'))
+        for i, m in enumerate(metadata):
+            box_array[i] = m.box.get_box_array()
+        return dict(
+            N=np.array([m.N for m in metadata], dtype=np.int_),
+            timestep=None if None in timestep else np.array(timestep, dtype=np.int64),
+            box=box_array,
+            box_dimensions=np.array([m.box.dimensions for m in metadata], dtype=np.int_),
+            props=[m.props for m in metadata])
+
+    @property
+    def box_array(self):
+        """Mx6 array of the box parameters Lx, Ly, Lz, xy, xz and yz of all frames.
+
+        Only the box data of frames that are not loaded is read, which is
+        much faster than loading the frames, e.g., to compute the volume
+        of all frames:
+
+        .. code::
+
+            box = traj.box_array
+            volume = box[:, 0] * box[:, 1] * box[:, 2]
+
+        The boxes are read on each access, see also :attr:`~.box_dimensions`.
+
+        :rtype: :class:`numpy.ndarray`"""
+        return self._read_boxes()[0]
+
+    @property
+    def box_dimensions(self):
+        """Array of the box dimensions of all frames.
+
+        The boxes are read on each access, see also :attr:`~.box_array`.
+
+        :rtype: :class:`numpy.ndarray` (dtype= :class:`numpy.int_`)"""
+        return self._read_boxes()[1]
+
+    def _read_boxes(self):
+        "Return the box parameters and dimensions of all frames."
+        box_array = np.zeros((len(self), 6), dtype=_property_dtype(self._dtype, 'box'))
+        box_dimensions = np.zeros(len(self), dtype=np.int_)
+        for i, frame in enumerate(self.frames):
+            box = frame._read_box()
+            box_array[i] = box.get_box_array()
+            box_dimensions[i] = box.dimensions
+        return box_array, box_dimensions
+
+    def select(self, indices=None, types=None):
+        """Return a view of this trajectory that only contains the selected particles.
+
+        Particles are selected by their indices within each frame, by their
+        types or both. The frames of the view read only the selected
+        particles, where the format permits, such that arrays loaded from
+        the view only contain the selected particles:
+
+        .. code::
+
+            solvent = traj.select(types=['W'])
+            solvent.load_arrays(['position'])  # MxNx3, N water particles
+
+            first = traj.select(indices=slice(0, 100))
+
+        Modifications of the frames of the view do not affect the frames
+        of this trajectory.
+
+        :param indices: The indices of the particles within each frame as
+            array of indices, slice or boolean mask.
+        :param types: The names of the particle types to select.
+        :type types: list
+        :returns: The trajectory view.
+        :rtype: :class:`~.Trajectory`"""
+        if isinstance(types, str):
+            types = [types]
+        if types is not None:
+            types = [str(t) for t in types]
+        frames = self.frames
+        return Trajectory(_FrameIndex(
+            functools.partial(_select_frame, frames, indices, types), range(len(frames))),
+            dtype=self._dtype)
+
+    def unwrapped_position(self, out=None, chunk_size=1000):
+        """Return the positions of all particles unwrapped with their periodic images.
+
+        The periodic images are the number of times the particles crossed
+        the box boundaries along each of the (triclinic) box vectors, which
+        are added to the positions to obtain continuous trajectories:
+
+        .. code::
+
+            traj.load_arrays(['position', 'image'])
+            position = traj.unwrapped_position()
+            msd = ((position - position[0]) ** 2).sum(axis=-1).mean(axis=-1)
+
+        The frames are processed in chunks, such that the positions of
+        trajectories stored in memory-mapped arrays, see
+        :meth:`~.load_arrays`, can be unwrapped into a memory-mapped
+        output array without reading them into memory at once.
+
+        :param out: The MxNx3 array to store the unwrapped positions,
+            defaults to a new array.
+        :type out: :class:`numpy.ndarray`
+        :param chunk_size: The number of frames processed at once.
+        :type chunk_size: int
+        :returns: The unwrapped positions.
+        :rtype: :class:`numpy.ndarray`
+        :raises RuntimeError: When called before calling :meth:`~.load_arrays`.
+        :raises AttributeError: If the positions or images were not loaded.
+        """
+        image = self.image
+        return self._transform_position(
+            lambda position, box, dimensions, chunk: position + _box_vectors_dot(
+                box, image[chunk]), out, chunk_size)
+
+    def wrapped_position(self, out=None, chunk_size=1000):
+        """Return the positions of all particles wrapped into the (triclinic) box.
+
+        Positions are wrapped into the box centered at the origin. For
+        two-dimensional boxes, the z coordinates are left unchanged.
+        The frames are processed in chunks, see :meth:`~.unwrapped_position`.
+
+        :param out: The MxNx3 array to store the wrapped positions,
+            defaults to a new array.
+        :type out: :class:`numpy.ndarray`
+        :param chunk_size: The number of frames processed at once.
+        :type chunk_size: int
+        :returns: The wrapped positions.
+        :rtype: :class:`numpy.ndarray`
+        :raises RuntimeError: When called before calling :meth:`~.load_arrays`.
+        :raises AttributeError: If the positions were not loaded.
+        """
+        def wrap(position, box, dimensions, chunk):
+            image = np.floor(_box_fractions(box, position) + 0.5)
+            image[dimensions == 2, :, 2] = 0
+            return position - _box_vectors_dot(box, image)
+        return self._transform_position(wrap, out, chunk_size)
+
+    def _transform_position(self, transform, out, chunk_size):
+        """Apply transform(position, box, dimensions, chunk) to the positions
+        of chunks of frames, where box are the box matrices of the frames."""
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be at least 1.")
+        position = self.position
+        box_array, box_dimensions = self._read_boxes()
+        box = _box_matrices(box_array)
+        if out is None:
+            out = np.empty(position.shape, dtype=position.dtype)
+        for start in range(0, len(position), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            out[chunk] = transform(position[chunk], box[chunk], box_dimensions[chunk], chunk)
+        return out
+
+    def _source_fingerprint(self):
+        """Return a fingerprint of the origin of the data of all frames.
+
+        The fingerprint covers the names, sizes and modification times of
+        the files, the formats and readers, the locations of the frames
+        within the files and particle selections.
+
+        :returns: The hexadecimal fingerprint or None if any frame holds
+            data, which may have been modified, or was not read from a
+            named file."""
+        digest = hashlib.blake2b(digest_size=16)
+        stats = dict()
+        default = functools.partial(_fingerprint_default, dict())
+        for i in range(len(self.frames)):
+            fingerprint = self.frames[i]._fingerprint(stats)
+            if fingerprint is None:
+                return None
+            digest.update(json.dumps(fingerprint, sort_keys=True, default=default).encode())
+        return digest.hexdigest()
+
+    def digests(self):
+        """Return the digests of all frames.
+
+        .. code::
+
+            digests = traj.digests()
+            duplicates = len(digests) - len(set(digests))
+
+        See also: :meth:`.Frame.digest`
+
+        :returns: The hexadecimal digests.
+        :rtype: list"""
+        return [frame.digest() for frame in self.frames]
+
+    def _read_arrays(self, props, load_frames=False, allocate=None):
+        """Read the given particle properties of all frames into arrays.
+
+        :param props: The particle properties to read.
+        :param load_frames: Load the frames into memory while reading.
+        :param allocate: Function with signature ``allocate(name, shape, dtype)``
+            that returns zero-initialized arrays. By default, arrays are
+            allocated in memory.
+        :returns: A dictionary of arrays, including the frame sizes,
+            types and type ids."""
+        if allocate is None:
+            def allocate(name, shape, dtype):
+                return np.zeros(shape, dtype=dtype)
+            # The per-frame type lists are only kept for in-memory arrays.
+            types = [None] * len(self)
+        else:
+            types = None
+        M = len(self)
+        # The arrays are allocated for the largest frame, so that they
+        # are never enlarged while reading.
+        N = self._max_N()
+        _N = np.zeros(M, dtype=np.int_)
+        arrays = dict.fromkeys(props + ['type_ids'])
+        uniques = [None] * M
+        missing = set()
+        previous = None
+
+        for i, (_, frame_data) in enumerate(self._iter_frame_data(props, load_frames)):
+            _N[i] = len(frame_data)
+            uniques[i], local_ids = _frame_type_ids(frame_data.types, previous)
+            previous = (frame_data.types, uniques[i], local_ids)
+            arrays['type_ids'] = _fill_frame_array(
+                arrays['type_ids'], i, M, local_ids, np.uint32,
+                functools.partial(allocate, 'type_ids'), N)
+            if types is not None:
+                types[i] = frame_data.types
+            for prop in props:
+                if prop in missing:
+                    continue
+                frame_prop = getattr(frame_data, prop)
+                if frame_prop is None:
+                    # If any frame is missing the property, set property
+                    # to None in order for AttributeError to be raised properly
+                    missing.add(prop)
+                    arrays[prop] = None
+                else:
+                    arrays[prop] = _fill_frame_array(
+                        arrays[prop], i, M, frame_prop,
+                        self._array_dtype(prop),
+                        functools.partial(allocate, prop), N)
+
+        if arrays['type_ids'] is None:
+            arrays['type_ids'] = allocate('type_ids', (M, N), np.uint32)
+        arrays['type'] = _map_type_ids(uniques, _N, arrays['type_ids'])
+        arrays['types'] = types
+        arrays['N'] = _N
+        return arrays
+
+    def _array_dtype(self, prop):
+        """Return the data type of trajectory arrays of a particle property.
+
+        Periodic images are stored as integers, unless a data type is
+        explicitly requested for them."""
+        if prop == 'image' and not (isinstance(self._dtype, collections.abc.Mapping) and
+                                    'image' in self._dtype):
+            return np.int32
+        return _property_dtype(self._dtype, prop)
+
     def set_dtype(self, value):
         """Change the data type of this trajectory.
 
+        The data type may be given per property as a mapping of property
+        names to data types, e.g., to store velocities and angular momenta
+        in half precision and the box in double precision:
+
+        .. code::
+
+            traj.set_dtype({'velocity': np.float16, 'angmom': np.float16,
+                            'box': np.float64})
+
+        Properties missing in the mapping use the data type given for
+        ``'default'`` or :data:`DEFAULT_DTYPE`. Arrays that are already
+        loaded are converted.
+
         This function cannot be called if any frame
         is already loaded.
 
-        :param value: The new data type value."""
+        :param value: The new data type value or mapping.
+        :raises ValueError: If the mapping contains unknown keys.
+        :raises RuntimeError: If any frame is loaded."""
+        _check_dtype(value)
+        # All frames are validated before anything is changed.
+        frames = self.frames
+        if isinstance(frames, _FrameIndex):
+            frames = frames.live_frames()
+        if any(frame.loaded() for frame in frames):
+            raise RuntimeError(
+                "Cannot change the data type after frame is loaded.")
         self._dtype = value
-        for x in (self._position, self._orientation, self._velocity,
-                  self._mass, self._charge, self._diameter,
-                  self._moment_inertia, self._angmom):
-            if x is not None:
-                x = x.astype(value)
-        for frame in self.frames:
+        for prop in PARTICLE_PROPERTIES:
+            array = getattr(self, '_' + prop)
+            if array is not None:
+                setattr(self, '_' + prop, array.astype(self._array_dtype(prop), copy=False))
+        if isinstance(self.frames, _FrameIndex):
+            # Frames that do not exist yet are created with the data type.
+            self.frames.dtype = value
+        for frame in frames:
             frame.dtype = value
 
     @property
@@ -1048,6 +2268,9 @@ class Trajectory(BaseTrajectory):
             calling :meth:`~.load_arrays` or
             :meth:`~.Trajectory.load`."""
         self._assertarrays_loaded()
+        if self._types is None:
+            # Reconstruct the types from the type ids, e.g., for memory-mapped arrays.
+            return np.asarray(self._type, dtype=np.str_)[self.type_ids]
         return np.asarray(self._types, dtype=np.str_)
 
     @property
@@ -1226,29 +2449,41 @@ class Trajectory(BaseTrajectory):
         return self._check_nonempty_property('_image')
 
 
+@functools.lru_cache(maxsize=32)
+def _box_qr(box_bytes, box_dtype):
+    """Return the QR decomposition of a box matrix given by its raw bytes.
+
+    Consecutive frames of a trajectory usually share the same box, so the
+    decomposition is cached. The returned matrices are read-only."""
+    box_matrix = np.frombuffer(box_bytes, dtype=box_dtype).reshape((3, 3))
+    Q, R = np.linalg.qr(box_matrix)
+    Q.flags.writeable = False
+    R.flags.writeable = False
+    return Q, R
+
+
 def _regularize_box(position, velocity,
                     orientation, angmom,
                     box_matrix, dtype=None, dimensions=3):
     """ Convert box into a right-handed coordinate frame with
     only upper triangular entries. Also convert corresponding
     positions and orientations."""
-    # First use QR decomposition to compute the new basis
-    Q, R = np.linalg.qr(box_matrix)
-    Q = Q.astype(dtype)
-    R = R.astype(dtype)
-
-    if not np.allclose(Q[:dimensions, :dimensions], np.eye(dimensions)):
-        # If Q is not the identity matrix, then we will be
-        # changing data, so we have to copy. This only causes
-        # actual failures for non-writeable GSD frames, but could
-        # cause unexpected data corruption for other cases
-        position = np.copy(position)
-        if orientation is not None:
-            orientation = np.copy(orientation)
-        if velocity is not None:
-            velocity = np.copy(velocity)
-        if angmom is not None:
-            angmom = np.copy(angmom)
+    box_matrix = np.ascontiguousarray(box_matrix)
+    if not np.tril(box_matrix, -1).any():
+        # The box matrix is already upper triangular, in which case
+        # the QR decomposition is trivial (Q is the identity matrix).
+        Q = None
+    else:
+        # Use QR decomposition to compute the new basis
+        Q, R = _box_qr(box_matrix.tobytes(), box_matrix.dtype.str)
+        Q = Q.astype(dtype)
+        R = R.astype(dtype)
+
+    if Q is not None and not np.allclose(Q[:dimensions, :dimensions], np.eye(dimensions)):
+        # If Q is not the identity matrix, then we will be changing
+        # data. The input arrays may be (read-only) reader buffers, so
+        # all transformed arrays are newly allocated and never modified
+        # in place.
 
         # Since we'll be performing a quaternion operation,
         # we have to ensure that Q is a pure rotation
@@ -1256,31 +2491,28 @@ def _regularize_box(position, velocity,
         Q = Q*sign
         R = R*sign
 
-        # First rotate positions, velocities.
-        # Since they are vectors, we can use the matrix directly.
-        # Conveniently, instead of transposing Q we can just reverse
-        # the order of multiplication here
-        position = position.dot(Q)
-        if velocity is not None:
-            velocity = velocity.dot(Q)
-
-        # For orientations and angular momenta, we use the quaternion
-        quat = rowan.from_matrix(Q.T)
-        if orientation is not None:
-            for i in range(orientation.shape[0]):
-                orientation[i, :] = rowan.multiply(quat, orientation[i, :])
-        if angmom is not None:
-            for i in range(angmom.shape[0]):
-                angmom[i, :] = rowan.multiply(quat, angmom[i, :])
-
-        # Now we have to ensure that the box is right-handed. We
+        # We also have to ensure that the box is right-handed. We
         # do this as a second step to avoid introducing reflections
         # into the rotation matrix before making the quaternion
         signs = np.diag(np.diag(np.where(R < 0, -np.ones(R.shape), np.ones(R.shape))))
         box = R.dot(signs)
-        position = position.dot(signs)
+
+        # Positions and velocities are vectors, so we can rotate and
+        # reflect them with one matrix product. Conveniently, instead
+        # of transposing Q we can just reverse the order of multiplication.
+        transform = Q.dot(signs)
+        if position is not None:
+            position = position.dot(transform.astype(position.dtype, copy=False))
         if velocity is not None:
-            velocity = velocity.dot(signs)
+            velocity = velocity.dot(transform.astype(velocity.dtype, copy=False))
+
+        # For orientations and angular momenta, we use the quaternion,
+        # which is applied to all particles at once.
+        quat = rowan.from_matrix(Q.T)
+        if orientation is not None:
+            orientation = rowan.multiply(quat, orientation).astype(orientation.dtype, copy=False)
+        if angmom is not None:
+            angmom = rowan.multiply(quat, angmom).astype(angmom.dtype, copy=False)
     else:
         box = box_matrix
 
@@ -1293,43 +2525,663 @@ def _regularize_box(position, velocity,
     return position, velocity, orientation, angmom, box
 
 
+class _ArrayDirectory(object):
+    """Stores trajectory arrays as memory-mapped ``.npy`` files in a directory.
+
+    The metadata file is written after all arrays have been stored,
+    its presence marks the directory content as complete.
+
+    :param path: The directory path.
+    :type path: str"""
+    METADATA_FILENAME = 'garnett_arrays.json'
+
+    def __init__(self, path):
+        self.path = path
+        self._num_allocated = 0
+
+    def _fn(self, name):
+        return os.path.join(self.path, name + '.npy')
+
+    def attach(self, M, props, dtypes=None, source=None):
+        """Return the arrays stored in the directory in read-only mode.
+
+        :param dtypes: A mapping of property names to the required data types.
+        :param source: The fingerprint of the origin of the arrays, see
+            :meth:`.Trajectory._source_fingerprint`. Arrays without a
+            fingerprint are never attached.
+        :returns: A dictionary of memory-mapped arrays or None if the
+            directory does not contain the requested arrays for M frames
+            of the same origin in the required data types."""
+        if source is None:
+            return None
+        try:
+            with open(os.path.join(self.path, self.METADATA_FILENAME)) as file:
+                metadata = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+        if metadata['M'] != M or metadata.get('source') != source or \
+                not set(props).issubset(metadata['props'] + metadata['missing']):
+            return None
+        return self._load(metadata, props, dtypes)
+
+    def _load(self, metadata, props, dtypes=None):
+        arrays = dict(type=metadata['type'], types=None)
+        for name in ['N', 'type_ids'] + props:
+            if name in metadata['missing']:
+                arrays[name] = None
+            else:
+                arrays[name] = np.load(self._fn(name), mmap_mode='r')
+                if dtypes is not None and name in dtypes and \
+                        arrays[name].dtype != np.dtype(dtypes[name]):
+                    return None
+        return arrays
+
+    def invalidate(self):
+        "Mark the directory content as incomplete."
+        try:
+            os.remove(os.path.join(self.path, self.METADATA_FILENAME))
+        except (IOError, OSError):
+            pass
+
+    def allocate(self, name, shape, dtype):
+        "Return a zero-initialized, memory-mapped array in a temporary file."
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self._num_allocated += 1
+        fn = os.path.join(self.path, '{}.{}.tmp.npy'.format(name, self._num_allocated))
+        return np.lib.format.open_memmap(fn, mode='w+', dtype=dtype, shape=shape)
+
+    def store(self, arrays, props, source=None):
+        """Move the arrays into place and write the metadata.
+
+        :param source: The fingerprint of the origin of the arrays.
+        :returns: The stored arrays, see :meth:`~.attach`."""
+        M = len(arrays['N'])
+        np.save(self._fn('N'), arrays['N'])
+        missing = []
+        for name in ['type_ids'] + props:
+            array = arrays[name]
+            if array is None:
+                missing.append(name)
+            else:
+                array.flush()
+                os.replace(array.filename, self._fn(name))
+        # Remove the temporary files left by interrupted reads.
+        for fn in glob.glob(os.path.join(self.path, '*.tmp.npy')):
+            os.remove(fn)
+        metadata = dict(
+            M=M, type=arrays['type'], missing=missing, source=source,
+            props=[prop for prop in props if prop not in missing])
+        with open(os.path.join(self.path, self.METADATA_FILENAME), 'w') as file:
+            json.dump(metadata, file)
+        return self._load(metadata, props)
+
+
+def _prefetch_frame_data(frame):
+    "Read and convert the frame data, unless the frame is already loaded."
+    if frame.loaded():
+        return None
+    with _READ_LOCK:
+        raw_frame = frame.read()
+    return frame._raw_frame_to_frame(raw_frame, dtype=frame.dtype)
+
+
+def _map_frame(func, frame):
+    "Call func with the frame in a worker process of Trajectory.map()."
+    try:
+        return func(frame)
+    finally:
+        frame.unload()
+
+
+def _restore_frame(cls, descriptor, dtype):
+    "Restore a pickled frame from its descriptor."
+    frame = cls._from_descriptor(descriptor)
+    frame._dtype = dtype
+    return frame
+
+
+def _select_frame(frames, indices, types, position):
+    "Create the frame of the selected particles of the frame at position."
+    return _SelectedFrame(frames[position], indices, types)
+
+
+def _select_particles(raw_frame, index):
+    "Reduce the particle properties and types of the raw frame to the particles at index."
+    for prop in PARTICLE_PROPERTIES:
+        value = getattr(raw_frame, prop)
+        if value is not None and len(value):
+            setattr(raw_frame, prop, np.asarray(value)[index])
+    if raw_frame.types is not None:
+        raw_frame.types = [raw_frame.types[i] for i in index]
+
+
+def _frame_data_to_raw_frame(frame_data):
+    "Return a raw frame with the (regularized) data of a loaded frame."
+    raw_frame = _RawFrameData()
+    raw_frame.box = np.asarray(frame_data.box.get_box_matrix())
+    raw_frame.box_dimensions = frame_data.box.dimensions
+    for prop in PARTICLE_PROPERTIES:
+        value = getattr(frame_data, prop)
+        if value is not None:
+            setattr(raw_frame, prop, value)
+    raw_frame.types = list(frame_data.types)
+    raw_frame.data = frame_data.data
+    raw_frame.data_keys = frame_data.data_keys
+    raw_frame.shapedef = frame_data.shapedef
+    raw_frame.view_rotation = frame_data.view_rotation
+    return raw_frame
+
+
+def _restore_loaded_frame(frame_data, dtype):
+    "Restore a pickled frame from its frame data."
+    frame = Frame(dtype=dtype)
+    frame.frame_data = frame_data
+    return frame
+
+
+def _open_source(key, opener):
+    """Return the source stored under key, calling opener() to open it first.
+
+    Sources are opened once per process and shared by all frames
+    restored from descriptors within that process."""
+    key = (os.getpid(), key)
+    try:
+        return _SOURCES[key]
+    except KeyError:
+        source = _SOURCES[key] = opener()
+        return source
+
+
+def _close_sources():
+    "Close all sources opened by this process."
+    pid = os.getpid()
+    for key in [key for key in _SOURCES if key[0] == pid]:
+        source = _SOURCES.pop(key)
+        if hasattr(source, 'close'):
+            source.close()
+
+
+def _stream_filename(stream):
+    "Returns the name of the file of stream or None if it is not a named file."
+    name = getattr(stream, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return os.path.abspath(name)
+    return None
+
+
+def _fingerprint_default(digests, value):
+    """Serialize values of frame descriptor options for fingerprints.
+
+    Frames, e.g., topology frames, are represented by their digests,
+    which are computed once per frame and stored in digests."""
+    if isinstance(value, Frame):
+        if id(value) not in digests:
+            digests[id(value)] = (value, value.digest())
+        return digests[id(value)][1]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return repr(value)
+
+
+def _frame_data_digest(frame_data):
+    "Returns the hexadecimal digest of the frame data."
+    digest = hashlib.blake2b(digest_size=16)
+    box = frame_data.box
+    digest.update(np.asarray(box.get_box_array(), dtype=np.float64).tobytes())
+    digest.update(str(box.dimensions).encode())
+    digest.update(json.dumps(list(frame_data.types)).encode())
+    for prop in PARTICLE_PROPERTIES:
+        value = getattr(frame_data, prop)
+        if value is None:
+            digest.update('{}:None'.format(prop).encode())
+        else:
+            value = np.ascontiguousarray(value)
+            digest.update('{}:{}{}'.format(prop, value.dtype.str, value.shape).encode())
+            digest.update(value.view(np.uint8).ravel())
+    digest.update(json.dumps(frame_data.data, sort_keys=True, default=str).encode())
+    shapedef = frame_data.shapedef or {}
+    digest.update(json.dumps([(name, str(shape)) for name, shape in shapedef.items()]).encode())
+    return digest.hexdigest()
+
+
+def _frame_data_nbytes(frame_data):
+    "Returns the total size of the frame data arrays in bytes."
+    return sum(value.nbytes for value in vars(frame_data).values()
+               if isinstance(value, np.ndarray))
+
+
+def _property_dtype(dtype, prop):
+    """Return the data type of a property.
+
+    :param dtype: A data type or a mapping of property names to data
+        types. Properties missing in the mapping use the data type given
+        for 'default' or :data:`DEFAULT_DTYPE`."""
+    if isinstance(dtype, collections.abc.Mapping):
+        return dtype.get(prop, dtype.get('default', DEFAULT_DTYPE))
+    return dtype
+
+
+def _writable(value):
+    """Return a writable copy of a read-only array, other values unchanged.
+
+    Readers expose buffers they share, e.g., with other frames or the
+    file content, as read-only arrays, which are copied on first access
+    through the frame properties, so that they can be modified in place
+    without corrupting the buffers. Arrays owned by the frame are returned
+    as they are."""
+    if isinstance(value, np.ndarray) and not value.flags.writeable:
+        return value.copy()
+    return value
+
+
+def _check_dtype(dtype):
+    """Validate a data type or a mapping of property names to data types.
+
+    :raises ValueError: If the mapping contains unknown keys."""
+    if isinstance(dtype, collections.abc.Mapping):
+        unknown = [str(key) for key in dtype if key not in _DTYPE_KEYS]
+        if unknown:
+            raise ValueError("Unknown data type keys: {}.".format(', '.join(unknown)))
+
+
+def _box_matrices(box_array):
+    """Return the Mx3x3 box matrices for Mx6 box parameters.
+
+    The columns of the box matrices are the box vectors, see :meth:`.Box.get_box_matrix`."""
+    Lx, Ly, Lz, xy, xz, yz = np.asarray(box_array, dtype=np.float64).T
+    box = np.zeros((len(Lx), 3, 3))
+    box[:, 0, 0] = Lx
+    box[:, 0, 1] = xy * Ly
+    box[:, 0, 2] = xz * Lz
+    box[:, 1, 1] = Ly
+    box[:, 1, 2] = yz * Lz
+    box[:, 2, 2] = Lz
+    return box
+
+
+def _box_vectors_dot(box, coefficients):
+    "Return the linear combinations of the box vectors for MxNx3 coefficients."
+    return np.matmul(coefficients, box.transpose(0, 2, 1))
+
+
+def _box_fractions(box, position):
+    """Return the MxNx3 fractional coordinates of positions.
+
+    Since the box matrices are upper triangular, the coordinates are
+    obtained by back substitution. Boxes with a length of zero, e.g.,
+    the z-length of two-dimensional boxes, are treated as unit lengths."""
+    L = np.diagonal(box, axis1=1, axis2=2).copy()
+    L[L == 0] = 1
+    L = L[:, np.newaxis, :]
+    box = box[:, np.newaxis, :, :]
+    fraction = np.empty(position.shape)
+    fraction[..., 2] = position[..., 2] / L[..., 2]
+    fraction[..., 1] = (position[..., 1] - box[..., 1, 2] * fraction[..., 2]) / L[..., 1]
+    fraction[..., 0] = (position[..., 0] - box[..., 0, 1] * fraction[..., 1] -
+                        box[..., 0, 2] * fraction[..., 2]) / L[..., 0]
+    return fraction
+
+
+def _check_props(props):
+    """Return the list of particle properties to process.
+
+    :raises ValueError: If props contains unknown properties."""
+    if props is None:
+        return list(PARTICLE_PROPERTIES)
+    if isinstance(props, str):
+        props = [props]
+    props = list(props)
+    unknown = [prop for prop in props if prop not in PARTICLE_PROPERTIES]
+    if unknown:
+        raise ValueError("Unknown particle properties: {}.".format(', '.join(unknown)))
+    return props
+
+
+def _fill_frame_array(array, i, M, value, dtype, allocate=np.zeros, N=0):
+    """Copy the property of the i-th frame into the preallocated MxNx... array.
+
+    The array is allocated on first use and enlarged whenever a frame
+    contains more particles than the array can hold, missing entries
+    are padded with zeros. Returns the (possibly new) array.
+
+    :param allocate: Function that returns a zero-initialized array for
+        given shape and dtype, defaults to :func:`numpy.zeros`.
+    :param N: The number of particles to allocate the array for, e.g.,
+        the size of the largest frame, if known in advance."""
+    value = np.asarray(value)
+    if array is None:
+        array = allocate((M, max(N, len(value))) + value.shape[1:], dtype=dtype)
+    elif len(value) > array.shape[1]:
+        enlarged = allocate((M, len(value)) + array.shape[2:], dtype=array.dtype)
+        enlarged[:, :array.shape[1]] = array
+        array = enlarged
+    array[i, :len(value)] = value
+    return array
+
+
+def _same_types(a, b):
+    "Returns True if the two per-frame type sequences are identical."
+    if a is b:
+        return True
+    if len(a) != len(b):
+        return False
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
+
+
+def _plato_backend(backend):
+    "Import the plato backend with the given name."
+    try:
+        import importlib
+        return importlib.import_module('plato.draw.{}'.format(backend))
+    except ImportError:
+        raise ImportError(
+            'Backend plato.draw.{} could not be imported.'.format(backend))
+
+
+def _plato_default_colors(size):
+    return np.array([[0.5, 0.5, 0.5, 1]] * size)
+
+
+def _plato_primitive(backend, type_shape, frame, subset):
+    """Create the plato primitive for the particles of one shape type.
+
+    :returns: The tuple (primitive, planar, oriented), where planar and
+        oriented denote whether the primitive takes 2D positions and
+        orientations, or None for unsupported shapes."""
+    N_prim = len(subset)
+    dimensions = frame.box.dimensions
+
+    if isinstance(type_shape, SphereShape):
+        if dimensions == 3:
+            prim = backend.Spheres(
+                positions=frame.position[subset],
+                colors=_plato_default_colors(N_prim),
+                radii=[0.5 * type_shape['diameter']] * N_prim,
+            )
+            return prim, False, False
+        else:
+            prim = backend.Disks(
+                positions=frame.position[subset, :2],
+                colors=_plato_default_colors(N_prim),
+                radii=[0.5 * type_shape['diameter']] * N_prim,
+            )
+            return prim, True, False
+    elif isinstance(type_shape, SphereUnionShape):
+        if dimensions == 3:
+            prim = backend.SphereUnions(
+                positions=frame.position[subset],
+                orientations=frame.orientation[subset],
+                colors=_plato_default_colors(len(type_shape['centers'])),
+                points=type_shape['centers'],
+                radii=[0.5 * d for d in type_shape['diameters']],
+            )
+            return prim, False, True
+        else:
+            prim = backend.DiskUnions(
+                positions=frame.position[subset, :2],
+                orientations=frame.orientation[subset],
+                colors=_plato_default_colors(len(type_shape['centers'])),
+                points=[c[:2] for c in type_shape['centers']],
+                radii=[0.5 * d for d in type_shape['diameters']],
+            )
+            return prim, True, True
+    elif isinstance(type_shape, ConvexPolyhedronShape):
+        prim = backend.ConvexPolyhedra(
+            positions=frame.position[subset],
+            orientations=frame.orientation[subset],
+            colors=_plato_default_colors(N_prim),
+            vertices=type_shape['vertices'],
+        )
+        return prim, False, True
+    elif isinstance(type_shape, ConvexSpheropolyhedronShape):
+        prim = backend.ConvexSpheropolyhedra(
+            positions=frame.position[subset],
+            orientations=frame.orientation[subset],
+            colors=_plato_default_colors(N_prim),
+            vertices=type_shape['vertices'],
+            radius=type_shape['rounding_radius'],
+        )
+        return prim, False, True
+    elif isinstance(type_shape, GeneralPolyhedronShape):
+        prim = backend.Mesh(
+            positions=frame.position[subset],
+            orientations=frame.orientation[subset],
+            colors=_plato_default_colors(len(type_shape['vertices'])),
+            vertices=type_shape['vertices'],
+            indices=type_shape['faces'],
+            shape_colors=_plato_default_colors(N_prim),
+        )
+        return prim, False, True
+    elif isinstance(type_shape, PolygonShape):
+        prim = backend.Polygons(
+            positions=frame.position[subset, :2],
+            orientations=frame.orientation[subset],
+            colors=_plato_default_colors(N_prim),
+            vertices=type_shape['vertices'],
+        )
+        return prim, True, True
+    elif isinstance(type_shape, SpheropolygonShape):
+        prim = backend.Spheropolygons(
+            positions=frame.position[subset, :2],
+            orientations=frame.orientation[subset],
+            colors=_plato_default_colors(N_prim),
+            vertices=type_shape['vertices'],
+            radius=type_shape['rounding_radius'],
+        )
+        return prim, True, True
+    else:
+        print('Unsupported shape:', type_shape)
+        return None
+
+
+def _type_partitions(unique, type_ids):
+    """Return the indices of the particles of each type.
+
+    All particles are partitioned with one stable sort of the type ids
+    instead of comparing all types once per type name."""
+    order = np.argsort(type_ids, kind='stable')
+    counts = np.bincount(type_ids, minlength=len(unique))
+    return dict(zip(unique.tolist(), np.split(order, np.cumsum(counts)[:-1])))
+
+
+class _PlatoSceneUpdater(object):
+    """Render frames into one plato scene.
+
+    The primitives are created for the first frame and only their
+    positions and orientations are updated for the following frames.
+    They are recreated if the shape definitions or the number of
+    particles of any type change."""
+
+    def __init__(self, backend, scene=None):
+        self.backend = backend
+        self.scene = scene
+        self._box = None
+        self._box_prim = None
+        self._shapedef = None
+        self._counts = None
+        self._types = None
+        self._partitions = None
+        self._prims = []
+
+    def _add_primitives(self, prims):
+        if self.scene is None:
+            self.scene = self.backend.Scene(prims)
+        else:
+            for prim in prims:
+                self.scene.add_primitive(prim)
+
+    def _remove_primitives(self, prims):
+        for prim in prims:
+            self.scene.remove_primitive(prim)
+
+    def update(self, frame):
+        "Update the scene to show the frame and return the scene."
+        new_prims = []
+        box = frame.box
+        if self._box is None or box != self._box:
+            if self._box_prim is not None:
+                self._remove_primitives([self._box_prim])
+            plato_box = copy.copy(box)
+            if plato_box.dimensions == 2:
+                plato_box.Lz = 0
+            self._box = copy.copy(box)
+            self._box_prim = self.backend.Box.from_box(plato_box, color=(0, 0, 0, 1))
+            new_prims.append(self._box_prim)
+
+        types = frame.types
+        unique, type_ids = _frame_type_ids(types, self._types)
+        if self._types is None or type_ids is not self._types[2]:
+            self._partitions = _type_partitions(unique, type_ids)
+        self._types = (types, unique, type_ids)
+        empty = np.zeros(0, dtype=np.intp)
+        shapedef = frame.shapedef
+        subsets = [self._partitions.get(type_name, empty) for type_name in shapedef]
+        counts = [len(subset) for subset in subsets]
+
+        if shapedef != self._shapedef or counts != self._counts:
+            self._remove_primitives(prim[0] for prim in self._prims if prim is not None)
+            self._shapedef = type(shapedef)(shapedef)
+            self._counts = counts
+            self._prims = [_plato_primitive(self.backend, type_shape, frame, subset)
+                           for type_shape, subset in zip(shapedef.values(), subsets)]
+            new_prims.extend(prim[0] for prim in self._prims if prim is not None)
+        else:
+            for prim, subset in zip(self._prims, subsets):
+                if prim is None:
+                    continue
+                prim, planar, oriented = prim
+                prim.positions = frame.position[subset, :2] if planar \
+                    else frame.position[subset]
+                if oriented:
+                    prim.orientations = frame.orientation[subset]
+
+        self._add_primitives(new_prims)
+        return self.scene
+
+
+def _frame_type_ids(types, previous=None):
+    """Return the unique type names and the frame-local type ids of a frame.
+
+    The frame's types are reduced to its unique type names and the
+    per-particle inverse indices with :func:`numpy.unique`.
+
+    :param previous: The tuple (types, unique, local_ids) of the previous
+        frame, which is reused if the types of both frames are identical."""
+    if previous is not None and _same_types(types, previous[0]):
+        return previous[1], previous[2]
+    if len(types) == 0:
+        return np.zeros(0, dtype=np.str_), np.zeros(0, dtype=np.uint32)
+    unique, inverse = np.unique(np.asarray(types, dtype=np.str_), return_inverse=True)
+    return unique, inverse.reshape(-1).astype(np.uint32)
+
+
+def _map_type_ids(uniques, N, type_ids):
+    """Map frame-local type ids onto the sorted list of all type names.
+
+    The unique names of each frame are mapped onto the global type list
+    through a small lookup table, which is applied to the frame's row of
+    the type_id array in place. Returns the global type list."""
+    _type = sorted(set(t_ for unique in uniques for t_ in unique.tolist()))
+    type_array = np.asarray(_type, dtype=np.str_)
+    last_unique = identity = lookup = None
+    for i, unique in enumerate(uniques):
+        if unique is not last_unique:
+            lookup = np.searchsorted(type_array, unique).astype(type_ids.dtype)
+            identity = np.array_equal(lookup, np.arange(len(lookup)))
+            last_unique = unique
+        if not identity:
+            type_ids[i, :N[i]] = lookup[type_ids[i, :N[i]]]
+    return _type
+
+
 def _generate_type_id_array(types, type_ids):
-    "Generate type_id array."
-    _type = sorted(set(t_ for t in types for t_ in t))
+    """Generate type_id array.
+
+    Frames whose types are identical to those of the previous frame
+    reuse the previous frame's type ids."""
+    uniques = [None] * len(types)
+    previous = None
     for i, t in enumerate(types):
-        for j, t_ in enumerate(t):
-            type_ids[i][j] = _type.index(t_)
-    return _type
+        uniques[i], local_ids = _frame_type_ids(t, previous)
+        type_ids[i, :len(t)] = local_ids
+        previous = (t, uniques[i], local_ids)
+    return _map_type_ids(uniques, [len(t) for t in types], type_ids)
+
+
+def _hoomd_data():
+    "Return the HOOMD-blue data module."
+    try:
+        from hoomd import data
+    except ImportError:
+        try:
+            # Try importing from hoomd 1.x
+            from hoomd_script import data
+        except ImportError:
+            raise ImportError('hoomd')
+    return data
+
+
+def _hoomd_type_ids(types, particle_types):
+    """Return the ids of the particle types of all particles.
+
+    :returns: The type ids or None if types contains types that are
+        not in particle_types."""
+    unique, local_ids = _frame_type_ids(types)
+    particle_types = np.asarray(particle_types, dtype=np.str_)
+    if len(unique) == 0:
+        return local_ids
+    if len(particle_types) == 0:
+        return None
+    order = np.argsort(particle_types)
+    lookup = order[np.minimum(np.searchsorted(particle_types, unique, sorter=order),
+                              len(particle_types) - 1)]
+    if not np.array_equal(particle_types[lookup], unique):
+        return None
+    return lookup[local_ids]
 
 
 def _to_hoomd_snapshot(frame, snapshot=None):
     "Copy the frame into a HOOMD-blue snapshot."
     if snapshot is None:
-        try:
-            from hoomd import data
-        except ImportError:
-            try:
-                # Try importing from hoomd 1.x
-                from hoomd_script import data
-            except ImportError:
-                raise ImportError('hoomd')
-        particle_types = list(set(frame.types))
-        type_ids = [particle_types.index(t) for t in frame.types]
+        data = _hoomd_data()
+        particle_types, type_ids = _frame_type_ids(frame.types)
         snapshot = data.make_snapshot(
                                       N=len(frame),
                                       box=data.boxdim(**frame.box.__dict__),
-                                      particle_types=particle_types
+                                      particle_types=particle_types.tolist()
                                       )
-        np.copyto(
-                  snapshot.particles.typeid,
-                  np.array(type_ids, dtype=snapshot.particles.typeid.dtype)
-                  )
+        np.copyto(snapshot.particles.typeid,
+                  type_ids.astype(snapshot.particles.typeid.dtype, copy=False))
     for prop in PARTICLE_PROPERTIES:
-        if getattr(frame, prop) is not None:
-            np.copyto(getattr(snapshot.particles, prop), getattr(frame, prop))
+        value = getattr(frame, prop, None)
+        if value is not None:
+            np.copyto(getattr(snapshot.particles, prop), value)
     return snapshot
 
 
+def _refill_hoomd_snapshot(frame, snapshot):
+    """Refill a snapshot created by :func:`_to_hoomd_snapshot` with another frame.
+
+    In contrast to copying the frame into a given snapshot, the type ids
+    are mapped to the particle types of the snapshot and the box is
+    replaced if it differs from the frame's box.
+
+    :raises ValueError: If the snapshot does not contain all
+        particle types of the frame."""
+    type_ids = _hoomd_type_ids(frame.types, snapshot.particles.types)
+    if type_ids is None:
+        raise ValueError("The snapshot does not contain all particle types of the frame.")
+    if any(getattr(snapshot.box, key, None) != value
+           for key, value in frame.box.__dict__.items()):
+        snapshot.box = _hoomd_data().boxdim(**frame.box.__dict__)
+    np.copyto(snapshot.particles.typeid,
+              type_ids.astype(snapshot.particles.typeid.dtype, copy=False))
+    return _to_hoomd_snapshot(frame, snapshot)
+
+
 @deprecation.deprecated(deprecated_in="0.7.0",
                         removed_in="0.8.0",
                         current_version=__version__,
@@ -1345,9 +3197,8 @@ def _from_hoomd_snapshot(frame, snapshot):
     Note that only the properties listed below will be copied.
     """
     frame.box.__dict__ = snapshot.box.__dict__
-    particle_types = list(set(snapshot.particles.types))
-    snap_types = [particle_types[i] for i in snapshot.particles.typeid]
-    frame.types = snap_types
+    particle_types = np.asarray(snapshot.particles.types, dtype=np.str_)
+    frame.types = particle_types[np.asarray(snapshot.particles.typeid, dtype=np.intp)].tolist()
     for prop in PARTICLE_PROPERTIES:
         setattr(frame, prop, getattr(snapshot.particles, prop))
     return frame
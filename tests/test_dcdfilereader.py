@@ -8,6 +8,7 @@ import tempfile
 import numpy as np
 import garnett
 from test_trajectory import TrajectoryTest
+from unittest import mock
 
 
 class BaseDCDFileReaderTest(TrajectoryTest):
@@ -85,6 +86,40 @@ class BaseDCDFileReaderTest(TrajectoryTest):
         traj.load_arrays()
         self.assert_raise_attribute_error(traj)
 
+    def test_read_particles(self):
+        expected = self.get_traj()
+        expected.load()
+        N = len(expected[0])
+        index = np.arange(N)[2:7]
+        props = ['position', 'orientation']
+        traj = self.get_traj()
+        frame_cls = garnett.dcdfilereader.DCDFrame
+        with mock.patch.object(frame_cls, '_read_particles', autospec=True,
+                               side_effect=frame_cls._read_particles) as mocked, \
+                mock.patch.object(frame_cls, 'read', side_effect=AssertionError):
+            selection = traj.select(indices=index)
+            selection.load_arrays(props)
+        self.assertEqual(mocked.call_count, len(traj))
+        for i, frame in enumerate(expected):
+            for prop in props:
+                self.assertTrue(np.array_equal(
+                    getattr(selection, prop)[i], getattr(frame, prop)[index]))
+            self.assertEqual(selection[i].types, [frame.types[j] for j in index])
+            self.assertEqual(selection[i].box, frame.box)
+
+    def test_load_arrays(self):
+        traj = self.get_traj()
+        position = np.array(traj[-1].position)
+        # Orientations are only computed if requested, loaded frames are included.
+        traj.load_arrays(props=['position'])
+        self.assertTrue(np.allclose(traj.position[-1], position))
+        self.assertTrue(np.allclose(traj.position[0], traj[0].position))
+        with self.assertRaises(AttributeError):
+            traj.orientation
+        traj.load_arrays()
+        self.assertTrue(np.allclose(traj.position[-1], position))
+        self.assertTrue(np.array_equal(traj.orientation[..., 0], np.ones((len(traj), 10))))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -102,6 +102,19 @@ class BaseGetarFileReaderTest(unittest.TestCase):
         np.testing.assert_array_equal(frame.image, self.image)
         self.assertEqual(frame.types, self.types)
 
+    def test_read_metadata(self):
+        N = 100
+        self.setup_sample(N, dim=3)
+        traj = self.read_trajectory()
+        sizes = garnett.getarfilereader._archive_listing(
+            self.getar_file_fn, os.path.getmtime(self.getar_file_fn))
+        self.assertEqual(sizes['frames/0/position.f32.ind'], N * 3 * 4)
+        metadata = traj[0]._read_metadata()
+        self.assertEqual(metadata.N, N)
+        self.assertEqual(metadata.box, garnett.trajectory.Box(1.0, 1.0, 1.0))
+        self.assertEqual(set(metadata.props), {prop for prop in garnett.trajectory.PARTICLE_PROPERTIES
+                                               if hasattr(traj[0], prop)})
+
 
 @unittest.skipIf(not GTAR, 'GetarFileReader requires the gtar module.')
 class NoTypesGetarFileReaderTest(BaseGetarFileReaderTest):
@@ -9,6 +9,7 @@ import numpy as np
 import garnett
 from test_trajectory import TrajectoryTest
 from tempfile import TemporaryDirectory
+from unittest import mock
 
 try:
     import hoomd
@@ -76,6 +77,32 @@ class BaseGSDHOOMDFileReaderTest(TrajectoryTest):
         with self.assertRaises(AttributeError):
             frame.shapedef
 
+    def test_read_particles(self):
+        with open(self.fn_gsd, 'wb') as file:
+            file.write(base64.b64decode(garnett.samples.GSD_BASE64))
+        expected = self.get_traj()
+        expected.load()
+        N = len(expected[0])
+        index = np.arange(N)[1::2]
+        props = ['position', 'orientation', 'velocity', 'image']
+        frame_cls = garnett.gsdhoomdfilereader.GSDHoomdFrame
+        # Both the pure python and, if available, the native gsd module are used.
+        for gsdfile in (self.get_sample_file(), open(self.fn_gsd, 'rb')):
+            with gsdfile:
+                traj = self.reader().read(gsdfile, self.read_top_trajectory()[0])
+                with mock.patch.object(frame_cls, '_read_particles', autospec=True,
+                                       side_effect=frame_cls._read_particles) as mocked, \
+                        mock.patch.object(frame_cls, 'read', side_effect=AssertionError):
+                    selection = traj.select(indices=index)
+                    selection.load_arrays(props)
+                self.assertEqual(mocked.call_count, len(traj))
+                for i, frame in enumerate(expected):
+                    for prop in props:
+                        self.assertTrue(np.array_equal(
+                            getattr(selection, prop)[i], getattr(frame, prop)[index]))
+                    self.assertEqual(selection[i].types, [frame.types[j] for j in index])
+                    self.assertEqual(selection[i].box, frame.box)
+
     def test_read(self):
         traj = self.get_traj()
         self.assertEqual(len(traj), 10)
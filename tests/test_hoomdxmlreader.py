@@ -14,6 +14,11 @@ class BaseHOOMDXMLFileReaderTest(unittest.TestCase):
         return reader.read(
             io.StringIO(sample_file))
 
+    def test_pickle(self):
+        import pickle
+        traj = self.read_trajectory(garnett.samples.HOOMD_BLUE_XML)
+        self.assertEqual(pickle.loads(pickle.dumps(traj[0])), traj[0])
+
     def test_read_3d(self):
         traj = self.read_trajectory(garnett.samples.HOOMD_BLUE_XML)
         self.assertEqual(len(traj), 1)
@@ -5,7 +5,9 @@ import unittest
 import os
 import io
 import warnings
+import copy
 import tempfile
+from unittest import mock
 import subprocess
 from itertools import chain
 from ddt import ddt, data
@@ -163,6 +165,162 @@ class PosFileReaderTest(BasePosFileReaderTest):
         traj.load_arrays()
         self.assert_raise_attribute_error(traj)
 
+    def test_mixed_particle_lines(self):
+        sample = io.StringIO(
+            'boxMatrix 10 0 0 0 10 0 0 0 10\n'
+            'def A "sphere 1 005984FF"\n'
+            'def B "arrow 0.2 005984FF"\n'
+            'A 1.123456789 2 3 0.5 0.5 0.5 0.5\n'
+            'A 4 5 6\n'
+            'B 1 1 1 0.6 0.8 0\n'
+            'C ffff0000 7 8 9\n'
+            'eof\n')
+        frame = self.read_trajectory(sample, precision=3)[0]
+        self.assertEqual(frame.types, ['A', 'A', 'B', 'C'])
+        self.assertTrue(np.allclose(
+            frame.position, [[1.123, 2, 3], [4, 5, 6], [1, 1, 1], [7, 8, 9]]))
+        self.assertTrue(np.allclose(
+            frame.orientation, [[0.5, 0.5, 0.5, 0.5], [1, 0, 0, 0],
+                                [0.6, 0.8, 0, 0], [1, 0, 0, 0]]))
+        with self.assertRaises(garnett.errors.ParserError):
+            self.read_trajectory(io.StringIO(
+                'boxMatrix 10 0 0 0 10 0 0 0 10\nA 1\neof\n'))[0].load()
+
+    def test_rounding(self):
+        # Values are rounded like round(), also close to ties.
+        sample = 'boxMatrix 10 0 0 0 10 0 0 0 10\nA 28.840103600654999 2.675 -0.125\neof\n'
+        raw_frame = self.read_trajectory(io.StringIO(sample))[0].read()
+        self.assertEqual(raw_frame.position[0].tolist(),
+                         [round(28.840103600654999, 11), 2.675, -0.125])
+        raw_frame = self.read_trajectory(io.StringIO(sample), precision=2)[0].read()
+        self.assertEqual(raw_frame.position[0].tolist(),
+                         [round(28.840103600654999, 2), round(2.675, 2), round(-0.125, 2)])
+
+    def test_index(self):
+        reader = garnett.reader.PosFileReader(index=True)
+        with TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'sample.pos')
+            frames = garnett.samples.POS_HPMC.split('eof\n')
+            with open(fn, 'w') as file:
+                file.write('eof\n'.join(frames[:2]) + 'eof\n')
+            with open(fn) as file:
+                traj = reader.read(file)
+                self.assertEqual(len(traj), 2)
+                traj_expected = [frame.frame_data for frame in traj]
+            self.assertTrue(os.path.isfile(fn + '.idx'))
+            with mock.patch.object(garnett.reader.PosFileReader, '_scan',
+                                   side_effect=AssertionError):
+                with open(fn) as file:
+                    traj = reader.read(file)
+                    self.assertEqual([len(frame) for frame in traj], [3, 3])
+                    self.assertFalse(traj[0].loaded())
+                    self.assertEqual([frame.frame_data for frame in traj], traj_expected)
+
+            # Appended frames are scanned, indexed frames are reused.
+            with open(fn, 'a') as file:
+                file.write(frames[2])
+            with open(fn) as file:
+                scan = garnett.reader.PosFileReader._scan
+                with mock.patch.object(garnett.reader.PosFileReader, '_scan',
+                                       autospec=True, side_effect=scan) as mocked:
+                    traj = reader.read(file)
+                self.assertGreater(mocked.call_args[0][2], 0)
+                self.assertEqual(len(traj), 3)
+                self.assertEqual([frame.frame_data for frame in traj[:2]], traj_expected)
+                with open(fn) as file_cmp:
+                    traj_cmp = garnett.reader.PosFileReader(index=False).read(file_cmp)
+                    self.assertEqual(traj, traj_cmp)
+
+            # A rewritten file is scanned again.
+            with open(fn, 'w') as file:
+                file.write(frames[0] + 'eof\n')
+            with open(fn) as file:
+                self.assertEqual(len(reader.read(file)), 1)
+
+    def test_multibyte_characters(self):
+        frames = garnett.samples.POS_HPMC.split('eof\n')
+        sample = ''.join('// Größe {}\n{}eof\n'.format(i, frame)
+                         for i, frame in enumerate(frames[:2]))
+        traj_expected = self.read_trajectory(io.StringIO(sample))
+        with TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'sample.pos')
+            with open(fn, 'w', encoding='utf-8') as file:
+                file.write(sample)
+            for index in (True, True, False):
+                with open(fn, encoding='utf-8') as file:
+                    traj = garnett.reader.PosFileReader(index=index).read(file)
+                    self.assertEqual(len(traj), 2)
+                    self.assertEqual(traj, traj_expected)
+                    self.assertEqual(traj[-1].end, len(sample.encode('utf-8')))
+
+    def test_parallel_decode(self):
+        fn = os.path.join(PATH, 'samples', 'hpmc_sphere.pos')
+        with open(fn) as file, open(fn) as file_cmp, \
+                mock.patch.object(garnett.posfilereader, 'POSFILE_DECODE_CHUNK_BYTES', 1000):
+            traj = garnett.reader.PosFileReader(processes=2).read(file)
+            traj_cmp = garnett.reader.PosFileReader().read(file_cmp)
+            self.assertIsNotNone(traj.frames.decoder)
+            self.assertEqual(traj, traj_cmp)
+            self.assertFalse(any(frame.loaded() for frame in traj.frames.live_frames()))
+            decoder = garnett.posfilereader._PosFileDecoder
+            with mock.patch.object(decoder, 'decode', autospec=True,
+                                   side_effect=decoder.decode) as mocked:
+                position = traj.ragged('position')
+            mocked.assert_called_once()
+            self.assertTrue(np.array_equal(position.data, traj_cmp.ragged('position').data))
+            for i, frame in enumerate(traj):
+                if i == 2:
+                    break
+            traj.load_arrays(props=['position'])
+            traj_cmp.load_arrays(props=['position'])
+            self.assertTrue(np.array_equal(traj.position, traj_cmp.position))
+            self.assertTrue(np.array_equal(traj.types, traj_cmp.types))
+            traj[1].load()
+            traj.load_arrays()
+            traj_cmp.load_arrays()
+            self.assertTrue(np.array_equal(traj.N, traj_cmp.N))
+            self.assertTrue(np.array_equal(traj.position, traj_cmp.position))
+            self.assertTrue(all(frame.loaded() for frame in traj))
+            # Files that cannot be memory-mapped are decoded from the stream.
+            with mock.patch.object(garnett.posfilereader, '_map_file', return_value=None):
+                raw_frames = garnett.posfilereader._unshare_raw_frames(
+                    *garnett.posfilereader._decode_frames(
+                        fn, 'utf-8', traj_cmp[1].precision, 'A',
+                        [(traj_cmp[1].start, traj_cmp[1].end)]))
+            self.assertTrue(np.allclose(raw_frames[0].position, traj_cmp[1].position, atol=1e-5))
+
+    def test_lazy_iteration(self):
+        traj = self.read_trajectory(io.StringIO('\n'.join([garnett.samples.POS_HPMC] * 4)))
+        num_live = []
+        for frame in traj.iter_prefetch(depth=1):
+            num_live.append(len(traj.frames.live_frames()))
+        for frame, frame_data in traj._iter_frame_data():
+            num_live.append(len(traj.frames.live_frames()))
+        # Only the frames currently processed or read ahead exist.
+        self.assertEqual(len(num_live), 2 * len(traj))
+        self.assertLessEqual(max(num_live), 3)
+
+    def test_shape_definition_cache(self):
+        cls = garnett.posfilereader.PosFileFrame
+        parse = cls._parse_shape_definition
+        with mock.patch.object(cls, '_parse_shape_definition', autospec=True,
+                               side_effect=parse) as mocked:
+            traj = self.read_trajectory(io.StringIO(garnett.samples.POS_HPMC))
+            traj.load()
+        self.assertEqual(mocked.call_count, 1)
+        shapes = [frame.shapedef['A'] for frame in traj]
+        # The frames share the shape, which cannot be modified in place.
+        self.assertIs(shapes[0], shapes[1])
+        with self.assertRaises(ValueError):
+            shapes[0].vertices[0][0] += 1
+        # Shapes are modified per frame by replacing them with copies.
+        shape = copy.copy(shapes[0])
+        shape.color = 'ff0000ff'
+        traj[0].shapedef['A'] = shape
+        self.assertNotEqual(traj[1].shapedef['A'].color, 'ff0000ff')
+        traj[1].unload()
+        self.assertEqual(traj[1].shapedef['A'], shapes[1])
+
     def test_default(self):
         with TemporaryDirectory() as tmp_dir:
             gsdfile = os.path.join(tmp_dir, 'testfile.gsd')
@@ -2,9 +2,14 @@
 # All rights reserved.
 # This software is licensed under the BSD 3-Clause License.
 import io
+import os
+import pickle
 import unittest
 import tempfile
 import warnings
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
 import garnett
 import numpy as np
 from garnett.trajectory import PARTICLE_PROPERTIES
@@ -42,6 +47,10 @@ else:
     HPMC = False
 
 
+def _mean_position(frame):
+    return frame.position.mean(axis=0)
+
+
 class TrajectoryTest(unittest.TestCase):
     sample = garnett.samples.POS_HPMC
     reader = garnett.reader.PosFileReader
@@ -113,11 +122,162 @@ class TrajectoryTest(unittest.TestCase):
         frame0.load()
         self.assertTrue(isinstance(frame0.position, np.ndarray))
         self.assertTrue(frame0.position.dtype == np.float32)
+        traj.load_arrays()
+        frame1 = traj[len(traj) - 1]
         with self.assertRaises(RuntimeError):
             traj.set_dtype(np.float64)
+        # Nothing is changed if any frame is loaded.
+        self.assertEqual(traj._dtype, np.float32)
+        self.assertEqual(traj.position.dtype, np.float32)
+        self.assertEqual(frame1.dtype, np.float32)
         with self.assertRaises(RuntimeError):
             frame0.dtype = np.float64
 
+    def test_iter_batches(self):
+        traj = self.reader().read(self.get_sample_file())
+        M = len(traj)
+        expected = self.reader().read(self.get_sample_file())
+        expected.load_arrays(props=['position'])
+        for size, stride in ((1, None), (2, None), (2, 1), (M + 1, None), (2, 3)):
+            batches = list(traj.iter_batches(size, stride, props=['position']))
+            starts = []
+            for start in range(0, M, stride or size):
+                starts.append(start)
+                if start + size >= M:
+                    break
+            self.assertEqual(len(batches), len(starts))
+            for start, batch in zip(starts, traj.iter_batches(size, stride, props=['position'])):
+                stop = min(start + size, M)
+                self.assertEqual(batch['N'].tolist(), expected.N[start:stop].tolist())
+                self.assertTrue(np.array_equal(batch['position'], expected.position[start:stop]))
+        for frame in traj:
+            self.assertFalse(frame.loaded())
+        for i, window in enumerate(traj.windows(2, props=['position'])):
+            self.assertEqual(len(window['position']), 2)
+            self.assertTrue(np.array_equal(window['position'], expected.position[i:i + 2]))
+        self.assertEqual(i, M - 2)
+        self.assertEqual(list(traj.windows(M + 1)), [])
+        # Batches of loaded trajectory arrays are views.
+        batch = next(expected.iter_batches(2, props=['position']))
+        self.assertTrue(np.shares_memory(batch['position'], expected.position))
+        with self.assertRaises(ValueError):
+            traj.iter_batches(0)
+        with self.assertRaises(ValueError):
+            traj.windows(2, stride=0)
+        with self.assertRaises(ValueError):
+            traj.windows(2, props=['undefined'])
+
+    def test_box_array(self):
+        traj = self.reader().read(self.get_sample_file())
+        frame_cls = type(traj[0])
+        with mock.patch.object(frame_cls, 'read', side_effect=AssertionError):
+            box_array = traj.box_array
+            box_dimensions = traj.box_dimensions
+        self.assertEqual(box_array.shape, (len(traj), 6))
+        self.assertEqual(box_dimensions.shape, (len(traj),))
+        for i, frame in enumerate(traj):
+            self.assertFalse(frame.loaded())
+            self.assertTrue(np.allclose(box_array[i], frame.box.get_box_array()))
+            self.assertEqual(box_dimensions[i], frame.box.dimensions)
+        traj[0].load()
+        traj[0].box = garnett.trajectory.Box(1, 2, 3)
+        self.assertEqual(traj.box_array[0].tolist(), [1, 2, 3, 0, 0, 0])
+        traj[0].unload()
+
+    def test_metadata(self):
+        traj = self.reader().read(self.get_sample_file())
+        with mock.patch.object(type(traj[0]), 'read', side_effect=AssertionError):
+            metadata = traj.metadata()
+        self.assertEqual(metadata['N'].tolist(), [len(frame) for frame in traj])
+        if metadata['timestep'] is not None:
+            self.assertEqual(metadata['timestep'].shape, (len(traj),))
+        self.assertTrue(np.allclose(metadata['box'], traj.box_array))
+        self.assertEqual(metadata['box_dimensions'].tolist(), traj.box_dimensions.tolist())
+        for i, frame in enumerate(traj):
+            for prop in PARTICLE_PROPERTIES:
+                self.assertEqual(prop in metadata['props'][i], hasattr(frame, prop))
+
+    def test_read_metadata(self):
+        traj = self.reader().read(self.get_sample_file())
+        frame_cls = type(traj[0])
+        for i in range(len(traj)):
+            frame = traj[i]
+            with mock.patch.object(frame_cls, 'read', side_effect=AssertionError):
+                metadata = frame._read_metadata()
+            # The metadata matches the data of the loaded frame.
+            frame.load()
+            self.assertEqual(metadata.N, len(frame.frame_data))
+            self.assertTrue(np.allclose(metadata.box.get_box_matrix(),
+                                        frame.frame_data.box.get_box_matrix()))
+            self.assertEqual(set(metadata.props),
+                             {prop for prop in PARTICLE_PROPERTIES
+                              if getattr(frame.frame_data, prop) is not None})
+            frame.unload()
+
+    def test_select(self):
+        traj = self.reader().read(self.get_sample_file())
+        N = len(traj[0])
+        name = traj[0].types[-1]
+        traj[0].unload()
+        frame_cls = type(traj[0])
+        for indices in ([0], slice(1, None), np.arange(N) % 2 == 0):
+            index = np.arange(N)[indices]
+            selection = traj.select(indices=indices)
+            self.assertEqual(len(selection), len(traj))
+            for frame, selected in zip(traj, selection):
+                self.assertEqual(len(selected), len(index))
+                self.assertEqual(list(selected.types), [frame.types[i] for i in index])
+                self.assertTrue(np.allclose(selected.position, frame.position[index]))
+                self.assertEqual(selected.box, frame.box)
+            if frame_cls._read_particles is not garnett.trajectory.Frame._read_particles:
+                # The selected particles are read without reading whole frames.
+                with mock.patch.object(frame_cls, 'read', side_effect=AssertionError):
+                    selection.load_arrays(['position'])
+            else:
+                selection.load_arrays(['position'])
+            self.assertEqual(selection.position.shape, (len(traj), len(index), 3))
+            for i, frame in enumerate(traj):
+                self.assertTrue(np.allclose(selection.position[i], frame.position[index]))
+            self.assertFalse(traj[0].loaded())
+
+        selection = traj.select(types=name)
+        for frame, selected in zip(traj, selection):
+            index = [i for i, t in enumerate(frame.types) if t == name]
+            self.assertEqual(list(selected.types), [name] * len(index))
+            self.assertTrue(np.allclose(selected.position, frame.position[index]))
+            selected.load()
+            self.assertTrue(np.allclose(selected.position, frame.position[index]))
+
+        # Selections of loaded frames include modifications.
+        traj[0].load()
+        traj[0].position = traj[0].position + 1
+        selected = traj.select(indices=[0])[0]
+        self.assertTrue(np.allclose(selected.position, traj[0].position[:1]))
+        traj[0].unload()
+
+    def test_data_type_mapping(self):
+        traj = self.reader().read(self.get_sample_file())
+        traj.set_dtype({'position': np.float64, 'orientation': np.float16})
+        frame = traj[0]
+        self.assertEqual(frame.position.dtype, np.float64)
+        frame.load()
+        self.assertEqual(frame.position.dtype, np.float64)
+        try:
+            orientation = frame.orientation
+        except AttributeError:
+            pass
+        else:
+            self.assertEqual(orientation.dtype, np.float16)
+        frame.position = frame.position.astype(np.float32)
+        self.assertEqual(frame.position.dtype, np.float64)
+        frame.unload()
+        traj.load_arrays(['position'])
+        self.assertEqual(traj.position.dtype, np.float64)
+        traj.set_dtype({'default': np.float16})
+        self.assertEqual(traj.position.dtype, np.float16)
+        with self.assertRaises(ValueError):
+            traj.set_dtype({'undefined': np.float64})
+
     def test_N(self):
         sample_file = self.get_sample_file()
         traj = self.reader().read(sample_file)
@@ -336,6 +496,322 @@ class TrajectoryTest(unittest.TestCase):
         except AttributeError:
             pass
 
+    def test_load_arrays_props(self):
+        sample_file = self.get_sample_file()
+        traj = self.reader().read(sample_file)
+        traj.load_arrays(props=['position'])
+        self.assertFalse(traj[0].loaded())
+        self.assertEqual(traj.position.shape, (len(traj), len(traj[0]), 3))
+        self.assertTrue((traj.N == [len(f) for f in traj]).all())
+        with self.assertRaises(AttributeError):
+            traj.orientation
+        full_traj = self.reader().read(self.get_sample_file())
+        full_traj.load_arrays()
+        self.assertTrue(np.array_equal(traj.position, full_traj.position))
+        self.assertEqual(traj.type, full_traj.type)
+        self.assertTrue(np.array_equal(traj.type_ids, full_traj.type_ids))
+        with self.assertRaises(ValueError):
+            traj.load_arrays(props=['positions'])
+
+    def test_load_arrays_directory(self):
+        traj = self.reader().read(self.get_sample_file())
+        traj.load_arrays()
+        with TemporaryDirectory() as tmp_dir:
+            content = self.get_sample_file().read()
+            mode = 'r' if isinstance(content, str) else 'rb'
+            fn = os.path.join(tmp_dir, 'sample')
+            with open(fn, 'w' if mode == 'r' else 'wb') as file:
+                file.write(content)
+            array_dir = os.path.join(tmp_dir, 'arrays')
+
+            def open_sample_file():
+                sample_file = open(fn, mode)
+                self.addCleanup(sample_file.close)
+                return sample_file
+
+            mm_traj = self.reader().read(open_sample_file())
+            mm_traj.load_arrays(directory=array_dir)
+            self.assertTrue(isinstance(mm_traj.position, np.memmap))
+            self.assertFalse(mm_traj[0].loaded())
+
+            def assert_arrays_equal(traj_cmp):
+                self.assertTrue(np.array_equal(traj.N, traj_cmp.N))
+                self.assertEqual(traj.type, traj_cmp.type)
+                self.assertTrue(np.array_equal(traj.type_ids, traj_cmp.type_ids))
+                self.assertTrue(np.array_equal(traj.types, traj_cmp.types))
+                for prop in PARTICLE_PROPERTIES:
+                    try:
+                        expected = getattr(traj, prop)
+                    except AttributeError:
+                        with self.assertRaises(AttributeError):
+                            getattr(traj_cmp, prop)
+                    else:
+                        self.assertTrue(np.array_equal(expected, getattr(traj_cmp, prop)))
+
+            assert_arrays_equal(mm_traj)
+
+            attached_traj = self.reader().read(open_sample_file())
+            error = AssertionError("Frame read when attaching arrays.")
+            frame_cls = type(attached_traj[0])
+            with mock.patch.object(frame_cls, 'read', side_effect=error), \
+                    mock.patch.object(frame_cls, '_read_props', side_effect=error):
+                attached_traj.load_arrays(directory=array_dir)
+                assert_arrays_equal(attached_traj)
+                attached_traj.load_arrays(props=['position'], directory=array_dir)
+            self.assertTrue(np.array_equal(traj.position, attached_traj.position))
+
+            # Arrays stored in another data type are read again.
+            f64_traj = self.reader().read(open_sample_file())
+            f64_traj.set_dtype({'position': np.float64})
+            f64_traj.load_arrays(props=['position'], directory=array_dir)
+            self.assertEqual(f64_traj.position.dtype, np.float64)
+            self.assertTrue(np.allclose(traj.position, f64_traj.position))
+
+            # Arrays of another particle selection are read again.
+            sel_traj = self.reader().read(open_sample_file()).select(indices=slice(0, 1))
+            sel_traj.load_arrays(props=['position'], directory=array_dir)
+            self.assertEqual(sel_traj.position.shape, (len(traj), 1, 3))
+            self.assertTrue(np.allclose(traj.position[:, :1], sel_traj.position))
+
+            # Arrays of unnamed streams are always read again.
+            stream_traj = self.reader().read(self.get_sample_file())
+            stream_traj.load_arrays(directory=array_dir)
+            with mock.patch.object(frame_cls, 'read', side_effect=error), \
+                    mock.patch.object(frame_cls, '_read_props', side_effect=error):
+                with self.assertRaises(AssertionError):
+                    self.reader().read(self.get_sample_file()).load_arrays(directory=array_dir)
+
+            # Arrays of modified files are read again.
+            stat = os.stat(fn)
+            os.utime(fn, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            with mock.patch.object(frame_cls, 'read', side_effect=error), \
+                    mock.patch.object(frame_cls, '_read_props', side_effect=error):
+                with self.assertRaises(AssertionError):
+                    self.reader().read(open_sample_file()).load_arrays(directory=array_dir)
+
+    def test_frame_cache(self):
+        traj = self.reader().read(self.get_sample_file())
+        M = len(traj)
+        cache = traj.enable_cache(max_frames=2)
+        self.assertIs(traj.cache, cache)
+        for frame in traj:
+            frame.position
+        self.assertEqual(cache.misses, M)
+        self.assertEqual(len(cache), min(M, 2))
+        self.assertEqual(sum(f.loaded() for f in traj.frames), min(M, 2))
+        self.assertTrue(traj.frames[-1].loaded())
+        hits = cache.hits
+        traj[-1].position
+        self.assertEqual(cache.hits, hits + 1)
+        self.assertEqual(cache.misses, M)
+        traj[0].position
+        self.assertTrue(traj.frames[0].loaded())
+        self.assertEqual(cache.misses, M + (M > 2))
+        self.assertGreater(cache.nbytes, 0)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+        self.assertFalse(any(f.loaded() for f in traj.frames))
+
+        cache = traj.enable_cache(max_bytes=1)
+        traj[0].position
+        traj[-1].position
+        self.assertEqual(len(cache), 1)
+        self.assertTrue(traj.frames[-1].loaded())
+        traj.disable_cache()
+        self.assertIsNone(traj.cache)
+        self.assertTrue(all(f._cache is None for f in traj.frames))
+
+    def test_iter_prefetch(self):
+        traj = self.reader().read(self.get_sample_file())
+        positions = [frame.position.copy() for frame in traj]
+        traj[0].load()
+        for depth in (1, 2, len(traj) + 1):
+            num_frames = 0
+            for i, frame in enumerate(traj.iter_prefetch(depth=depth)):
+                self.assertIs(frame, traj[i])
+                self.assertTrue(frame.loaded())
+                self.assertTrue(np.array_equal(frame.position, positions[i]))
+                num_frames += 1
+            self.assertEqual(num_frames, len(traj))
+            self.assertTrue(traj[0].loaded())
+            self.assertFalse(any(f.loaded() for f in traj.frames[1:]))
+        for frame in traj.iter_prefetch():
+            break
+        with self.assertRaises(ValueError):
+            next(traj.iter_prefetch(depth=0))
+
+    def test_frame_index(self):
+        import gc
+        import weakref
+        traj = self.reader().read(self.get_sample_file())
+        self.assertIs(traj[0], traj[0])
+        self.assertIs(traj[1:][0], traj[1])
+        self.assertIs(traj[-1], traj.frames[len(traj) - 1])
+        with self.assertRaises(AttributeError):
+            traj[0].undefined_attribute = None
+        traj[-1].load()
+        ref = weakref.ref(traj[0])
+        gc.collect()
+        # Frames are only kept while referenced or loaded.
+        self.assertIsNone(ref())
+        self.assertTrue(traj[-1].loaded())
+        for frame in traj:
+            frame.position
+        del frame
+        gc.collect()
+        self.assertEqual(traj.frames.live_frames(), [traj[-1]])
+        traj[-1].unload()
+        gc.collect()
+        self.assertEqual(traj.frames.live_frames(), [])
+
+    def test_digests(self):
+        traj = self.reader().read(self.get_sample_file())
+        digests = traj.digests()
+        self.assertEqual(len(digests), len(traj))
+        for frame in traj:
+            self.assertFalse(frame.loaded())
+        self.assertEqual(traj[0].digest(), digests[0])
+        # Digests of unloaded frames are stored in the frame index.
+        with mock.patch.object(type(traj[0]), 'read', side_effect=AssertionError):
+            self.assertEqual(traj.digests(), digests)
+        traj[0].load()
+        self.assertEqual(traj[0].digest(), digests[0])
+        position = traj[0].position.copy()
+        position[0] += 1
+        traj[0].position = position
+        self.assertNotEqual(traj[0].digest(), digests[0])
+        traj[0].unload()
+        # Frames of identical trajectories have identical digests.
+        traj2 = self.reader().read(self.get_sample_file())
+        self.assertEqual(traj2.digests(), digests)
+        if len(traj) > 1:
+            self.assertEqual(traj[-1], traj2[-1])
+        # Modified properties read individually are included.
+        frame = traj[0]
+        self.assertEqual(frame.digest(), digests[0])
+        frame.position[:] += 1
+        self.assertNotEqual(frame.digest(), digests[0])
+        self.assertNotEqual(frame, traj2[0])
+        self.assertFalse(np.array_equal(frame.position, traj2[0].position))
+
+    def test_lazy_edits(self):
+        traj = self.reader().read(self.get_sample_file())
+        frame = traj[0]
+        frame.box.Lx = 99
+        frame.types[0] = 'Z'
+        # Reading other properties individually keeps the modifications.
+        self.assertIsNotNone(frame.position)
+        self.assertEqual(frame.box.Lx, 99)
+        self.assertEqual(frame.types[0], 'Z')
+        frame.load()
+        self.assertEqual(frame.box.Lx, 99)
+        self.assertEqual(frame.types[0], 'Z')
+
+    def test_inplace_edit(self):
+        traj = self.reader().read(self.get_sample_file())
+        frame = traj[0]
+        position = np.array(frame.position)
+        self.assertTrue(frame.position.flags.writeable)
+        frame.position -= 1.0
+        self.assertTrue(np.allclose(frame.position, position - 1.0))
+        frame.load()
+        self.assertTrue(np.allclose(frame.position, position - 1.0))
+        # The reader's buffers are not modified.
+        traj2 = self.reader().read(self.get_sample_file())
+        self.assertTrue(np.allclose(traj2[0].position, position))
+        traj3 = self.reader().read(self.get_sample_file())
+        traj3.load_arrays()
+        self.assertTrue(np.allclose(traj3.position[0], position))
+        # Data may also be modified by assigning new arrays.
+        frame.position = position + 1
+        self.assertTrue(np.allclose(frame.position, position + 1))
+        with self.assertRaises(ValueError):
+            frame.position = np.full(position.shape, np.nan)
+        with self.assertRaises(ValueError):
+            frame.position = np.full(position.shape, np.inf)
+
+    def test_owned_arrays(self):
+        traj = self.reader().read(self.get_sample_file())
+        frame = traj[0]
+        raw_frame = frame.read()
+        frame_data = frame._raw_frame_to_frame(raw_frame, dtype=frame.dtype, props=['position'])
+        if isinstance(raw_frame.position, np.ndarray) and \
+                raw_frame.position.dtype == frame_data.position.dtype:
+            # Read-only arrays share the reader's buffers, other arrays
+            # are owned by the frame and passed through without copies.
+            self.assertEqual(raw_frame.position.flags.writeable,
+                             frame_data.position.flags.writeable)
+            if raw_frame.position.flags.writeable:
+                self.assertTrue(np.shares_memory(raw_frame.position, frame_data.position))
+
+    def test_ragged(self):
+        traj = self.reader().read(self.get_sample_file())
+        position = traj.ragged('position')
+        self.assertEqual(len(position), len(traj))
+        for i, frame in enumerate(traj):
+            self.assertTrue(np.array_equal(position[i], frame.position))
+        self.assertFalse(any(f.loaded() for f in traj.frames))
+        traj.load_arrays()
+        self.assertTrue(np.array_equal(position.padded(), traj.position))
+        self.assertTrue(np.array_equal(position.lengths, traj.N))
+
+    def test_lazy_properties(self):
+        traj = self.reader().read(self.get_sample_file())
+        for frame in traj.frames:
+            for prop in ['box', 'types'] + PARTICLE_PROPERTIES:
+                frame.unload()
+                try:
+                    value = getattr(frame, prop)
+                except AttributeError:
+                    value = None
+                lazy = frame._read_props([prop]) is not None
+                self.assertEqual(frame.loaded(), not lazy)
+                frame.load()
+                if value is None:
+                    with self.assertRaises(AttributeError):
+                        getattr(frame, prop)
+                elif prop == 'box':
+                    self.assertEqual(value, frame.box)
+                else:
+                    np.testing.assert_array_equal(value, getattr(frame, prop))
+            frame.unload()
+            N = len(frame)
+            self.assertEqual(N, len(frame.types))
+            frame.load()
+            self.assertEqual(N, len(frame))
+
+    def test_map(self):
+        from garnett.trajectory import _close_sources
+        with self.assertRaises(TypeError):
+            pickle.dumps(self.reader().read(self.get_sample_file())[0])
+        data = self.get_sample_file().read()
+        mode = 'b' if isinstance(data, bytes) else ''
+        with TemporaryDirectory() as tmp_dir:
+            fn = os.path.join(tmp_dir, 'sample')
+            with open(fn, 'w' + mode) as file:
+                file.write(data)
+            with open(fn, 'r' + mode) as file:
+                traj = self.reader().read(file)
+                means = [frame.position.mean(axis=0) for frame in traj]
+                try:
+                    restored = pickle.loads(pickle.dumps(traj[-1]))
+                    self.assertFalse(traj[-1].loaded())
+                    self.assertEqual(restored, traj[-1])
+                    traj[-1].unload()
+                finally:
+                    _close_sources()
+                np.testing.assert_allclose(traj.map(_mean_position, processes=2), means)
+                self.assertFalse(any(f.loaded() for f in traj.frames))
+                # Loaded frames are sent together with their data.
+                traj[0].load()
+                traj[0].position = traj[0].position + 1
+                means[0] += 1
+                np.testing.assert_allclose(
+                    traj.map(_mean_position, processes=2, chunksize=1), means, rtol=1e-5)
+                np.testing.assert_allclose(
+                    traj.map(_mean_position, processes=1), means, rtol=1e-5)
+
     def test_deprecated(self):
 
         def _access_deprected_props(obj, pos_shape, ort_shape, is_traj):
@@ -371,6 +847,387 @@ class TrajectoryTest(unittest.TestCase):
             for frame in traj:
                 _access_deprected_props(frame, (N, 3), (N, 4), False)
 
+class TypeIdArrayTest(unittest.TestCase):
+
+    def test_generate_type_id_array(self):
+        from garnett.trajectory import _generate_type_id_array
+        types = [['B', 'A', 'C'], ['B', 'A', 'C'], ['C', 'C'], [], ['A', 'B', 'D']]
+        type_ids = np.zeros((len(types), 3), dtype=np.uint32)
+        _type = _generate_type_id_array(types, type_ids)
+        self.assertEqual(_type, ['A', 'B', 'C', 'D'])
+        for i, t in enumerate(types):
+            self.assertEqual(type_ids[i, :len(t)].tolist(),
+                             [_type.index(t_) for t_ in t])
+        self.assertEqual(type_ids[3].tolist(), [0, 0, 0])
+
+    def test_generate_type_id_array_repeated_frames(self):
+        from garnett.trajectory import _generate_type_id_array
+        frame_types = ['A', 'B'] * 50
+        types = [frame_types] * 10 + [list(frame_types)]
+        type_ids = np.zeros((len(types), 100), dtype=np.int_)
+        _type = _generate_type_id_array(types, type_ids)
+        self.assertEqual(_type, ['A', 'B'])
+        self.assertTrue((type_ids == [0, 1] * 50).all())
+
+
+class VariableSizeTrajectoryTest(unittest.TestCase):
+
+    def test_load_arrays_padding(self):
+        sample = garnett.samples.POS_HPMC.split('eof')
+        # Remove the last particle from the second frame.
+        lines = sample[1].splitlines()
+        sample[1] = '\n'.join(lines[:-1]) + '\n'
+        traj = garnett.reader.PosFileReader().read(io.StringIO('eof'.join(sample)))
+        for props in (None, ['position', 'orientation']):
+            traj.load_arrays(props=props)
+            self.assertEqual(traj.N.tolist(), [3, 2, 3])
+            self.assertEqual(traj.position.shape, (3, 3, 3))
+            self.assertEqual(traj.orientation.shape, (3, 3, 4))
+            self.assertTrue((traj.position[1, 2] == 0).all())
+            for i, frame in enumerate(traj):
+                self.assertTrue(np.array_equal(
+                    traj.position[i, :traj.N[i]], frame.position))
+
+    def test_load_arrays_preallocation(self):
+        sample = garnett.samples.POS_HPMC.split('eof')
+        # Remove the last particle from the first frame.
+        lines = sample[0].splitlines()
+        sample[0] = '\n'.join(lines[:-1]) + '\n'
+        traj = garnett.reader.PosFileReader().read(io.StringIO('eof'.join(sample)))
+        self.assertEqual(traj._max_N(), 3)
+        self.assertFalse(any(frame.loaded() for frame in traj.frames))
+        allocate = garnett.trajectory._ArrayDirectory.allocate
+        with TemporaryDirectory() as tmp_dir, mock.patch.object(
+                garnett.trajectory._ArrayDirectory, 'allocate',
+                autospec=True, side_effect=allocate) as mock_allocate:
+            traj.load_arrays(props=['position'], directory=tmp_dir)
+            # The arrays are allocated once for the largest frame.
+            self.assertEqual(
+                sorted(call.args[1] for call in mock_allocate.call_args_list),
+                ['position', 'type_ids'])
+            self.assertEqual(traj.N.tolist(), [2, 3, 3])
+            self.assertEqual(traj.position.shape, (3, 3, 3))
+            self.assertTrue((traj.position[0, 2] == 0).all())
+
+    def test_iter_batches_padding(self):
+        sample = garnett.samples.POS_HPMC.split('eof')
+        lines = sample[1].splitlines()
+        sample[1] = '\n'.join(lines[:-1]) + '\n'
+        traj = garnett.reader.PosFileReader().read(io.StringIO('eof'.join(sample)))
+        for size, stride in ((1, 1), (2, 1)):
+            for start, batch in enumerate(traj.windows(size, stride, props=['position'])):
+                for i, N in enumerate(batch['N']):
+                    frame = traj[start + i]
+                    self.assertEqual(N, len(frame))
+                    self.assertTrue(np.array_equal(batch['position'][i, :N], frame.position))
+                    self.assertTrue((batch['position'][i, N:] == 0).all())
+
+    def test_ragged(self):
+        sample = garnett.samples.POS_HPMC.split('eof')
+        lines = sample[1].splitlines()
+        sample[1] = '\n'.join(lines[:-1]) + '\n'
+        traj = garnett.reader.PosFileReader().read(io.StringIO('eof'.join(sample)))
+        position = traj.ragged('position')
+        self.assertEqual(len(position), 3)
+        self.assertEqual(position.offsets.tolist(), [0, 3, 5, 8])
+        self.assertEqual(position.lengths.tolist(), [3, 2, 3])
+        self.assertEqual(position.data.shape, (8, 3))
+        for i, frame in enumerate(traj):
+            self.assertTrue(np.array_equal(position[i], frame.position))
+        self.assertTrue(np.array_equal(position[-1], traj[-1].position))
+        self.assertTrue(np.shares_memory(position[1], position.data))
+        sub = position[1:]
+        self.assertEqual(sub.offsets.tolist(), [0, 2, 5])
+        self.assertTrue(np.array_equal(sub[0], position[1]))
+        self.assertEqual(len(position[2:1]), 0)
+        with self.assertRaises(IndexError):
+            position[3]
+        with self.assertRaises(ValueError):
+            position[::2]
+        traj.load_arrays()
+        self.assertTrue(np.array_equal(position.padded(), traj.position))
+        from_arrays = traj.ragged('position')
+        self.assertTrue(np.array_equal(from_arrays.data, position.data))
+        self.assertTrue(np.array_equal(from_arrays.offsets, position.offsets))
+        with self.assertRaises(ValueError):
+            traj.ragged('foo')
+
+
+class PeriodicImageTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.box = garnett.trajectory.Box(4, 5, 6, 0.3, -0.2, 0.5)
+        box_matrix = np.asarray(self.box.get_box_matrix())
+        fraction = np.random.uniform(-0.5, 0.5, (3, 10, 3))
+        self.image = np.random.randint(-3, 4, (3, 10, 3))
+        self.wrapped = fraction.dot(box_matrix.T)
+        self.unwrapped = (fraction + self.image).dot(box_matrix.T)
+
+    def make_trajectory(self, position, image):
+        frames = []
+        for i in range(len(position)):
+            frame_data = garnett.trajectory.FrameData()
+            frame_data.box = self.box
+            frame_data.types = ['A'] * len(position[i])
+            frame_data.position = position[i]
+            frame_data.image = image[i]
+            frame = garnett.trajectory.Frame(dtype=np.float64)
+            frame._set_frame_data(frame_data)
+            frames.append(frame)
+        traj = garnett.trajectory.Trajectory(frames, dtype=np.float64)
+        traj.load_arrays(['position', 'image'])
+        return traj
+
+    def test_unwrapped_position(self):
+        traj = self.make_trajectory(self.wrapped, self.image)
+        self.assertTrue(np.allclose(traj.unwrapped_position(), self.unwrapped))
+        out = np.zeros(self.unwrapped.shape)
+        self.assertIs(traj.unwrapped_position(out=out, chunk_size=2), out)
+        self.assertTrue(np.allclose(out, self.unwrapped))
+
+    def test_wrapped_position(self):
+        traj = self.make_trajectory(self.unwrapped, np.zeros_like(self.image))
+        for chunk_size in (1, 2, 1000):
+            self.assertTrue(np.allclose(
+                traj.wrapped_position(chunk_size=chunk_size), self.wrapped))
+
+    def test_wrapped_position_2d(self):
+        self.box = garnett.trajectory.Box(4, 5, 0, 0.3, dimensions=2)
+        self.unwrapped[..., 2] = 1
+        traj = self.make_trajectory(self.unwrapped, self.image)
+        wrapped = traj.wrapped_position()
+        self.assertTrue((wrapped[..., 2] == 1).all())
+        self.assertTrue((np.abs(wrapped[..., 0]) <= 2 + 0.3 * 5 / 2).all())
+        self.assertTrue((np.abs(wrapped[..., 1]) <= 2.5).all())
+
+    def test_not_loaded(self):
+        traj = self.make_trajectory(self.wrapped, self.image)
+        traj.load_arrays(['position'])
+        with self.assertRaises(AttributeError):
+            traj.unwrapped_position()
+        with self.assertRaises(ValueError):
+            traj.wrapped_position(chunk_size=0)
+
+
+class _FakeHOOMDData(object):
+    "Minimal stand-in for the hoomd.data snapshot interface."
+
+    created = 0
+
+    @staticmethod
+    def boxdim(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+    @classmethod
+    def make_snapshot(cls, N, box, particle_types):
+        cls.created += 1
+        particles = mock.Mock(N=N, types=particle_types)
+        particles.typeid = np.zeros(N, dtype=np.uint32)
+        for prop, shape, dtype in (
+                ('position', (N, 3), np.float32), ('orientation', (N, 4), np.float32),
+                ('velocity', (N, 3), np.float32), ('mass', (N,), np.float32),
+                ('charge', (N,), np.float32), ('diameter', (N,), np.float32),
+                ('moment_inertia', (N, 3), np.float32), ('angmom', (N, 4), np.float32),
+                ('image', (N, 3), np.int32)):
+            setattr(particles, prop, np.zeros(shape, dtype=dtype))
+        return mock.Mock(box=box, particles=particles)
+
+
+class HOOMDSnapshotConversionTest(unittest.TestCase):
+
+    def setUp(self):
+        _FakeHOOMDData.created = 0
+        patcher = mock.patch('garnett.trajectory._hoomd_data', return_value=_FakeHOOMDData)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.traj = garnett.reader.PosFileReader().read(io.StringIO(garnett.samples.POS_HPMC))
+
+    def test_type_ids(self):
+        from garnett.trajectory import _hoomd_type_ids
+        self.assertEqual(_hoomd_type_ids(['B', 'A', 'B'], ['B', 'C', 'A']).tolist(), [0, 2, 0])
+        self.assertIsNone(_hoomd_type_ids(['A', 'D'], ['B', 'C', 'A']))
+        self.assertIsNone(_hoomd_type_ids(['A'], []))
+        self.assertEqual(len(_hoomd_type_ids([], ['A'])), 0)
+
+    def test_round_trip(self):
+        from garnett.trajectory import _from_hoomd_snapshot, _refill_hoomd_snapshot
+        frame = self.traj[-1]
+        snapshot = frame.to_hoomd_snapshot()
+        self.assertTrue(np.array_equal(snapshot.particles.position, frame.position))
+        # Reorder the snapshot types to check that the type ids are remapped.
+        snapshot.particles.types = list(reversed(snapshot.particles.types)) + ['X']
+        _refill_hoomd_snapshot(frame, snapshot)
+        self.assertEqual(
+            [snapshot.particles.types[i] for i in snapshot.particles.typeid], frame.types)
+        other = self.traj[0]
+        other.load()
+        self.assertEqual(_from_hoomd_snapshot(other, snapshot).types, frame.types)
+        self.assertEqual(other.box.Lx, frame.box.Lx)
+        snapshot.particles.types = ['X']
+        with self.assertRaises(ValueError):
+            _refill_hoomd_snapshot(frame, snapshot)
+
+    def test_copy_to_snapshot(self):
+        # Copying into a given snapshot only copies the particle properties.
+        frame = self.traj[-1]
+        snapshot = frame.to_hoomd_snapshot()
+        snapshot.particles.types = ['X']
+        snapshot.particles.typeid[:] = 7
+        snapshot.particles.position[:] = 0
+        box = snapshot.box = SimpleNamespace(Lx=1)
+        self.assertIs(frame.to_hoomd_snapshot(snapshot), snapshot)
+        self.assertTrue(np.array_equal(snapshot.particles.position, frame.position))
+        self.assertTrue((snapshot.particles.typeid == 7).all())
+        self.assertIs(snapshot.box, box)
+
+    def test_iter_hoomd_snapshots(self):
+        cls = garnett.posfilereader.PosFileFrame
+        snapshots = []
+        with mock.patch.object(cls, 'read', autospec=True, side_effect=cls.read) as read, \
+                mock.patch.object(cls, '_read_props', autospec=True) as read_props:
+            for snapshot in self.traj.iter_hoomd_snapshots():
+                pass
+        # Each frame is read once as a whole.
+        self.assertEqual(read.call_count, len(self.traj))
+        read_props.assert_not_called()
+        _FakeHOOMDData.created = 0
+        for snapshot in self.traj.iter_hoomd_snapshots():
+            snapshots.append(snapshot)
+            frame = self.traj[len(snapshots) - 1]
+            self.assertTrue(np.array_equal(snapshot.particles.position, frame.position))
+            self.assertTrue(np.array_equal(snapshot.particles.orientation, frame.orientation))
+            self.assertEqual(snapshot.box.Lx, frame.box.Lx)
+        self.assertEqual(len(snapshots), len(self.traj))
+        self.assertEqual(_FakeHOOMDData.created, 1)
+        self.assertTrue(all(s is snapshots[0] for s in snapshots))
+        snapshots = list(self.traj.iter_hoomd_snapshots(reuse=False))
+        self.assertEqual(_FakeHOOMDData.created, 1 + len(self.traj))
+        self.assertEqual(len(set(map(id, snapshots))), len(self.traj))
+        self.assertTrue(np.array_equal(snapshots[0].particles.position, self.traj[0].position))
+
+
+class _FakePlatoScene(object):
+    "Minimal stand-in for plato.draw.Scene."
+
+    def __init__(self, primitives=()):
+        self.primitives = list(primitives)
+
+    def add_primitive(self, prim):
+        self.primitives.append(prim)
+
+    def remove_primitive(self, prim):
+        self.primitives.remove(prim)
+
+
+class PlatoAnimationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SimpleNamespace(
+            Scene=_FakePlatoScene,
+            Box=SimpleNamespace(from_box=lambda box, color: SimpleNamespace(box=box)),
+            ConvexPolyhedra=mock.Mock(side_effect=SimpleNamespace))
+        patcher = mock.patch('garnett.trajectory._plato_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_type_partitions(self):
+        from garnett.trajectory import _frame_type_ids, _type_partitions
+        partitions = _type_partitions(*_frame_type_ids(['B', 'A', 'B', 'C', 'A']))
+        self.assertEqual({k: v.tolist() for k, v in partitions.items()},
+                         {'A': [1, 4], 'B': [0, 2], 'C': [3]})
+        self.assertEqual(_type_partitions(*_frame_type_ids([])), {})
+
+    def test_to_plato_animation(self):
+        traj = garnett.reader.PosFileReader().read(io.StringIO(garnett.samples.POS_HPMC))
+        scene = traj[0].to_plato_scene('fake')
+        self.assertEqual(len(scene.primitives), 2)
+        self.assertTrue(np.array_equal(scene.primitives[1].positions, traj[0].position))
+        self.backend.ConvexPolyhedra.reset_mock()
+        for i, scene_i in enumerate(traj.to_plato_animation('fake')):
+            if i == 0:
+                scene = scene_i
+            self.assertIs(scene_i, scene)
+            self.assertEqual(len(scene.primitives), 2)
+            self.assertEqual(scene.primitives[0].box, traj[i].box)
+            prim = scene.primitives[1]
+            self.assertTrue(np.array_equal(prim.positions, traj[i].position))
+            self.assertTrue(np.array_equal(prim.orientations, traj[i].orientation))
+        self.assertEqual(self.backend.ConvexPolyhedra.call_count, 1)
+
+    def test_to_plato_animation_changed_types(self):
+        sample = garnett.samples.POS_HPMC.split('eof')
+        lines = sample[1].splitlines()
+        sample[1] = '\n'.join(lines[:-1]) + '\n'
+        traj = garnett.reader.PosFileReader().read(io.StringIO('eof'.join(sample)))
+        for i, scene in enumerate(traj.to_plato_animation('fake')):
+            self.assertEqual(len(scene.primitives), 2)
+            self.assertTrue(np.array_equal(scene.primitives[-1].positions, traj[i].position))
+        self.assertEqual(self.backend.ConvexPolyhedra.call_count, 3)
+
+
+class RegularizeBoxTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.N = 20
+        self.position = np.random.random((self.N, 3)).astype(np.float32)
+        self.velocity = np.random.random((self.N, 3)).astype(np.float32)
+        orientation = np.random.random((self.N, 4))
+        self.orientation = (orientation / np.linalg.norm(
+            orientation, axis=1)[:, np.newaxis]).astype(np.float32)
+        self.angmom = np.random.random((self.N, 4)).astype(np.float32)
+
+    def regularize(self, box_matrix):
+        from garnett.trajectory import _regularize_box
+        return _regularize_box(
+            self.position, self.velocity, self.orientation, self.angmom,
+            box_matrix, np.float32)
+
+    def test_upper_triangular(self):
+        box_matrix = np.array([[10, 1, 2], [0, 10, 3], [0, 0, 10]], dtype=np.float32)
+        position, velocity, orientation, angmom, box = self.regularize(box_matrix)
+        self.assertIs(position, self.position)
+        self.assertIs(orientation, self.orientation)
+        self.assertTrue(np.allclose(box.get_box_matrix(), box_matrix))
+
+    def test_rotated(self):
+        import rowan
+        box_matrix = np.array([[10, 0, 0], [1, 10, 0], [2, 3, 10]], dtype=np.float32)
+        Q, R = np.linalg.qr(box_matrix)
+        Q = Q * np.linalg.det(Q)
+        quat = rowan.from_matrix(Q.T)
+        expected = np.array([rowan.multiply(quat, q) for q in self.orientation])
+        position, velocity, orientation, angmom, box = self.regularize(box_matrix)
+        self.assertEqual(orientation.dtype, np.float32)
+        self.assertTrue(np.allclose(orientation, expected, atol=1e-6))
+        self.assertTrue(np.allclose(
+            angmom, [rowan.multiply(quat, q) for q in self.angmom], atol=1e-6))
+        # The input arrays must not be modified in place.
+        self.assertFalse(np.array_equal(orientation, self.orientation))
+        # Particle distances are invariant under the regularization.
+        self.assertTrue(np.allclose(
+            np.linalg.norm(position - position[0], axis=1),
+            np.linalg.norm(self.position - self.position[0], axis=1), atol=1e-5))
+        matrix = np.asarray(box.get_box_matrix())
+        self.assertTrue(np.allclose(np.tril(matrix, -1), 0))
+        self.assertTrue((np.diag(matrix) > 0).all())
+        # The second call is served from the QR cache.
+        self.assertTrue(np.allclose(self.regularize(box_matrix)[0], position))
+
+    def test_rotated_readonly(self):
+        box_matrix = np.array([[10, 0, 0], [1, 10, 0], [2, 3, 10]], dtype=np.float32)
+        expected = self.regularize(box_matrix)
+        inputs = [self.position, self.velocity, self.orientation, self.angmom]
+        originals = [value.copy() for value in inputs]
+        for value in inputs:
+            value.flags.writeable = False
+        for result, value in zip(self.regularize(box_matrix), expected):
+            self.assertTrue(np.array_equal(result, value))
+        for value, original in zip(inputs, originals):
+            self.assertTrue(np.array_equal(value, original))
+
+
 @unittest.skipIf(not HOOMD, 'requires hoomd-blue')
 class FrameSnapshotExport(TrajectoryTest):
 